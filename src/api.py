@@ -1,7 +1,24 @@
 from fastapi import FastAPI
 from src.domain.users.controller import router as users_router
 from src.domain.auth.controller import router as auth_router
+from src.domain.users.async_controller import router as async_users_router
+from src.domain.auth.async_controller import router as async_auth_router
+from src.metrics import router as metrics_router, METRICS_ENABLED
+from src.settings import get_settings
 
-def register_routes(app: FastAPI):
+# Routers served by the async (AsyncSession) stack, e.g. ASYNC_ROUTERS=users,auth
+ASYNC_ROUTERS: set[str] = {name.strip() for name in get_settings().async_routers.split(",") if name.strip()}
+
+def register_routes(app: FastAPI, async_routers: set[str] | None = None):
+    async_routers = ASYNC_ROUTERS if async_routers is None else async_routers
+
+    # Async routes are matched first and shadow their sync counterparts,
+    # routes that only exist in the sync router keep being served by it
+    if "users" in async_routers:
+        app.include_router(async_users_router)
     app.include_router(users_router)
-    app.include_router(auth_router)
\ No newline at end of file
+    if "auth" in async_routers:
+        app.include_router(async_auth_router)
+    app.include_router(auth_router)
+    if METRICS_ENABLED:
+        app.include_router(metrics_router)
\ No newline at end of file
@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+from src.settings import get_settings
+
+AUTH_CACHE_TTL_SECONDS: float = get_settings().auth_cache_ttl_seconds
+AUTH_CACHE_MAX_SIZE: int = get_settings().auth_cache_max_size
+
+class _PendingLoad:
+    """A load in progress that concurrent callers for the same key wait on"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: BaseException | None = None
+
+class TokenCache:
+    """
+    In-process LRU cache of verified access tokens
+
+    Entries are keyed by the SHA-256 digest of the token and hold the resolved
+    principal until min(token exp, ttl). Concurrent misses for the same token
+    share a single load. The cache is per process, so invalidation only
+    reaches the current worker and the TTL bounds staleness elsewhere.
+    """
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[Any, float, Hashable]] = OrderedDict()
+        self._by_user: dict[Hashable, set[str]] = {}
+        self._pending: dict[str, _PendingLoad] = {}
+        self._async_pending: dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        # Bumped by every invalidation so loads that started before it are not stored
+        self._generation = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl_seconds > 0
+
+    @staticmethod
+    def digest(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Any | None:
+        """Return the cached principal for a token, or None"""
+        if not self.enabled:
+            return None
+        key = self.digest(token)
+        with self._lock:
+            return self._get_locked(key)
+
+    def get_or_load(self, token: str, loader: Callable[[], tuple[Any, Hashable, float]], store: bool = True) -> Any:
+        """
+        Return the cached principal for a token, loading it on a miss
+
+        Args:
+            token (str): Raw bearer token
+            loader (Callable): Returns the principal, its user id and the token
+                exp as a unix timestamp. Exceptions are propagated to every
+                waiting caller and nothing is cached.
+            store (bool): Whether the loaded principal may be cached, False for replica reads
+        """
+        if not self.enabled:
+            principal, _, _ = loader()
+            return principal
+
+        key = self.digest(token)
+        with self._lock:
+            principal = self._get_locked(key)
+            if principal is not None:
+                return principal
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = _PendingLoad()
+                self._pending[key] = pending
+                generation = self._generation
+
+        if not owner:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            principal, user_id, expires_at = loader()
+        except BaseException as e:
+            pending.error = e
+            raise
+        else:
+            pending.value = principal
+            with self._lock:
+                if store and generation == self._generation:
+                    self._set_locked(key, principal, user_id, expires_at)
+            return principal
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            pending.done.set()
+
+    async def get_or_load_async(
+        self, token: str, loader: Callable[[], Awaitable[tuple[Any, Hashable, float]]], store: bool = True
+    ) -> Any:
+        """Async version of get_or_load, coalescing concurrent misses on the event loop"""
+        if not self.enabled:
+            principal, _, _ = await loader()
+            return principal
+
+        key = self.digest(token)
+        with self._lock:
+            principal = self._get_locked(key)
+            generation = self._generation
+        if principal is not None:
+            return principal
+
+        pending = self._async_pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        pending = asyncio.get_running_loop().create_future()
+        # Mark the exception as retrieved when nobody else was waiting for it
+        pending.add_done_callback(lambda future: future.cancelled() or future.exception())
+        self._async_pending[key] = pending
+        try:
+            principal, user_id, expires_at = await loader()
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        else:
+            pending.set_result(principal)
+            with self._lock:
+                if store and generation == self._generation:
+                    self._set_locked(key, principal, user_id, expires_at)
+            return principal
+        finally:
+            self._async_pending.pop(key, None)
+
+    def invalidate_user(self, user_id: Hashable):
+        """Drop every cached token that resolves to the given user"""
+        with self._lock:
+            self._generation += 1
+            for key in self._by_user.pop(str(user_id), set()):
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _get_locked(self, key: str) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        principal, expires_at, user_id = entry
+        if expires_at <= time.time():
+            self._remove_locked(key, user_id)
+            return None
+        self._entries.move_to_end(key)
+        return principal
+
+    def _set_locked(self, key: str, principal: Any, user_id: Hashable, token_expires_at: float):
+        expires_at = min(time.time() + self.ttl_seconds, token_expires_at)
+        if expires_at <= time.time():
+            return
+        user_key = str(user_id)
+        self._entries[key] = (principal, expires_at, user_key)
+        self._entries.move_to_end(key)
+        self._by_user.setdefault(user_key, set()).add(key)
+        while len(self._entries) > self.max_size:
+            evicted_key, (_, _, evicted_user) = self._entries.popitem(last=False)
+            self._discard_user_key(evicted_key, evicted_user)
+
+    def _remove_locked(self, key: str, user_id: Hashable):
+        self._entries.pop(key, None)
+        self._discard_user_key(key, user_id)
+
+    def _discard_user_key(self, key: str, user_id: Hashable):
+        keys = self._by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[user_id]
+
+# Shared cache used by get_current_user
+token_cache = TokenCache(AUTH_CACHE_MAX_SIZE, AUTH_CACHE_TTL_SECONDS)
@@ -1,15 +1,22 @@
 from fastapi import Depends, status
 from fastapi.security import OAuth2PasswordBearer
-from typing import Annotated
+from typing import Annotated, Optional
 from uuid import UUID
-from sqlmodel import select
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 import jwt
 
-from src.database.core import SessionDep
+from src.database.core import ReadSessionDep, AsyncReadSessionDep
+from src.database.replicas import is_replica_session
+from src.database.tenants import current_tenant, verified_claims
 from src.entities.user import User, UserRole
 from src.exceptions import ForbiddenError, CredentialsError
+from src.lib import utils
 from src.lib.utils import verify_auth_token
+from src.auth.cache import token_cache
+from src.auth.token_versions import token_versions
+from src.auth.revocation import revoked_tokens
+from src.domain.users import repository as users_repository, async_repository as users_async_repository
+from src.domain.users.loader import UserLoaderDep, AsyncUserLoaderDep
 
 # OAuth2 scheme for token extraction
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token", scheme_name="Email & Password Auth")
@@ -18,32 +25,148 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token", scheme_name="Email &
 class TokenData(BaseModel):
     user_id: str
 
-# Base dependency to get the current user
-def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: SessionDep) -> User:
-    """Get the current user from the token"""
+# Authenticated principal, detached from any session so it can be cached
+class CurrentUser(BaseModel):
+    id: UUID
+    username: Optional[str] = None
+    email: Optional[str] = None
+    role: UserRole
+    is_active: bool
+    # Only set for principals built from stateless token claims
+    token_version: Optional[int] = None
+    # Id and expiry of the token the principal was authenticated with
+    jti: Optional[str] = None
+    exp: Optional[int] = None
+
+    model_config = ConfigDict(frozen=True)
+
+    @classmethod
+    def from_user(cls, user: User, payload: dict | None = None) -> "CurrentUser":
+        payload = payload or {}
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            role=user.role,
+            is_active=user.is_active,
+            jti=payload.get("jti"),
+            exp=payload.get("exp")
+        )
+
+    @classmethod
+    def from_claims(cls, payload: dict) -> Optional["CurrentUser"]:
+        """Build a principal from stateless token claims, None if the token has none"""
+        if "token_version" not in payload or "role" not in payload:
+            return None
+        return cls(
+            id=payload["sub"],
+            role=payload["role"],
+            is_active=payload.get("is_active", True),
+            token_version=payload["token_version"],
+            jti=payload.get("jti"),
+            exp=payload.get("exp")
+        )
+
+def decode_access_token(token: str) -> dict:
+    """Verify a bearer token, raising CredentialsError if it is invalid"""
     try:
-        # Use the verify_auth_token function from utils
-        payload = verify_auth_token(token)
+        # Verified by TenantMiddleware already, when it ran for this request
+        payload = verified_claims(token)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise CredentialsError()
-        token_data = TokenData(user_id=user_id)
+        TokenData(user_id=user_id)
     except jwt.PyJWTError:
         raise CredentialsError()
-        
-    # Get user from database
-    user = db.exec(select(User).where(User.id == token_data.user_id)).one_or_none()
-    if user is None:
+    # Refresh tokens are only accepted by the refresh endpoint
+    if payload.get("type") == "refresh":
         raise CredentialsError()
-        
-    return user
+    return payload
+
+def decode_refresh_token(token: str) -> dict:
+    """Verify a refresh token, raising CredentialsError if it is invalid"""
+    try:
+        payload = verify_auth_token(token)
+    except jwt.PyJWTError:
+        raise CredentialsError(message="Invalid refresh token")
+    if payload.get("type") != "refresh" or payload.get("sub") is None:
+        raise CredentialsError(message="Invalid refresh token")
+    # Refresh tokens are sent in the body, the tenant must be named by the request
+    if payload.get("tenant") != current_tenant():
+        raise CredentialsError(message="Invalid refresh token")
+    return payload
+
+def principal_from_claims(payload: dict) -> Optional[CurrentUser]:
+    """Stateless tokens carry everything needed for authorization"""
+    if not utils.AUTH_STATELESS:
+        return None
+    return CurrentUser.from_claims(payload)
+
+def subject_id(payload: dict) -> UUID:
+    """User id in the sub claim"""
+    try:
+        return UUID(payload["sub"])
+    except (KeyError, TypeError, ValueError):
+        raise CredentialsError()
+
+def ensure_not_revoked(principal: CurrentUser) -> CurrentUser:
+    """Revocation is checked on every request, cached or not"""
+    if principal.token_version is not None and token_versions.current().is_revoked(principal.id, principal.token_version):
+        raise CredentialsError()
+    if principal.jti is not None and revoked_tokens.current().is_revoked(principal.jti):
+        raise CredentialsError(message="Token has been revoked")
+    return principal
+
+def cacheable_principal(db) -> bool:
+    """Users read from a replica may predate a write, so their principals are not cached"""
+    return utils.AUTH_STATELESS or not is_replica_session(db)
+
+# Base dependency to get the current user
+def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: ReadSessionDep) -> CurrentUser:
+    """Get the current user from the token, served from the token cache when possible"""
+    def load_user():
+        payload = decode_access_token(token)
+        principal = principal_from_claims(payload)
+        if principal is not None:
+            return principal, principal.id, payload["exp"]
+            
+        # Get user from the user cache or the database
+        user = users_repository.get_user_by_id(subject_id(payload), db)
+        if user is None:
+            raise CredentialsError()
+            
+        return CurrentUser.from_user(user, payload), user.id, payload["exp"]
+
+    return ensure_not_revoked(token_cache.get_or_load(token, load_user, store=cacheable_principal(db)))
+
+async def get_current_user_async(token: Annotated[str, Depends(oauth2_scheme)], db: AsyncReadSessionDep) -> CurrentUser:
+    """Same as get_current_user, loading the user with an async session"""
+    async def load_user():
+        payload = decode_access_token(token)
+        principal = principal_from_claims(payload)
+        if principal is not None:
+            return principal, principal.id, payload["exp"]
+
+        user = await users_async_repository.get_user_by_id(subject_id(payload), db)
+        if user is None:
+            raise CredentialsError()
+
+        return CurrentUser.from_user(user, payload), user.id, payload["exp"]
+
+    return ensure_not_revoked(await token_cache.get_or_load_async(token, load_user, store=cacheable_principal(db)))
 
 # Define permission levels using the current user
 class RoleChecker:
     def __init__(self, allowed_roles: list[UserRole]):
         self.allowed_roles = allowed_roles
 
-    def __call__(self, current_user: Annotated[User, Depends(get_current_user)]):
+    def __call__(self, current_user: Annotated[CurrentUser, Depends(get_current_user)]):
+        if current_user.role not in self.allowed_roles:
+            raise ForbiddenError()
+        return current_user
+
+class AsyncRoleChecker(RoleChecker):
+    async def __call__(self, current_user: Annotated[CurrentUser, Depends(get_current_user_async)]):
         if current_user.role not in self.allowed_roles:
             raise ForbiddenError()
         return current_user
@@ -51,9 +174,16 @@ class RoleChecker:
 # Permission dependencies
 allow_superadmin_admin = RoleChecker([UserRole.SUPERADMIN, UserRole.ADMIN])
 allow_superadmin_admin_employee = RoleChecker([UserRole.SUPERADMIN, UserRole.ADMIN, UserRole.EMPLOYEE])
+allow_superadmin_admin_async = AsyncRoleChecker([UserRole.SUPERADMIN, UserRole.ADMIN])
+allow_superadmin_admin_employee_async = AsyncRoleChecker([UserRole.SUPERADMIN, UserRole.ADMIN, UserRole.EMPLOYEE])
 
-# Special dependency for update operations
-def allow_update_own_account(current_user: Annotated[User, Depends(get_current_user)], db: SessionDep):
+def needs_target_role(current_user: CurrentUser, target_user_id: UUID) -> bool:
+    """Whether deciding an update of target_user_id depends on the target's role"""
+    if str(target_user_id) == str(current_user.id):
+        return False
+    return current_user.role in (UserRole.ADMIN, UserRole.EMPLOYEE)
+
+def authorize_update(current_user: CurrentUser, target_user_id: UUID | None, target_role: UserRole | None) -> CurrentUser:
     """
     Allows:
     - Superadmins to update any account
@@ -61,30 +191,72 @@ def allow_update_own_account(current_user: Annotated[User, Depends(get_current_u
     - Employees to update their own account or client accounts
     - Clients to update only their own account
     """
-    # Return a function that checks if the current user can update the target user
-    def can_update_user(target_user_id: UUID):
-        # If same user, always allow
-        if str(target_user_id) == str(current_user.id):
-            return current_user
-            
-        # Check roles
-        if current_user.role == UserRole.SUPERADMIN:
-            # Superadmins can update any account
-            return current_user
-        elif current_user.role == UserRole.ADMIN:
-            # Admins can update any account except superadmins
-            target_user = db.exec(select(User).where(User.id == target_user_id)).one_or_none()
-            if target_user and target_user.role == UserRole.SUPERADMIN:
-                raise ForbiddenError(message="Not enough permissions to update superadmin accounts")
+    # If same user, always allow
+    if str(target_user_id) == str(current_user.id):
+        return current_user
+        
+    # Check roles
+    if current_user.role == UserRole.SUPERADMIN:
+        # Superadmins can update any account
+        return current_user
+    elif current_user.role == UserRole.ADMIN:
+        # Admins can update any account except superadmins
+        if target_role == UserRole.SUPERADMIN:
+            raise ForbiddenError(message="Not enough permissions to update superadmin accounts")
+        return current_user
+    elif current_user.role == UserRole.EMPLOYEE:
+        # Employees can update client accounts
+        if target_role == UserRole.CLIENT:
             return current_user
-        elif current_user.role == UserRole.EMPLOYEE:
-            # Employees can update client accounts
-            target_user = db.exec(select(User).where(User.id == target_user_id)).one_or_none()
-            if target_user and target_user.role == UserRole.CLIENT:
-                return current_user
-            raise ForbiddenError(message="Employees can only update client accounts")
-        else:
-            # Clients can only update their own account (handled by first check)
-            raise ForbiddenError()
+        raise ForbiddenError(message="Employees can only update client accounts")
+    else:
+        # Clients can only update their own account (handled by first check)
+        raise ForbiddenError()
+
+def updatable_roles(current_user: CurrentUser) -> set[UserRole]:
+    """Roles of the other accounts current_user may update, per authorize_update"""
+    roles = set()
+    for role in UserRole:
+        try:
+            authorize_update(current_user, None, role)
+        except ForbiddenError:
+            continue
+        roles.add(role)
+    return roles
+
+def authorize_updates(current_user: CurrentUser, target_roles: dict[UUID, UserRole]) -> dict[UUID, str]:
+    """Set-wise authorize_update, the reason each refused target was refused"""
+    refused = {}
+    for target_user_id, target_role in target_roles.items():
+        try:
+            authorize_update(current_user, target_user_id, target_role)
+        except ForbiddenError as e:
+            refused[target_user_id] = e.detail
+    return refused
+
+# Special dependency for update operations
+def allow_update_own_account(current_user: Annotated[CurrentUser, Depends(get_current_user)], users: UserLoaderDep):
+    """Return a function that checks if the current user can update the target user
     
+    The target is read from the primary, never the user cache, with the
+    request's user loader so the update reuses it.
+    """
+    def can_update_user(target_user_id: UUID):
+        target_role = None
+        if needs_target_role(current_user, target_user_id):
+            target = users.load(target_user_id)
+            target_role = target.role if target is not None else None
+        return authorize_update(current_user, target_user_id, target_role)
+    
+    return can_update_user
+
+async def allow_update_own_account_async(current_user: Annotated[CurrentUser, Depends(get_current_user_async)], users: AsyncUserLoaderDep):
+    """Async version of allow_update_own_account, the returned checker must be awaited"""
+    async def can_update_user(target_user_id: UUID):
+        target_role = None
+        if needs_target_role(current_user, target_user_id):
+            target = await users.load(target_user_id)
+            target_role = target.role if target is not None else None
+        return authorize_update(current_user, target_user_id, target_role)
+
     return can_update_user
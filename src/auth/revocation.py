@@ -0,0 +1,118 @@
+import hashlib
+import math
+import threading
+import time
+from typing import Callable, Dict
+from sqlmodel import Session, select, delete
+
+from src.entities.user import RevokedToken
+from src.database.replicas import untracked_writes
+from src.database.tenants import PerTenant, tenant_session_factory
+from src.lib.background import PeriodicTask
+from src.settings import get_settings
+
+REVOCATION_REFRESH_SECONDS: float = get_settings().revocation_refresh_seconds
+REVOCATION_FILTER_CAPACITY: int = get_settings().revocation_filter_capacity
+REVOCATION_FILTER_ERROR_RATE: float = get_settings().revocation_filter_error_rate
+AUTH_PURGE_SECONDS: float = get_settings().auth_purge_seconds
+
+class BloomFilter:
+    """
+    Fixed size Bloom filter of strings
+
+    Membership tests never give false negatives, and give false positives
+    at about error_rate once capacity items were added.
+    """
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hash_count = max(round(self.size / capacity * math.log(2)), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Double hashing, two 64 bit halves of one digest give every position
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+class RevocationList:
+    """
+    In-memory set of revoked token ids (jti) and their expiry
+
+    A Bloom filter sits in front of the set, so the common case of a token
+    that was never revoked is answered without touching the set. refresh
+    reloads the unexpired revocations from the revoked_token table and
+    purge deletes the expired rows, both run by background tasks so
+    requests never wait on the database. Local revocations are applied
+    immediately.
+    """
+    def __init__(self, capacity: int, error_rate: float, session_factory: Callable[[], Session]):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._session_factory = session_factory
+        self._revoked: Dict[str, int] = {}
+        self._filter = BloomFilter(capacity, error_rate)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def is_revoked(self, jti: str) -> bool:
+        """Whether a token id was revoked"""
+        if jti not in self._filter:
+            return False
+        exp = self._revoked.get(jti)
+        return exp is not None and exp > time.time()
+
+    def revoke(self, jti: str, exp: int):
+        """Record a revocation made by this process, already stored in the database"""
+        with self._lock:
+            self._revoked[jti] = exp
+            self._filter.add(jti)
+
+    def _rebuild(self, revoked: Dict[str, int]):
+        """Swap in a new set and a filter sized for it, must hold the lock"""
+        bloom = BloomFilter(max(self.capacity, 2 * len(revoked)), self.error_rate)
+        for jti in revoked:
+            bloom.add(jti)
+        self._revoked, self._filter = revoked, bloom
+
+    def refresh(self):
+        """Reload the unexpired revocations from the database, forgetting expired ones"""
+        with self._refresh_lock:
+            now = int(time.time())
+            table = RevokedToken.__table__
+            with untracked_writes(), self._session_factory() as session:
+                rows = session.exec(select(table.c.jti, table.c.exp).where(table.c.exp > now)).all()
+            with self._lock:
+                revoked = {jti: exp for jti, exp in rows}
+                # Keep local revocations the query may have missed
+                for jti, exp in self._revoked.items():
+                    if exp > now:
+                        revoked.setdefault(jti, exp)
+                self._rebuild(revoked)
+
+    def purge(self):
+        """Delete the revocations of tokens that expired"""
+        table = RevokedToken.__table__
+        with untracked_writes(), self._session_factory() as session:
+            session.exec(delete(table).where(table.c.exp <= int(time.time())))
+            session.commit()
+
+# Lists of each tenant, checked by get_current_user on every request
+revoked_tokens: PerTenant[RevocationList] = PerTenant(
+    "Revocation list",
+    lambda tenant: RevocationList(REVOCATION_FILTER_CAPACITY, REVOCATION_FILTER_ERROR_RATE, tenant_session_factory(tenant))
+)
+
+# Started by the app lifespan
+revocation_refresh = PeriodicTask(
+    "Revocation list refresh", REVOCATION_REFRESH_SECONDS, lambda: revoked_tokens.for_each("refresh")
+)
+revoked_token_purge = PeriodicTask("Revoked token purge", AUTH_PURGE_SECONDS, lambda: revoked_tokens.for_each("purge"))
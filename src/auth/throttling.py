@@ -0,0 +1,67 @@
+import logging
+import math
+import time
+from fastapi import Request
+from limits import RateLimitItem, parse, storage
+from limits.aio import strategies
+from src.exceptions import TooManyRequestsError
+from src.settings import get_settings
+
+# Signin attempts allowed per window, e.g. "20/minute", empty disables the limit
+SIGNIN_RATE_LIMIT_PER_IP: str = get_settings().signin_rate_limit_per_ip
+SIGNIN_RATE_LIMIT_PER_EMAIL: str = get_settings().signin_rate_limit_per_email
+# limits storage, memory:// keeps counters per worker, redis:// or memcached:// share them
+RATE_LIMIT_STORAGE_URI: str = get_settings().rate_limit_storage_uri
+
+class SigninThrottle:
+    """
+    Sliding window limits on signin attempts per client IP and per email
+
+    Each attempt takes its slots before the user lookup and the password
+    verification, in one step per key, so concurrent attempts can't all
+    pass and a throttled attempt costs no bcrypt round. A successful
+    signin clears the email's count; the IP keeps its slot, so a valid
+    account can't reset the budget of an IP guessing others. Counters
+    live in the limits async storage, so shared storage doesn't block
+    the event loop. Storage errors let the attempt through rather than
+    locking everybody out.
+    """
+    def __init__(self, ip_limit: str, email_limit: str, storage_uri: str):
+        self.storage = storage.storage_from_string(f"async+{storage_uri}")
+        self._limiter = strategies.MovingWindowRateLimiter(self.storage)
+        self._limits = [(scope, parse(limit)) for scope, limit in (("ip", ip_limit), ("email", email_limit)) if limit]
+
+    def _keys(self, ip: str | None, email: str) -> list[tuple[RateLimitItem, str, str]]:
+        values = {"ip": ip, "email": email.strip().lower()}
+        return [(limit, scope, values[scope]) for scope, limit in self._limits if values[scope]]
+
+    async def acquire(self, ip: str | None, email: str):
+        """Count an attempt against the IP and the email, raise TooManyRequestsError if either ran out"""
+        try:
+            for limit, scope, value in self._keys(ip, email):
+                if not await self._limiter.hit(limit, "signin", scope, value):
+                    reset_time, _ = await self._limiter.get_window_stats(limit, "signin", scope, value)
+                    raise TooManyRequestsError(max(math.ceil(reset_time - time.time()), 1))
+        except TooManyRequestsError:
+            raise
+        except Exception:
+            logging.exception("Signin rate limit check failed, letting the attempt through")
+
+    async def record_success(self, ip: str | None, email: str):
+        """Clear the attempts counted against the email of a successful signin"""
+        try:
+            for limit, scope, value in self._keys(ip, email):
+                if scope == "email":
+                    await self._limiter.clear(limit, "signin", scope, value)
+        except Exception:
+            logging.exception("Signin rate limit update failed")
+
+    async def reset(self):
+        await self.storage.reset()
+
+def client_ip(request: Request) -> str | None:
+    """Address of the client, the proxy's unless the server is run with --proxy-headers"""
+    return request.client.host if request.client else None
+
+# Shared throttle used by the signin endpoints
+signin_throttle = SigninThrottle(SIGNIN_RATE_LIMIT_PER_IP, SIGNIN_RATE_LIMIT_PER_EMAIL, RATE_LIMIT_STORAGE_URI)
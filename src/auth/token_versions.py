@@ -0,0 +1,101 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict
+from uuid import UUID
+from sqlmodel import Session, select, delete
+
+from src.entities.user import User, DeletedUser
+from src.lib.background import PeriodicTask
+from src.database.tenants import PerTenant, tenant_session_factory
+from src.settings import get_settings
+
+TOKEN_VERSION_REFRESH_SECONDS: float = get_settings().token_version_refresh_seconds
+AUTH_PURGE_SECONDS: float = get_settings().auth_purge_seconds
+# A version bump only matters to access tokens issued before it, which expire within this
+TOKEN_LIFETIME_SECONDS: float = get_settings().access_token_expire_minutes * 60
+# Consecutive refreshes overlap by this much, covering clock skew between workers
+# and transactions that commit after the refresh that should have seen them
+TOKEN_VERSION_REFRESH_OVERLAP_SECONDS = 60
+
+# Version of deleted users, behind which every token they hold is
+DELETED_USER_VERSION = 2**31 - 1
+
+class TokenVersionMap:
+    """
+    In-memory map of user id -> current token_version of recently changed users
+
+    Users are tracked for token_lifetime after their version was last seen,
+    long enough for every token issued before it to expire. Every other user
+    is implicitly at version 0. Each refresh only reads the users updated and
+    deleted since the previous one, local bumps are applied immediately.
+    """
+    def __init__(self, token_lifetime: float, overlap: float, session_factory: Callable[[], Session]):
+        self.token_lifetime = token_lifetime
+        self.overlap = overlap
+        self._session_factory = session_factory
+        # user id -> (version, monotonic time after which it can be forgotten)
+        self._versions: Dict[UUID, tuple[int, float]] = {}
+        self._refreshed_at: datetime | None = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def current(self, user_id: UUID) -> int:
+        """Get the current token version for a user"""
+        entry = self._versions.get(user_id)
+        return entry[0] if entry is not None else 0
+
+    def is_revoked(self, user_id: UUID, token_version: int) -> bool:
+        return token_version < self.current(user_id)
+
+    def _track(self, versions: Dict[UUID, int]):
+        """Merge versions into the map, must hold the lock"""
+        forget_at = time.monotonic() + self.token_lifetime
+        for user_id, version in versions.items():
+            previous = self._versions.get(user_id)
+            self._versions[user_id] = (max(version, previous[0]) if previous else version, forget_at)
+
+    def bump(self, user_id: UUID, token_version: int):
+        """Record a version bump made by this process"""
+        with self._lock:
+            self._track({user_id: token_version})
+
+    def refresh(self):
+        """Load the users changed or deleted since the previous refresh, forget the expired ones"""
+        with self._refresh_lock:
+            started = datetime.now()
+            since = self._refreshed_at or started - timedelta(seconds=self.token_lifetime)
+            since -= timedelta(seconds=self.overlap)
+            with self._session_factory() as session:
+                rows = session.exec(
+                    select(User.id, User.token_version).where(User.updated_at >= since, User.token_version > 0)
+                ).all()
+                deleted = session.exec(select(DeletedUser.user_id).where(DeletedUser.deleted_at >= since)).all()
+
+            versions = {user_id: version for user_id, version in rows}
+            versions.update((user_id, DELETED_USER_VERSION) for user_id in deleted)
+            now = time.monotonic()
+            with self._lock:
+                self._track(versions)
+                self._versions = {user_id: entry for user_id, entry in self._versions.items() if entry[1] > now}
+            self._refreshed_at = started
+
+    def purge(self):
+        """Delete the deletion records older than any token they could revoke"""
+        cutoff = datetime.now() - timedelta(seconds=self.token_lifetime + self.overlap)
+        with self._session_factory() as session:
+            table = DeletedUser.__table__
+            session.exec(delete(table).where(table.c.deleted_at < cutoff))
+            session.commit()
+
+# Maps of each tenant, used by get_current_user in stateless mode
+token_versions: PerTenant[TokenVersionMap] = PerTenant(
+    "Token version map",
+    lambda tenant: TokenVersionMap(TOKEN_LIFETIME_SECONDS, TOKEN_VERSION_REFRESH_OVERLAP_SECONDS, tenant_session_factory(tenant))
+)
+
+# Started by the app lifespan
+token_version_refresh = PeriodicTask(
+    "Token version refresh", TOKEN_VERSION_REFRESH_SECONDS, lambda: token_versions.for_each("refresh")
+)
+deleted_user_purge = PeriodicTask("Deleted user purge", AUTH_PURGE_SECONDS, lambda: token_versions.for_each("purge"))
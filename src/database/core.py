@@ -1,58 +1,325 @@
-import os
-from dotenv import load_dotenv
+import hashlib
+import logging
+import threading
 from sqlmodel import SQLModel, Session, create_engine
-from typing import Annotated
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Annotated, Callable
 from fastapi import Depends
-from sqlalchemy.schema import CreateSchema
-from sqlalchemy.exc import ProgrammingError
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.schema import CreateIndex, CreateSchema, CreateTable
+from src.database.pool import InstrumentedQueuePool, InstrumentedAsyncQueuePool
+from src.metrics import track_queries
+from src.database.tenants import tenant_bind, tenant_schemas
+from src.database.replicas import reads_pinned, REPLICA_SESSION
+from src.database.search import create_search_indexes, search_index_statements
+from src.settings import get_settings
 
-app_env = os.getenv("APP_ENV", "dev")
-env_file = f"env/.env.{app_env}"
-print(f"Loading environment variables from {env_file}")
-load_dotenv(env_file)
+settings = get_settings()
 
-# Base engine for database operations
-engine = create_engine(os.getenv("DATABASE_URL"))
+# Connection pool settings, shared by the sync and async engines
+DB_POOL_SIZE: int = settings.db_pool_size
+DB_MAX_OVERFLOW: int = settings.db_max_overflow
+DB_POOL_TIMEOUT: float = settings.db_pool_timeout
+DB_POOL_RECYCLE: int = settings.db_pool_recycle
+DB_POOL_PRE_PING: bool = settings.db_pool_pre_ping
+DB_STATEMENT_TIMEOUT_MS: int = settings.db_statement_timeout_ms
+DB_APPLICATION_NAME: str = settings.db_application_name
+
+def engine_options() -> dict:
+    """Keyword arguments for create_engine / create_async_engine"""
+    connect_args = {"application_name": DB_APPLICATION_NAME}
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
+# Engines are created on first use, so importing the app never connects
+# and the async driver is only needed when the async stack is used
+_engine: Engine | None = None
+_engine_lock = threading.Lock()
+_async_engine: AsyncEngine | None = None
+_replica_engine: Engine | None = None
+_async_replica_engine: AsyncEngine | None = None
+
+def get_engine() -> Engine:
+    """Get the shared engine"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(settings.database_url, poolclass=InstrumentedQueuePool, **engine_options())
+                track_queries(engine)
+                _engine = engine
+    return _engine
+
+def get_replica_engine() -> Engine | None:
+    """Get the shared read replica engine, None without DATABASE_REPLICA_URL"""
+    global _replica_engine
+    if _replica_engine is None and settings.database_replica_url:
+        with _engine_lock:
+            if _replica_engine is None:
+                engine = create_engine(settings.database_replica_url, poolclass=InstrumentedQueuePool, **engine_options())
+                track_queries(engine)
+                _replica_engine = engine
+    return _replica_engine
+
+def async_driver_url(url: str) -> str:
+    """url switched to the psycopg (v3) async driver"""
+    return make_url(url).set(drivername="postgresql+psycopg").render_as_string(hide_password=False)
+
+def async_database_url() -> str:
+    """ASYNC_DATABASE_URL, or DATABASE_URL switched to the psycopg (v3) async driver"""
+    return settings.async_database_url or async_driver_url(settings.database_url)
+
+def get_async_engine() -> AsyncEngine:
+    """Get the shared async engine"""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(async_database_url(), poolclass=InstrumentedAsyncQueuePool, **engine_options())
+        track_queries(_async_engine.sync_engine)
+    return _async_engine
+
+def get_async_replica_engine() -> AsyncEngine | None:
+    """Get the shared async read replica engine, None without DATABASE_REPLICA_URL"""
+    global _async_replica_engine
+    if _async_replica_engine is None and settings.database_replica_url:
+        url = settings.async_database_replica_url or async_driver_url(settings.database_replica_url)
+        _async_replica_engine = create_async_engine(url, poolclass=InstrumentedAsyncQueuePool, **engine_options())
+        track_queries(_async_replica_engine.sync_engine)
+    return _async_replica_engine
+
+async def dispose_async_engine():
+    """Close the async engines' connections, if they were ever created"""
+    global _async_engine, _async_replica_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+    if _async_replica_engine is not None:
+        await _async_replica_engine.dispose()
+        _async_replica_engine = None
 
 # Define schemas
 GLOBAL_SCHEMA = "real_state_global"
 
+# Fingerprint of the DDL init_db last applied, one row
+schema_version = Table(
+    "schema_version",
+    MetaData(schema=GLOBAL_SCHEMA),
+    Column("id", Integer, primary_key=True),
+    Column("fingerprint", String(64), nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+)
+
+# Serializes init_db across workers booting at the same time
+SCHEMA_LOCK_KEY = 0x7265616c7374
+
 def create_schema(schema_name: str):
     """Create schema if it doesn't exist"""
-    with engine.connect() as connection:
-        try:
-            connection.execute(CreateSchema(schema_name))
-            connection.commit()
-            print(f"Schema '{schema_name}' created successfully")
-        except ProgrammingError:
-            connection.rollback()
-            print(f"Schema '{schema_name}' already exists")
-
-def init_db():
-    """Initialize the database with schemas and tables"""
-    # Create schemas
-    create_schema(GLOBAL_SCHEMA)
-    
-    # Create tables in global schema
-    from src.entities.user import User, Token
-    
-    # Set schema for User and Token models
+    with get_engine().begin() as connection:
+        connection.execute(CreateSchema(schema_name, if_not_exists=True))
+    logging.info(f"Schema '{schema_name}' is ready")
+
+def schema_fingerprint() -> str:
+    """Hash of the DDL the models compile to, changes whenever a table, column or index does"""
+    dialect = postgresql.dialect()
+    statements = []
+    for table in SQLModel.metadata.sorted_tables:
+        statements.append(str(CreateTable(table).compile(dialect=dialect)))
+        statements += sorted(str(CreateIndex(index).compile(dialect=dialect)) for index in table.indexes)
+    statements += search_index_statements(GLOBAL_SCHEMA)
+    return hashlib.sha256("\n".join(statements).encode()).hexdigest()
+
+def applied_fingerprint(connection: Connection) -> str | None:
+    """Fingerprint stored by the last init_db, None on a fresh database"""
+    if connection.execute(text("SELECT to_regclass(:name)"), {"name": f"{schema_version.schema}.{schema_version.name}"}).scalar() is None:
+        return None
+    return connection.execute(select(schema_version.c.fingerprint).where(schema_version.c.id == 1)).scalar()
+
+class SchemaMismatchError(RuntimeError):
+    """Existing tables differ from the models in ways create_all can't fix"""
+
+def schema_mismatches(connection: Connection, schema: str) -> list[str]:
+    """
+    Differences between the tables of schema and the models
+
+    Reports model columns missing from the database, and database columns
+    unknown to the models that inserts would have to fill. Missing tables
+    are left to create_all.
+    """
+    inspector = inspect(connection)
+    mismatches = []
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name, schema=schema):
+            continue
+        columns = {column["name"]: column for column in inspector.get_columns(table.name, schema=schema)}
+        missing = [column.name for column in table.columns if column.name not in columns]
+        required = [
+            name for name, column in columns.items()
+            if name not in table.columns and not column["nullable"] and column["default"] is None
+        ]
+        if missing:
+            mismatches.append(f"{schema}.{table.name} lacks columns {', '.join(missing)}")
+        if required:
+            mismatches.append(f"{schema}.{table.name} has required columns unknown to the models: {', '.join(required)}")
+    return mismatches
+
+def apply_schema(connection: Connection, schema: str) -> list[str]:
+    """Create the missing tables and indexes of schema, returning how its existing tables differ from the models"""
+    connection.execute(CreateSchema(schema, if_not_exists=True))
+    if schema != GLOBAL_SCHEMA:
+        connection = connection.execution_options(schema_translate_map={GLOBAL_SCHEMA: schema})
+    SQLModel.metadata.create_all(connection)
+    # Indexes of missing columns can't be created
+    mismatches = schema_mismatches(connection, schema)
+    if mismatches:
+        return mismatches
+    # create_all skips existing tables, along with indexes added to them since
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    create_search_indexes(connection, schema)
+    return []
+
+def init_db() -> bool:
+    """
+    Initialize the database with schemas and tables, the tenants' included
+
+    DDL only runs when the models changed since the last run, which is
+    checked with one query, so booting against a current database is cheap.
+    Workers starting together wait on an advisory lock and the first
+    one applies the DDL.
+
+    create_all only adds tables and indexes. Existing tables that lack
+    columns of the models raise SchemaMismatchError, nothing is applied
+    and the database must be migrated first.
+
+    Returns:
+        bool: Whether DDL was applied
+    """
+    from src.entities.user import User, Token, RevokedToken, DeletedUser
+
+    # Set schema for User, Token, RevokedToken and DeletedUser models
     User.__table__.schema = GLOBAL_SCHEMA
     Token.__table__.schema = GLOBAL_SCHEMA
-    
-    # Create all tables
-    SQLModel.metadata.create_all(engine)
-    print("All tables created successfully")
+    RevokedToken.__table__.schema = GLOBAL_SCHEMA
+    DeletedUser.__table__.schema = GLOBAL_SCHEMA
+
+    fingerprint = schema_fingerprint()
+    with get_engine().connect() as connection:
+        if applied_fingerprint(connection) == fingerprint:
+            logging.info("Database schema is up to date")
+            return False
+
+    with get_engine().begin() as connection:
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        # Another worker may have applied it while we waited for the lock
+        if applied_fingerprint(connection) == fingerprint:
+            return False
+        mismatches = []
+        for schema in [GLOBAL_SCHEMA, *tenant_schemas(connection)]:
+            mismatches += apply_schema(connection, schema)
+        if mismatches:
+            # Raising rolls the DDL back, the fingerprint isn't stored
+            raise SchemaMismatchError(
+                "Database schema differs from the models, migrate it first (see src/database/migrations): " + "; ".join(mismatches)
+            )
+        schema_version.create(connection, checkfirst=True)
+        statement = insert(schema_version).values(id=1, fingerprint=fingerprint)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[schema_version.c.id],
+            set_={"fingerprint": statement.excluded.fingerprint, "applied_at": func.now()}
+        ))
+    logging.info("Database schema created")
+    return True
 
 def get_session():
-    """Get a database session"""
-    with Session(engine) as session:
+    """Get a database session, routed to the schema of the current tenant"""
+    with Session(tenant_bind(get_engine())) as session:
         yield session
 
+async def get_async_session():
+    """Get an async database session, routed to the schema of the current tenant"""
+    async with AsyncSession(tenant_bind(get_async_engine()), expire_on_commit=False) as session:
+        yield session
+
+def get_session_factory() -> Callable[[], Session]:
+    """Get a factory for sessions that must outlive the request dependencies
+
+    Dependencies are closed before a streamed response body is sent, so
+    streaming endpoints open their own session with this.
+    """
+    bind = tenant_bind(get_engine())
+    return lambda: Session(bind)
+
+def get_async_session_factory() -> Callable[[], AsyncSession]:
+    """Async counterpart of get_session_factory"""
+    bind = tenant_bind(get_async_engine())
+    return lambda: AsyncSession(bind, expire_on_commit=False)
+
+SessionDep = Annotated[Session, Depends(get_session)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_session)]
+SessionFactoryDep = Annotated[Callable[[], Session], Depends(get_session_factory)]
+AsyncSessionFactoryDep = Annotated[Callable[[], AsyncSession], Depends(get_async_session_factory)]
+
+def get_read_session(primary: SessionDep):
+    """
+    Get a session for read-only work, on the replica when there is one
+
+    Falls back to the request's primary session without a replica, and
+    while the client is pinned to the primary after a write.
+    """
+    replica = get_replica_engine()
+    if replica is None or reads_pinned():
+        yield primary
+        return
+    with Session(tenant_bind(replica), info={REPLICA_SESSION: True}) as session:
+        yield session
+
+async def get_async_read_session(primary: AsyncSessionDep):
+    """Async counterpart of get_read_session"""
+    replica = get_async_replica_engine()
+    if replica is None or reads_pinned():
+        yield primary
+        return
+    async with AsyncSession(tenant_bind(replica), expire_on_commit=False, info={REPLICA_SESSION: True}) as session:
+        yield session
+
+def get_read_session_factory(primary_factory: SessionFactoryDep) -> Callable[[], Session]:
+    """Session factory for read-only streaming, on the replica when there is one"""
+    replica = get_replica_engine()
+    if replica is None or reads_pinned():
+        return primary_factory
+    bind = tenant_bind(replica)
+    return lambda: Session(bind, info={REPLICA_SESSION: True})
+
+def get_async_read_session_factory(primary_factory: AsyncSessionFactoryDep) -> Callable[[], AsyncSession]:
+    """Async counterpart of get_read_session_factory"""
+    replica = get_async_replica_engine()
+    if replica is None or reads_pinned():
+        return primary_factory
+    bind = tenant_bind(replica)
+    return lambda: AsyncSession(bind, expire_on_commit=False, info={REPLICA_SESSION: True})
+
 def drop_db():
     """Drop all tables in all schemas"""
-    print("Dropping all database tables...")
-    SQLModel.metadata.drop_all(engine)
-    print("All tables dropped successfully")
-    
-SessionDep = Annotated[Session, Depends(get_session)]
\ No newline at end of file
+    logging.info("Dropping all database tables...")
+    with get_engine().begin() as connection:
+        SQLModel.metadata.drop_all(connection)
+        # Forget the applied schema so the next init_db recreates the tables
+        schema_version.drop(connection, checkfirst=True)
+    logging.info("All tables dropped successfully")
+
+ReadSessionDep = Annotated[Session, Depends(get_read_session)]
+AsyncReadSessionDep = Annotated[AsyncSession, Depends(get_async_read_session)]
+ReadSessionFactoryDep = Annotated[Callable[[], Session], Depends(get_read_session_factory)]
+AsyncReadSessionFactoryDep = Annotated[Callable[[], AsyncSession], Depends(get_async_read_session_factory)]
\ No newline at end of file
@@ -0,0 +1,26 @@
+-- Token table: plaintext access / refresh tokens replaced by the refresh token
+-- fingerprint, the jti of the access token issued with it and both expiries.
+--
+-- init_db only creates missing tables and refuses to start while a table lacks
+-- model columns, so databases created before this change must run this first,
+-- once in every schema holding the tables (real_state_global and each tenant_<name>):
+--
+--   psql "$DATABASE_URL" -v schema=real_state_global -f 0001_token_refresh_token_hash.sql
+--
+-- The stored tokens can't be carried over, the jti and the refresh expiry aren't
+-- recoverable from the old columns, so every user signs in again.
+
+BEGIN;
+SET LOCAL search_path TO :"schema";
+
+DELETE FROM token;
+
+ALTER TABLE token
+    DROP COLUMN access_token,
+    DROP COLUMN refresh_token,
+    ADD COLUMN refresh_token_hash VARCHAR(64) NOT NULL,
+    ADD COLUMN access_token_jti VARCHAR(64) NOT NULL,
+    ADD COLUMN refresh_expires_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    ADD CONSTRAINT token_refresh_token_hash_key UNIQUE (refresh_token_hash);
+
+COMMIT;
@@ -0,0 +1,17 @@
+-- User table: token_version, bumped to revoke every token issued before
+-- (stateless authorization mode).
+--
+-- init_db refuses to start while a table lacks model columns, so databases
+-- created before this change must run this first, once in every schema holding
+-- the tables (real_state_global and each tenant_<name>):
+--
+--   psql "$DATABASE_URL" -v schema=real_state_global -f 0002_user_token_version.sql
+--
+-- Existing users start at version 0, the version of every token issued so far.
+
+BEGIN;
+SET LOCAL search_path TO :"schema";
+
+ALTER TABLE "user" ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0;
+
+COMMIT;
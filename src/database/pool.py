@@ -0,0 +1,93 @@
+import threading
+import time
+from typing import Dict
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+class PoolStats:
+    """Counters for a single connection pool, fed by pool events"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool):
+        with self._lock:
+            self.waits += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def increment(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+class InstrumentedPoolMixin:
+    """Times how long callers wait to get a connection out of the pool"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = stats = PoolStats()
+
+        event.listen(self, "connect", lambda *args: stats.increment("connects"))
+        event.listen(self, "checkout", lambda *args: stats.increment("checkouts"))
+        event.listen(self, "checkin", lambda *args: stats.increment("checkins"))
+        event.listen(self, "invalidate", lambda *args: stats.increment("invalidations"))
+
+    def connect(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            # Includes opening a new connection when the pool has none idle
+            self.stats.record_wait(time.perf_counter() - started, timed_out)
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+def get_pool_stats(engine: Engine | AsyncEngine) -> Dict[str, float]:
+    """
+    Snapshot of an engine's pool
+
+    Returns:
+        Dict[str, float]: size and live checked out / idle / overflow
+        connections, plus cumulative event counters and checkout wait times
+    """
+    pool = engine.pool if isinstance(engine, Engine) else engine.sync_engine.pool
+    snapshot: Dict[str, float] = {}
+    if isinstance(pool, QueuePool):
+        snapshot.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+        })
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        snapshot.update({
+            "connects": stats.connects,
+            "checkouts": stats.checkouts,
+            "checkins": stats.checkins,
+            "invalidations": stats.invalidations,
+            "timeouts": stats.timeouts,
+            "wait_seconds_total": stats.wait_seconds_total,
+            "wait_seconds_max": stats.wait_seconds_max,
+            "wait_seconds_avg": stats.wait_seconds_total / stats.waits if stats.waits else 0.0,
+        })
+    return snapshot
@@ -0,0 +1,168 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.cookies import CookieError, SimpleCookie
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+import jwt
+from src.database.tenants import bearer_token, current_tenant, verified_claims
+from src.lib.cache import CacheBackend, MemoryCache, cache_from_url
+from src.settings import get_settings
+
+# Seconds a client keeps reading from the primary after one of its requests wrote
+REPLICA_STICKY_SECONDS: float = get_settings().replica_sticky_seconds
+REPLICA_PIN_CACHE_URL: str = get_settings().replica_pin_cache_url
+# Users pinned at once by the in-process store, the oldest pins are dropped first
+REPLICA_PIN_MAX_SIZE = 100000
+# Cookie holding the epoch time until which the client reads from the primary
+STICKY_COOKIE = "read_primary_until"
+# Session.info key set on sessions bound to a replica
+REPLICA_SESSION = "replica"
+
+class RequestWrites:
+    """Whether the request being served committed a write"""
+    __slots__ = ("pending", "committed")
+
+    def __init__(self):
+        self.pending = False
+        self.committed = False
+
+# Set by the middleware, shared with the threadpool and the async driver greenlets
+_request_writes: ContextVar[RequestWrites | None] = ContextVar("request_writes", default=None)
+_reads_pinned: ContextVar[bool] = ContextVar("reads_pinned", default=False)
+
+def reads_pinned() -> bool:
+    """Whether reads of the current request must see the primary's latest writes"""
+    return _reads_pinned.get()
+
+def is_replica_session(session) -> bool:
+    """Whether session reads from a replica, whose rows may lag the primary"""
+    return session.info.get(REPLICA_SESSION, False)
+
+@contextmanager
+def untracked_writes():
+    """Writes made inside don't pin the client to the primary, for housekeeping done while serving a request"""
+    token = _request_writes.set(None)
+    try:
+        yield
+    finally:
+        _request_writes.reset(token)
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    writes = _request_writes.get()
+    if writes is not None and context is not None and (context.isinsert or context.isupdate or context.isdelete):
+        writes.pending = True
+
+def _commit(conn):
+    writes = _request_writes.get()
+    if writes is not None and writes.pending:
+        writes.committed = True
+
+def _rollback(conn):
+    writes = _request_writes.get()
+    if writes is not None:
+        writes.pending = False
+
+def track_writes():
+    """Record the writes committed by the request being served, on every engine"""
+    if not event.contains(Engine, "after_cursor_execute", _after_cursor_execute):
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "commit", _commit)
+        event.listen(Engine, "rollback", _rollback)
+
+def sticky_until(headers: list[tuple[bytes, bytes]]) -> float:
+    """Time until which the request's cookie pins reads to the primary, 0 without one"""
+    for name, value in headers:
+        if name == b"cookie":
+            try:
+                morsel = SimpleCookie(value.decode("latin-1")).get(STICKY_COOKIE)
+                return float(morsel.value) if morsel is not None else 0.0
+            except (CookieError, ValueError):
+                return 0.0
+    return 0.0
+
+def token_subject(headers: list[tuple[bytes, bytes]]) -> str | None:
+    """Subject of the request's valid bearer token, None without one"""
+    for name, value in headers:
+        if name == b"authorization":
+            token = bearer_token(value.decode("latin-1"))
+            if token is None:
+                return None
+            try:
+                return verified_claims(token).get("sub")
+            except jwt.PyJWTError:
+                return None
+    return None
+
+class PrimaryPins:
+    """
+    Short-lived store of the users whose reads go to the primary
+
+    Bearer token clients don't send cookies back, so their writes pin the
+    token's subject instead. Keys include the tenant.
+    """
+    def __init__(self, backend: CacheBackend, seconds: float):
+        self.backend = backend
+        self.seconds = seconds
+        # Shared backends are network calls, kept off the event loop
+        self._blocking = not isinstance(backend, MemoryCache)
+
+    @staticmethod
+    def key(subject: str) -> str:
+        return f"pin:{current_tenant() or ''}:{subject}"
+
+    async def pin(self, subject: str):
+        if self._blocking:
+            return await run_in_threadpool(self.backend.set, self.key(subject), b"1", self.seconds)
+        self.backend.set(self.key(subject), b"1", self.seconds)
+
+    async def is_pinned(self, subject: str) -> bool:
+        if self._blocking:
+            return await run_in_threadpool(self.backend.get, self.key(subject)) is not None
+        return self.backend.get(self.key(subject)) is not None
+
+# Shared store used by the replica routing middleware
+primary_pins = PrimaryPins(cache_from_url(REPLICA_PIN_CACHE_URL, REPLICA_PIN_MAX_SIZE, "realstate:"), REPLICA_STICKY_SECONDS)
+
+class ReplicaRoutingMiddleware:
+    """
+    ASGI middleware giving clients read-your-writes on top of replica reads
+
+    After a request that committed a write, the client's reads go to the
+    primary for REPLICA_STICKY_SECONDS, long enough for the replicas to
+    catch up. Browsers are pinned by a cookie set on the response, bearer
+    token clients by the token's subject in primary_pins. Does nothing
+    when no replica is configured.
+    """
+    def __init__(self, app):
+        self.app = app
+        track_writes()
+
+    async def __call__(self, scope, receive, send):
+        from src.database.core import get_replica_engine
+        if scope["type"] != "http" or get_replica_engine() is None:
+            return await self.app(scope, receive, send)
+
+        writes = RequestWrites()
+        subject = token_subject(scope["headers"])
+        pinned = sticky_until(scope["headers"]) > time.time() or (subject is not None and await primary_pins.is_pinned(subject))
+        pinned_token = _reads_pinned.set(pinned)
+        writes_token = _request_writes.set(writes)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and writes.committed:
+                if subject is not None:
+                    await primary_pins.pin(subject)
+                cookie = (
+                    f"{STICKY_COOKIE}={time.time() + REPLICA_STICKY_SECONDS:.3f}; "
+                    f"Max-Age={int(REPLICA_STICKY_SECONDS) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                )
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_writes.reset(writes_token)
+            _reads_pinned.reset(pinned_token)
@@ -0,0 +1,48 @@
+import logging
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+
+# User columns matched by trigram similarity, each with a GIN index
+SEARCH_COLUMNS = ("username", "email")
+
+TRIGRAM_CHECK = text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+
+# Whether pg_trgm is installed, set by init_db or on the first search of the process
+trigram_installed: bool | None = None
+
+def search_index_statements(schema: str | None) -> list[str]:
+    """DDL of the trigram indexes on the user table of schema"""
+    from src.entities.user import User
+    preparer = postgresql.dialect().identifier_preparer
+    table = preparer.quote(User.__table__.name)
+    if schema:
+        table = f"{preparer.quote_schema(schema)}.{table}"
+    return [
+        f"CREATE INDEX IF NOT EXISTS ix_user_{column}_trgm ON {table} USING gin ({preparer.quote(column)} gin_trgm_ops)"
+        for column in SEARCH_COLUMNS
+    ]
+
+def create_search_indexes(connection: Connection, schema: str | None) -> bool:
+    """
+    Enable pg_trgm and create the trigram indexes of the user search
+
+    Databases where the extension isn't available, or can't be created by
+    this role, are left as they are and user search falls back to ILIKE.
+
+    Returns:
+        bool: Whether pg_trgm is installed
+    """
+    global trigram_installed
+    try:
+        with connection.begin_nested():
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except DBAPIError as e:
+        logging.warning(f"pg_trgm is not available, user search falls back to ILIKE: {e.orig}")
+        trigram_installed = False
+        return False
+    for statement in search_index_statements(schema):
+        connection.execute(text(statement))
+    trigram_installed = True
+    return True
@@ -0,0 +1,275 @@
+import re
+import json
+import threading
+import time
+import logging
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Generic, TypeVar
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+import jwt
+from src.lib.background import PeriodicTask
+from src.settings import get_settings
+
+# Header naming the tenant of a request
+TENANT_HEADER: str = get_settings().tenant_header
+# Requests to <tenant>.<TENANT_BASE_DOMAIN> are routed to <tenant>, empty disables it
+TENANT_BASE_DOMAIN: str = get_settings().tenant_base_domain
+# Tenant <name> lives in schema <TENANT_SCHEMA_PREFIX><name>
+TENANT_SCHEMA_PREFIX: str = get_settings().tenant_schema_prefix
+TENANT_REFRESH_SECONDS: float = get_settings().tenant_refresh_seconds
+
+TENANT_NAME_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_]{0,39}$")
+
+E = TypeVar("E")
+T = TypeVar("T")
+
+# Tenant of the request being served, None for the default schema
+_current_tenant: ContextVar[str | None] = ContextVar("current_tenant", default=None)
+
+def current_tenant() -> str | None:
+    return _current_tenant.get()
+
+# Bearer token of the request being served and its verified claims, or the error
+# verifying it. Verified once by TenantMiddleware and reused by the inner middleware
+# and the authentication dependencies.
+_request_token: ContextVar[tuple[str, Dict[str, Any] | jwt.PyJWTError] | None] = ContextVar("request_token", default=None)
+
+def bearer_token(authorization: str | None) -> str | None:
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    return authorization[7:].strip()
+
+def verify_token(token: str) -> Dict[str, Any] | jwt.PyJWTError:
+    """Claims of a JWT token, or the error verifying it"""
+    from src.lib.utils import verify_auth_token
+    try:
+        return verify_auth_token(token)
+    except jwt.PyJWTError as e:
+        return e
+
+def verified_claims(token: str) -> Dict[str, Any]:
+    """
+    Verify and decode a JWT token, reusing the result TenantMiddleware got for the request
+
+    Raises:
+        jwt.PyJWTError: If token is invalid
+    """
+    verified = _request_token.get()
+    result = verified[1] if verified is not None and verified[0] == token else verify_token(token)
+    if isinstance(result, jwt.PyJWTError):
+        raise result
+    return result
+
+def tenant_schema(tenant: str) -> str:
+    return f"{TENANT_SCHEMA_PREFIX}{tenant}"
+
+def models_schema() -> str | None:
+    """Schema the models are bound to, translated to the tenant schema per request"""
+    from src.entities.user import User
+    return User.__table__.schema
+
+# (engine, models schema, tenant schema) -> engine with the translation applied.
+# Option engines share the pool of their parent, so every tenant shares one pool.
+_tenant_engines: Dict[tuple, object] = {}
+_tenant_engines_lock = threading.Lock()
+
+def tenant_bind(engine: E, tenant: str | None = None) -> E:
+    """
+    Get engine, routed to the schema of tenant (the current tenant by default)
+
+    Works with sync and async engines. Without a tenant the engine is
+    returned as is and the models' own schema is used.
+    """
+    tenant = tenant if tenant is not None else current_tenant()
+    if tenant is None:
+        return engine
+    key = (engine, models_schema(), tenant)
+    bound = _tenant_engines.get(key)
+    if bound is None:
+        with _tenant_engines_lock:
+            bound = _tenant_engines.get(key)
+            if bound is None:
+                bound = _tenant_engines[key] = engine.execution_options(
+                    schema_translate_map={models_schema(): tenant_schema(tenant)}
+                )
+    return bound
+
+def tenant_schemas(connection) -> list[str]:
+    """Schemas of the provisioned tenants"""
+    return connection.execute(
+        text("SELECT schema_name FROM information_schema.schemata WHERE starts_with(schema_name, :prefix) ORDER BY 1"),
+        {"prefix": TENANT_SCHEMA_PREFIX}
+    ).scalars().all()
+
+def tenant_session_factory(tenant: str | None) -> Callable:
+    """Sessions on the schema of tenant (None for the default schema), for use outside requests"""
+    def session():
+        from sqlmodel import Session
+        from src.database.core import get_engine
+        engine = get_engine()
+        return Session(tenant_bind(engine, tenant) if tenant is not None else engine)
+    return session
+
+class TenantRegistry:
+    """
+    Cache of the tenants that exist, i.e. that have a schema
+
+    Reloaded by a background task, and at most once a second when asked
+    about an unknown tenant, so unknown names can't turn into a query per
+    request.
+    """
+    def __init__(self):
+        self._tenants: set[str] = set()
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def exists(self, tenant: str) -> bool:
+        return tenant in self._tenants
+
+    def tenants(self) -> set[str]:
+        return self._tenants
+
+    def refresh_unknown(self, tenant: str) -> bool:
+        """Whether tenant exists, reloading the list first if it's unknown and wasn't just reloaded"""
+        if tenant not in self._tenants and time.monotonic() - self._loaded_at >= 1.0:
+            self.refresh()
+        return tenant in self._tenants
+
+    def add(self, tenant: str):
+        with self._lock:
+            self._tenants = self._tenants | {tenant}
+
+    def refresh(self):
+        """Reload the tenant list from the schemas in the database"""
+        from src.database.core import get_engine
+        try:
+            with get_engine().connect() as connection:
+                schemas = tenant_schemas(connection)
+            with self._lock:
+                self._tenants = {schema[len(TENANT_SCHEMA_PREFIX):] for schema in schemas}
+        except Exception:
+            logging.exception("Tenant list refresh failed, keeping the previous list")
+        finally:
+            self._loaded_at = time.monotonic()
+
+# Shared registry used by the tenant middleware
+tenant_registry = TenantRegistry()
+
+# Started by the app lifespan
+tenant_registry_refresh = PeriodicTask("Tenant list refresh", TENANT_REFRESH_SECONDS, tenant_registry.refresh)
+
+class PerTenant(Generic[T]):
+    """
+    One instance of a cache of database state for each tenant
+
+    Caches such as the revocation list hold rows of one schema, so each
+    tenant and the default schema (None) get their own, built by
+    factory(tenant).
+    """
+    def __init__(self, name: str, factory: Callable[[str | None], T]):
+        self.name = name
+        self._factory = factory
+        self._instances: Dict[str | None, T] = {}
+        self._lock = threading.Lock()
+
+    def get(self, tenant: str | None) -> T:
+        instance = self._instances.get(tenant)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(tenant)
+                if instance is None:
+                    instance = self._instances[tenant] = self._factory(tenant)
+        return instance
+
+    def current(self) -> T:
+        """Instance of the tenant of the request being served"""
+        return self.get(current_tenant())
+
+    def for_each(self, method: str):
+        """Call method on the instance of the default schema and of every tenant, for background tasks"""
+        for tenant in [None, *sorted(tenant_registry.tenants())]:
+            try:
+                getattr(self.get(tenant), method)()
+            except Exception:
+                logging.exception(f"{self.name} {method} failed for tenant {tenant}")
+
+def provision_tenant(tenant: str):
+    """Create the schema and tables of a new tenant"""
+    from sqlmodel import SQLModel
+    from src.database.core import get_engine, create_schema
+    from src.database.search import create_search_indexes
+
+    if not TENANT_NAME_PATTERN.match(tenant):
+        raise ValueError(f"Invalid tenant name {tenant!r}")
+    create_schema(tenant_schema(tenant))
+    SQLModel.metadata.create_all(tenant_bind(get_engine(), tenant))
+    with get_engine().begin() as connection:
+        create_search_indexes(connection, tenant_schema(tenant))
+    tenant_registry.add(tenant)
+
+def host_tenant(host: str | None) -> str | None:
+    """Tenant named by the subdomain of TENANT_BASE_DOMAIN, if enabled"""
+    if not TENANT_BASE_DOMAIN or not host:
+        return None
+    host = host.split(":")[0].lower()
+    suffix = "." + TENANT_BASE_DOMAIN.lower()
+    if host.endswith(suffix) and "." not in host[:-len(suffix)]:
+        return host[:-len(suffix)]
+    return None
+
+class TenantMiddleware:
+    """
+    ASGI middleware resolving the tenant of each request
+
+    The tenant comes from the TENANT_HEADER header, or the subdomain of
+    TENANT_BASE_DOMAIN. Tokens carry the tenant they were issued for in a
+    tenant claim, which routes the request by itself and must match the
+    requested tenant. Requests without a tenant use the default schema.
+    The token is verified here once, see verified_claims.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        requested = headers.get(TENANT_HEADER.lower()) or host_tenant(headers.get("host"))
+        bearer = bearer_token(headers.get("authorization"))
+        # Invalid tokens are rejected by the authentication dependencies
+        claims = verify_token(bearer) if bearer is not None else None
+        authenticated = isinstance(claims, dict)
+        claimed = claims.get("tenant") if authenticated else None
+
+        if authenticated and requested is not None and requested != claimed:
+            return await self.reject(send, 403, "Token was issued for another tenant")
+        tenant = claimed or requested
+        if tenant is not None and not await self.tenant_exists(tenant):
+            return await self.reject(send, 404, "Unknown tenant")
+
+        token = _current_tenant.set(tenant)
+        request_token = _request_token.set((bearer, claims) if bearer is not None else None)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_token.reset(request_token)
+            _current_tenant.reset(token)
+
+    @staticmethod
+    async def tenant_exists(tenant: str) -> bool:
+        if not TENANT_NAME_PATTERN.match(tenant):
+            return False
+        # The database is only queried for unknown names, off the event loop
+        return tenant_registry.exists(tenant) or await run_in_threadpool(tenant_registry.refresh_unknown, tenant)
+
+    @staticmethod
+    async def reject(send, status_code: int, detail: str):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.security import OAuth2PasswordRequestForm
+from src.database.core import AsyncSessionDep
+from . import async_service as service, models
+from src.auth.throttling import client_ip
+from src.lib.responses import json_response
+from src.auth.dependencies import CurrentUser, get_current_user_async
+
+# Async counterparts of the routes in controller.py, registered ahead of them
+# when the auth router is listed in ASYNC_ROUTERS
+router = APIRouter(
+    prefix="/auth",
+    tags=["Auth"]
+)
+
+@router.post("/signup")
+async def signup(user_input: models.SignupRequest, db: AsyncSessionDep):
+    return json_response(await service.signup(user_input, db))
+
+@router.post("/signin", response_model=models.SigninResponse)
+async def signin(user_input: models.SigninRequest, request: Request, db: AsyncSessionDep):
+    return json_response(await service.signin(user_input, db, client_ip(request)))
+
+@router.post("/token")
+async def login_for_access_token(request: Request, db: AsyncSessionDep, form_data: OAuth2PasswordRequestForm = Depends()):
+    """
+    OAuth2 compatible token endpoint for Swagger UI authentication
+    The username field will be used as email
+    """
+    return await service.signin_with_oauth2_form(form_data, db, client_ip(request))
+
+@router.post("/signout")
+async def signout(
+    db: AsyncSessionDep,
+    current_user: CurrentUser = Depends(get_current_user_async)
+):
+    return await service.signout(current_user, db)
+
+@router.post("/refresh", response_model=models.RefreshResponse)
+async def refresh(refresh_input: models.RefreshRequest, db: AsyncSessionDep):
+    """Exchange a refresh token for a new token pair, the refresh token is rotated"""
+    return json_response(await service.refresh_token(refresh_input, db))
@@ -0,0 +1,39 @@
+from src.entities.user import Token, TokenResponse
+from src.database.core import AsyncSessionDep
+from uuid import UUID
+from sqlmodel import select
+from sqlalchemy import Row
+from .repository import (
+    token_values, upsert_tokens_statement, rotate_refresh_token_statement, delete_token_statement,
+    revoke_token_statement, to_token_response
+)
+
+async def create_tokens(user_id: UUID, access_token: str, refresh_token: str, access_token_jti: str, db: AsyncSessionDep) -> TokenResponse:
+    """Store the user's refresh token fingerprint, replacing the previous one in a single statement"""
+    values = token_values(refresh_token, access_token_jti)
+    await db.exec(upsert_tokens_statement(user_id, values))
+    await db.commit()
+
+    return to_token_response(access_token, refresh_token, values)
+
+async def rotate_refresh_token(refresh_token: str, values: dict, db: AsyncSessionDep) -> Row | None:
+    """Replace a current refresh token, returning its user or None if it isn't current"""
+    row = (await db.exec(rotate_refresh_token_statement(refresh_token, values))).one_or_none()
+    await db.commit()
+
+    return row
+
+async def get_token_by_user_id(user_id: UUID, db: AsyncSessionDep) -> Token | None:
+    return (await db.exec(select(Token).filter(Token.user_id == user_id))).one_or_none()
+
+async def delete_token(user_id: UUID, db: AsyncSessionDep) -> Row | None:
+    """Delete the user's token, returning the jti and expiry of its access token"""
+    row = (await db.exec(delete_token_statement(user_id))).one_or_none()
+    await db.commit()
+
+    return row
+
+async def revoke_token(jti: str, user_id: UUID, exp: int, db: AsyncSessionDep) -> None:
+    """Add a token id to the revocation table until the token expires"""
+    await db.exec(revoke_token_statement(jti, user_id, exp))
+    await db.commit()
@@ -0,0 +1,111 @@
+from uuid import UUID, uuid4
+import logging
+from src.database.core import AsyncSessionDep
+from src.domain.users import async_service as users_service
+from src.domain.users import async_repository as users_repository
+from src.domain.users.service import revoke_cached_tokens
+from src.domain.users.models import CreateUserRequest
+from src.lib.utils import build_token_claims
+from src.lib.hashing import password_hasher
+from src.auth.dependencies import CurrentUser, decode_refresh_token
+from src.auth.revocation import revoked_tokens
+from src.auth.throttling import signin_throttle
+from src.exceptions import CredentialsError, UserNotFoundError, InvalidPasswordError
+from . import models
+from . import async_repository as repository
+from .service import (
+    issue_tokens, issue_access_token, issue_refresh_token, oauth2_token_response, oauth2_credentials_error
+)
+
+async def signup(user_input: models.SignupRequest, db: AsyncSessionDep) -> models.SignupResponse:
+    create_request = CreateUserRequest(
+        username=user_input.username,
+        email=user_input.email,
+        password=user_input.password,
+        role=user_input.role
+    )
+
+    user = await users_service.create_user(create_request, db)
+
+    access_token, refresh_token, access_token_jti = issue_tokens(user.id, build_token_claims(user.role, True, 0))
+    token = await repository.create_tokens(user.id, access_token, refresh_token, access_token_jti, db)
+
+    return models.SignupResponse(
+        user_id=user.id,
+        token=token,
+        message="User signed up successfully"
+    )
+
+async def signin(user_input: models.SigninRequest, db: AsyncSessionDep, client_ip: str | None = None) -> models.SigninResponse:
+    await signin_throttle.acquire(client_ip, user_input.email)
+    # The password hash is never cached, the user is read from the database
+    user = await users_repository.load_user_by_email(user_input.email, db)
+    if not user:
+        raise UserNotFoundError(user_id=user_input.email)
+
+    if not await password_hasher.verify_async(user_input.password, user.password_hash):
+        raise InvalidPasswordError()
+    await signin_throttle.record_success(client_ip, user_input.email)
+
+    access_token, refresh_token, access_token_jti = issue_tokens(user.id, build_token_claims(user.role, user.is_active, user.token_version))
+
+    token = await repository.create_tokens(user.id, access_token, refresh_token, access_token_jti, db)
+
+    return models.SigninResponse(
+        user_id=user.id,
+        token=token,
+        message="User signed in successfully"
+    )
+
+async def signin_with_oauth2_form(form_data, db: AsyncSessionDep, client_ip: str | None = None):
+    """OAuth2 form authentication for Swagger UI, the username field is used as email"""
+    try:
+        signin_request = models.SigninRequest(
+            email=form_data.username,
+            password=form_data.password
+        )
+        return oauth2_token_response(await signin(signin_request, db, client_ip))
+    except (UserNotFoundError, InvalidPasswordError):
+        raise oauth2_credentials_error()
+
+async def revoke_jti(jti: str, user_id: UUID, exp: int, db: AsyncSessionDep) -> None:
+    await repository.revoke_token(jti, user_id, exp, db)
+    revoked_tokens.current().revoke(jti, exp)
+
+async def revoke_session(user_id: UUID, db: AsyncSessionDep) -> None:
+    """Drop the user's refresh token and revoke every token issued before"""
+    token = await repository.delete_token(user_id, db)
+    if token is not None:
+        await revoke_jti(token.access_token_jti, user_id, int(token.expires_at.timestamp()), db)
+    token_version = await users_repository.bump_token_version(user_id, db)
+    if token_version is not None:
+        revoke_cached_tokens(user_id, token_version)
+
+async def signout(current_user: CurrentUser, db: AsyncSessionDep) -> models.SignoutResponse:
+    """Sign out the current user"""
+    if current_user.jti is not None:
+        await revoke_jti(current_user.jti, current_user.id, current_user.exp, db)
+    await revoke_session(current_user.id, db)
+    return models.SignoutResponse(message="User signed out successfully")
+
+async def refresh_token(refresh_input: models.RefreshRequest, db: AsyncSessionDep) -> models.RefreshResponse:
+    """Exchange a refresh token for a new token pair, see service.refresh_token"""
+    user_id = UUID(decode_refresh_token(refresh_input.refresh_token)["sub"])
+
+    new_refresh_token = issue_refresh_token(user_id)
+    access_token_jti = uuid4().hex
+    values = repository.token_values(new_refresh_token, access_token_jti)
+
+    user = await repository.rotate_refresh_token(refresh_input.refresh_token, values, db)
+    if user is None:
+        logging.warning(f"Refresh token reuse for user {user_id}, revoking the session")
+        await revoke_session(user_id, db)
+        raise CredentialsError(message="Invalid refresh token")
+
+    access_token = issue_access_token(user_id, build_token_claims(user.role, user.is_active, user.token_version), access_token_jti)
+
+    return models.RefreshResponse(
+        user_id=user_id,
+        token=repository.to_token_response(access_token, new_refresh_token, values),
+        message="Token refreshed successfully"
+    )
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from src.database.core import SessionDep
 from . import service, models
-from src.entities.user import User
-from src.auth.dependencies import get_current_user
+from src.auth.throttling import client_ip
+from src.lib.responses import json_response
+from src.auth.dependencies import CurrentUser, get_current_user
 
 router = APIRouter(
     prefix="/auth",
@@ -11,31 +12,29 @@ router = APIRouter(
 )
 
 @router.post("/signup")
-def signup(user_input: models.SignupRequest, db: SessionDep):
-    return service.signup(user_input, db)
+async def signup(user_input: models.SignupRequest, db: SessionDep):
+    return json_response(await service.signup(user_input, db))
 
 @router.post("/signin", response_model=models.SigninResponse)
-def signin(user_input: models.SigninRequest, db: SessionDep):
-    return service.signin(user_input, db)
+async def signin(user_input: models.SigninRequest, request: Request, db: SessionDep):
+    return json_response(await service.signin(user_input, db, client_ip(request)))
 
 @router.post("/token")
-async def login_for_access_token(db: SessionDep, form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_access_token(request: Request, db: SessionDep, form_data: OAuth2PasswordRequestForm = Depends()):
     """
     OAuth2 compatible token endpoint for Swagger UI authentication
     The username field will be used as email
     """
-    return service.signin_with_oauth2_form(form_data, db)
+    return await service.signin_with_oauth2_form(form_data, db, client_ip(request))
 
 @router.post("/signout")
 def signout(
     db: SessionDep,
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    return service.signout(current_user.id, db)
+    return service.signout(current_user, db)
 
 @router.post("/refresh", response_model=models.RefreshResponse)
-def refresh(
-    db: SessionDep,
-    current_user: User = Depends(get_current_user)
-):
-    return service.refresh_token(current_user.id, db)
+def refresh(refresh_input: models.RefreshRequest, db: SessionDep):
+    """Exchange a refresh token for a new token pair, the refresh token is rotated"""
+    return json_response(service.refresh_token(refresh_input, db))
@@ -1,31 +1,86 @@
-from src.entities.user import Token, TokenResponse
+from src.entities.user import Token, TokenResponse, RevokedToken, User
 from src.database.core import SessionDep
-from uuid import UUID
+from src.lib.utils import token_fingerprint
+from uuid import UUID, uuid4
 from datetime import datetime, timedelta
-from sqlmodel import select
+from sqlmodel import select, update, delete
+from sqlalchemy import Row
+from sqlalchemy.dialects.postgresql import insert
 from . import service
 
-def create_tokens(user_id: UUID, access_token: str, refresh_token: str, db: SessionDep) -> TokenResponse:
-    token = Token(
-        user_id=user_id,
+def token_values(refresh_token: str, access_token_jti: str) -> dict:
+    """Column values stored for a newly issued token pair"""
+    now = datetime.now()
+    return {
+        "refresh_token_hash": token_fingerprint(refresh_token),
+        "access_token_jti": access_token_jti,
+        "token_type": "Bearer",
+        "expires_at": now + timedelta(minutes=service.ACCESS_TOKEN_EXPIRE_MINUTES),
+        "refresh_expires_at": now + timedelta(days=service.REFRESH_TOKEN_EXPIRE_DAYS),
+        "created_at": now
+    }
+
+def upsert_tokens_statement(user_id: UUID, values: dict):
+    """INSERT ... ON CONFLICT (user_id) DO UPDATE, replacing any previous token"""
+    # Built on the Table itself, the ORM entity's annotated copy doesn't see schema changes
+    statement = insert(Token.__table__).values(id=uuid4(), user_id=user_id, **values)
+    return statement.on_conflict_do_update(
+        index_elements=[Token.user_id],
+        set_={column: statement.excluded[column] for column in values}
+    )
+
+def rotate_refresh_token_statement(refresh_token: str, values: dict):
+    """
+    UPDATE ... FROM user ... RETURNING, looking the refresh token up by its fingerprint
+
+    Only matches the user's current, unexpired refresh token, and returns
+    what the new access token claims need.
+    """
+    token, user = Token.__table__, User.__table__
+    return (
+        update(token)
+        .where(
+            token.c.refresh_token_hash == token_fingerprint(refresh_token),
+            token.c.refresh_expires_at > datetime.now(),
+            token.c.user_id == user.c.id
+        )
+        .values(**values)
+        .returning(user.c.id, user.c.role, user.c.is_active, user.c.token_version)
+    )
+
+def delete_token_statement(user_id: UUID):
+    """DELETE ... RETURNING the access token issued with the deleted refresh token"""
+    token = Token.__table__
+    return delete(token).where(token.c.user_id == user_id).returning(token.c.access_token_jti, token.c.expires_at)
+
+def revoke_token_statement(jti: str, user_id: UUID, exp: int):
+    """Store a revoked token id, revoking it twice is a no-op"""
+    return insert(RevokedToken.__table__).values(
+        jti=jti, user_id=user_id, exp=exp, created_at=datetime.now()
+    ).on_conflict_do_nothing()
+
+def to_token_response(access_token: str, refresh_token: str, values: dict) -> TokenResponse:
+    return TokenResponse(
         access_token=access_token,
         refresh_token=refresh_token,
-        expires_at=datetime.now() + timedelta(minutes=service.ACCESS_TOKEN_EXPIRE_MINUTES),
-        created_at=datetime.now()
+        token_type=values["token_type"],
+        expires_at=values["expires_at"]
     )
 
-    db.add(token)
+def create_tokens(user_id: UUID, access_token: str, refresh_token: str, access_token_jti: str, db: SessionDep) -> TokenResponse:
+    """Store the user's refresh token fingerprint, replacing the previous one in a single statement"""
+    values = token_values(refresh_token, access_token_jti)
+    db.exec(upsert_tokens_statement(user_id, values))
     db.commit()
-    db.refresh(token)
+    
+    return to_token_response(access_token, refresh_token, values)
 
-    token_response = TokenResponse(
-        access_token=token.access_token,
-        refresh_token=token.refresh_token,
-        token_type="Bearer",
-        expires_at=token.expires_at
-    )
+def rotate_refresh_token(refresh_token: str, values: dict, db: SessionDep) -> Row | None:
+    """Replace a current refresh token, returning its user or None if it isn't current"""
+    row = db.exec(rotate_refresh_token_statement(refresh_token, values)).one_or_none()
+    db.commit()
     
-    return token_response
+    return row
 
 def get_token_by_user_id(user_id: UUID, db: SessionDep) -> Token | None:
     token = db.exec(select(Token).filter(Token.user_id == user_id)).one_or_none()
@@ -34,10 +89,14 @@ def get_token_by_user_id(user_id: UUID, db: SessionDep) -> Token | None:
     
     return token
 
-def delete_token(user_id: UUID, db: SessionDep) -> None:
-    token = get_token_by_user_id(user_id, db)
-    if not token:
-        return
+def delete_token(user_id: UUID, db: SessionDep) -> Row | None:
+    """Delete the user's token, returning the jti and expiry of its access token"""
+    row = db.exec(delete_token_statement(user_id)).one_or_none()
+    db.commit()
     
-    db.delete(token)
+    return row
+
+def revoke_token(jti: str, user_id: UUID, exp: int, db: SessionDep) -> None:
+    """Add a token id to the revocation table until the token expires"""
+    db.exec(revoke_token_statement(jti, user_id, exp))
     db.commit()
@@ -1,22 +1,70 @@
-from uuid import UUID
+from uuid import UUID, uuid4
+import logging
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from src.database.core import SessionDep
 from src.domain.users import service as users_service
+from src.domain.users import repository as users_repository
 from src.domain.users.models import CreateUserRequest
-from src.lib.utils import generate_auth_token, verify_password
+from src.lib.utils import generate_auth_token, build_token_claims
+from src.lib.hashing import password_hasher
 from src.exceptions import CredentialsError
+from src.auth.dependencies import CurrentUser, decode_refresh_token
+from src.auth.revocation import revoked_tokens
+from src.auth.throttling import signin_throttle
 from . import repository
 from datetime import timedelta
 from . import models, repository
 from src.exceptions import UserNotFoundError, InvalidPasswordError
-import os
-from dotenv import load_dotenv
+from src.settings import get_settings
 
-load_dotenv()
+ACCESS_TOKEN_EXPIRE_MINUTES: int = get_settings().access_token_expire_minutes
+REFRESH_TOKEN_EXPIRE_DAYS: int = get_settings().refresh_token_expire_days
 
-ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
-REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+def issue_access_token(user_id: UUID, claims: dict | None, jti: str) -> str:
+    """Generate an access token with a jti chosen by the caller"""
+    return generate_auth_token(user_id, "auth", timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES), {**(claims or {}), "jti": jti})
 
-def signup(user_input: models.SignupRequest, db: SessionDep) -> models.SignupResponse:
+def issue_refresh_token(user_id: UUID) -> str:
+    return generate_auth_token(user_id, "refresh", timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+
+def issue_tokens(user_id: UUID, claims: dict | None = None) -> tuple[str, str, str]:
+    """Generate a new access/refresh token pair, with the access token jti"""
+    access_token_jti = uuid4().hex
+    return issue_access_token(user_id, claims, access_token_jti), issue_refresh_token(user_id), access_token_jti
+
+def revoke_jti(jti: str, user_id: UUID, exp: int, db: SessionDep) -> None:
+    repository.revoke_token(jti, user_id, exp, db)
+    revoked_tokens.current().revoke(jti, exp)
+
+def revoke_session(user_id: UUID, db: SessionDep) -> None:
+    """Drop the user's refresh token and revoke every token issued before"""
+    token = repository.delete_token(user_id, db)
+    if token is not None:
+        revoke_jti(token.access_token_jti, user_id, int(token.expires_at.timestamp()), db)
+    token_version = users_repository.bump_token_version(user_id, db)
+    if token_version is not None:
+        users_service.revoke_cached_tokens(user_id, token_version)
+
+def oauth2_token_response(signin_response: models.SigninResponse) -> dict:
+    """Return the token in the format expected by Swagger UI"""
+    return {
+        "access_token": signin_response.token.access_token,
+        "token_type": "Bearer",
+        "expires_at": signin_response.token.expires_at.isoformat(),
+        "refresh_token": signin_response.token.refresh_token,
+        "user_id": str(signin_response.user_id),
+        "message": signin_response.message
+    }
+
+def oauth2_credentials_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Incorrect email or password",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+async def signup(user_input: models.SignupRequest, db: SessionDep) -> models.SignupResponse:
     # Convert SignupRequest to CreateUserRequest
     create_request = CreateUserRequest(
         username=user_input.username,
@@ -26,13 +74,12 @@ def signup(user_input: models.SignupRequest, db: SessionDep) -> models.SignupRes
     )
     
     # Reuse the user creation logic
-    user = users_service.create_user(create_request, db)
+    user = await users_service.create_user_async(create_request, db)
     
     # Generate auth tokens
-    access_token = generate_auth_token(user.id, "auth", timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    refresh_token = generate_auth_token(user.id, "refresh", timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    access_token, refresh_token, access_token_jti = issue_tokens(user.id, build_token_claims(user.role, True, 0))
 
-    token = repository.create_tokens(user.id, access_token, refresh_token, db)
+    token = await run_in_threadpool(repository.create_tokens, user.id, access_token, refresh_token, access_token_jti, db)
     
     # Return auth response
     return models.SignupResponse(
@@ -41,31 +88,33 @@ def signup(user_input: models.SignupRequest, db: SessionDep) -> models.SignupRes
         message="User signed up successfully"
     )
 
-def signin(user_input: models.SigninRequest, db: SessionDep) -> models.SigninResponse:
-    user = users_service.get_user_by_email(user_input.email, db)
+async def signin(user_input: models.SigninRequest, db: SessionDep, client_ip: str | None = None) -> models.SigninResponse:
+    # Throttled attempts are rejected before the lookup and the bcrypt round
+    await signin_throttle.acquire(client_ip, user_input.email)
+    # Database calls run in the threadpool, the event loop only waits on them.
+    # The password hash is never cached, the user is read from the database.
+    user = await run_in_threadpool(users_repository.load_user_by_email, user_input.email, db)
     if not user:
         raise UserNotFoundError(user_id=user_input.email)
 
-    if not verify_password(user_input.password, user.password_hash):
+    if not await password_hasher.verify_async(user_input.password, user.password_hash):
         raise InvalidPasswordError()
+    await signin_throttle.record_success(client_ip, user_input.email)
     
-    access_token = generate_auth_token(user.id, "auth", timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    refresh_token = generate_auth_token(user.id, "refresh", timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    # Read before the commit expires the row
+    user_id = user.id
+    access_token, refresh_token, access_token_jti = issue_tokens(user_id, build_token_claims(user.role, user.is_active, user.token_version))
     
-    # check if user already has a token
-    existing_token = repository.get_token_by_user_id(user.id, db)
-    if existing_token:
-        repository.delete_token(user.id, db)
-
-    token = repository.create_tokens(user.id, access_token, refresh_token, db)
+    # Replaces the user's previous token, if any, in the same statement
+    token = await run_in_threadpool(repository.create_tokens, user_id, access_token, refresh_token, access_token_jti, db)
     
     return models.SigninResponse(
-        user_id=user.id,
+        user_id=user_id,
         token=token,
         message="User signed in successfully"
     )
 
-def signin_with_oauth2_form(form_data, db: SessionDep):
+async def signin_with_oauth2_form(form_data, db: SessionDep, client_ip: str | None = None):
     """
     Handle OAuth2 form authentication for Swagger UI
     The username field is used as email
@@ -79,81 +128,55 @@ def signin_with_oauth2_form(form_data, db: SessionDep):
             password=form_data.password
         )
         # Get the regular signin response
-        signin_response = signin(signin_request, db)
+        signin_response = await signin(signin_request, db, client_ip)
         
         # For OAuth2 in Swagger UI, we need to return the token in the expected format
-        from fastapi import HTTPException, status
-        from fastapi.responses import JSONResponse
-        
-        # Return the token in the format expected by Swagger UI
-        return {
-            "access_token": signin_response.token.access_token,
-            "token_type": "Bearer",
-            "expires_at": signin_response.token.expires_at.isoformat(),
-            "refresh_token": signin_response.token.refresh_token,
-            "user_id": str(signin_response.user_id),
-            "message": signin_response.message
-        }
-    except UserNotFoundError:
-        from fastapi import HTTPException, status
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    except InvalidPasswordError:
-        from fastapi import HTTPException, status
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        return oauth2_token_response(signin_response)
+    except (UserNotFoundError, InvalidPasswordError):
+        raise oauth2_credentials_error()
 
-def signout(user_id: UUID, db: SessionDep) -> models.SignoutResponse:
+def signout(current_user: CurrentUser, db: SessionDep) -> models.SignoutResponse:
     """Sign out the current user"""
-    # Delete the user's token
-    repository.delete_token(user_id, db)
+    # Revoke the access token in use and everything issued with the refresh token
+    if current_user.jti is not None:
+        revoke_jti(current_user.jti, current_user.id, current_user.exp, db)
+    revoke_session(current_user.id, db)
     return models.SignoutResponse(message="User signed out successfully")
     
-def refresh_token(user_id: UUID, db: SessionDep) -> models.RefreshResponse:
-    """Refresh the current user's access token using the authenticated user from the token
+def refresh_token(refresh_input: models.RefreshRequest, db: SessionDep) -> models.RefreshResponse:
+    """Exchange a refresh token for a new token pair
+    
+    The refresh token is looked up by its fingerprint and rotated in a single
+    UPDATE ... RETURNING. A validly signed refresh token that isn't the
+    current one was already used, which means it leaked: the whole session
+    is revoked.
     
     Args:
-        user_id (UUID): User ID from the current authenticated user
+        refresh_input (models.RefreshRequest): The refresh token
         db (SessionDep): Database session
         
     Returns:
         models.RefreshResponse: New access and refresh tokens
         
     Raises:
-        CredentialsError: If user has no valid token
+        CredentialsError: If the refresh token is invalid, expired or reused
     """
-    # Get the user's current token from database
-    token = repository.get_token_by_user_id(user_id, db)
-    if not token:
-        raise CredentialsError(message="No valid token found")
-        
-    # Generate new tokens
-    access_token = generate_auth_token(
-        user_id=user_id,
-        token_type="access",
-        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    )
+    user_id = UUID(decode_refresh_token(refresh_input.refresh_token)["sub"])
     
-    refresh_token = generate_auth_token(
-        user_id=user_id,
-        token_type="refresh",
-        expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    )
+    new_refresh_token = issue_refresh_token(user_id)
+    access_token_jti = uuid4().hex
+    values = repository.token_values(new_refresh_token, access_token_jti)
+    
+    user = repository.rotate_refresh_token(refresh_input.refresh_token, values, db)
+    if user is None:
+        logging.warning(f"Refresh token reuse for user {user_id}, revoking the session")
+        revoke_session(user_id, db)
+        raise CredentialsError(message="Invalid refresh token")
     
-    # Delete old token and create new ones
-    repository.delete_token(user_id, db)
-    token_response = repository.create_tokens(user_id, access_token, refresh_token, db)
+    access_token = issue_access_token(user_id, build_token_claims(user.role, user.is_active, user.token_version), access_token_jti)
     
     return models.RefreshResponse(
         user_id=user_id,
-        token=token_response,
+        token=repository.to_token_response(access_token, new_refresh_token, values),
         message="Token refreshed successfully"
     )
-
-
@@ -0,0 +1,181 @@
+from fastapi import APIRouter, status, Depends, Header, Request, Query, Response
+from typing import Optional, Literal
+from fastapi.responses import StreamingResponse
+from uuid import UUID
+from src.database.core import AsyncSessionDep, AsyncReadSessionDep, AsyncReadSessionFactoryDep
+from src.domain.users import async_service as service, models
+from src.domain.users.loader import AsyncUserLoaderDep
+from src.lib.responses import json_response
+from src.auth.dependencies import (
+    CurrentUser, allow_superadmin_admin_async, allow_superadmin_admin_employee_async, allow_update_own_account_async
+)
+
+# Async counterparts of the routes in controller.py, registered ahead of them
+# when the users router is listed in ASYNC_ROUTERS
+router = APIRouter(
+    prefix="/user",
+    tags=["User"]
+)
+
+@router.post("/", status_code=status.HTTP_201_CREATED)
+async def create_user(
+    user_input: models.CreateUserRequest,
+    db: AsyncSessionDep,
+    current_user: CurrentUser = Depends(allow_superadmin_admin_async)
+):
+    """Create a new user (admin only)"""
+    return json_response(await service.create_user(user_input, db), status_code=status.HTTP_201_CREATED)
+
+@router.post("/bulk")
+async def import_users(
+    request: Request,
+    db: AsyncSessionDep,
+    current_user: CurrentUser = Depends(allow_superadmin_admin_async)
+):
+    """Create users from an NDJSON or CSV body (admin only)
+
+    The body is read as a stream and processed in chunks. Send NDJSON with
+    Content-Type application/x-ndjson, or CSV with a header row and
+    Content-Type text/csv. The response reports the outcome of every row.
+    """
+    return json_response(await service.import_users(request.stream(), request.headers.get("content-type"), db))
+
+@router.post("/lookup", response_model=models.UserLookupResponse)
+async def lookup_users(
+    lookup: models.UserLookupRequest,
+    db: AsyncReadSessionDep,
+    current_user: CurrentUser = Depends(allow_superadmin_admin_employee_async)
+):
+    """Get many users by id or email in one request (admin and employees only)
+
+    Users are keyed by the requested id or email, missing ones map to null
+    and are listed in not_found.
+    """
+    return json_response(await service.lookup_users(lookup, db))
+
+@router.get("/", response_model=list[models.UserSummary])
+async def get_users(
+    db: AsyncReadSessionDep,
+    response: Response,
+    limit: int = Query(service.USERS_PAGE_DEFAULT_LIMIT, ge=1, le=service.USERS_PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    filters: models.UserFilters = Depends(),
+    sort: models.UserSort = "created_at",
+    current_user: CurrentUser = Depends(allow_superadmin_admin_employee_async)
+):
+    """Get a page of users (admin and employees only)
+
+    Users can be filtered by role, active state and creation / update date,
+    and sorted by created_at or updated_at, descending with a leading -.
+    The cursor of the next page is returned in the X-Next-Cursor header
+    when there are more users, and is only valid with the same sort.
+    """
+    users, next_cursor = await service.get_users(db, limit, cursor, filters, sort)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    response.headers.update(headers)
+    return json_response(users, list[models.UserSummary], headers=headers)
+
+@router.get("/export")
+async def export_users(
+    session_factory: AsyncReadSessionFactoryDep,
+    format: Literal["csv", "ndjson"] = "csv",
+    current_user: CurrentUser = Depends(allow_superadmin_admin_async)
+):
+    """Export every user as CSV or NDJSON (admin only)
+
+    The export is streamed from a server-side cursor, rows are sent while
+    the query is still being read.
+    """
+    return StreamingResponse(
+        service.export_users(format, session_factory),
+        media_type=service.EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'}
+    )
+
+@router.get("/search", response_model=list[models.UserSummary])
+async def search_users(
+    db: AsyncReadSessionDep,
+    q: str = Query(min_length=service.USER_SEARCH_MIN_LENGTH, max_length=100),
+    limit: int = Query(service.USER_SEARCH_DEFAULT_LIMIT, ge=1, le=service.USER_SEARCH_MAX_LIMIT),
+    current_user: CurrentUser = Depends(allow_superadmin_admin_employee_async)
+):
+    """Search users by partial username or email (admin and employees only)
+
+    Returns up to limit users, prefix matches first, then the closest
+    matches by trigram similarity.
+    """
+    return json_response(await service.search_users(q, db, limit), list[models.UserSummary])
+
+@router.get("/{id}")
+async def get_user(
+    id: UUID,
+    db: AsyncReadSessionDep,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    current_user: CurrentUser = Depends(allow_superadmin_admin_employee_async)
+):
+    """Get a user by ID (admin and employees only)
+
+    The response carries an ETag of the user's version. Send it back in
+    If-None-Match to get an empty 304 while the user is unchanged.
+    """
+    user, headers = await service.get_user_by_id(id, db, if_none_match)
+    response.headers.update(headers)
+    return json_response(user, headers=headers)
+
+@router.patch("/bulk")
+async def bulk_update_users(
+    user_input: models.BulkUpdateUserRequest,
+    db: AsyncSessionDep,
+    current_user: CurrentUser = Depends(allow_superadmin_admin_employee_async)
+):
+    """Change the role and / or active state of many users (admin and employees only)
+
+    Each target is authorized like a single update, the response reports
+    the outcome for every id.
+    """
+    return json_response(await service.bulk_update_users(user_input, current_user, db))
+
+@router.put("/{id}")
+async def update_user(
+    id: UUID,
+    user_input: models.UpdateUserRequest,
+    db: AsyncSessionDep,
+    users: AsyncUserLoaderDep,
+    permission_checker = Depends(allow_update_own_account_async)
+):
+    """Update a user
+
+    Permissions:
+    - Superadmins can update any account
+    - Admins can update any account except superadmins
+    - Employees can update their own account or client accounts
+    - Clients can update only their own account
+    """
+    # This will raise an exception if the current user doesn't have permission
+    current_user = await permission_checker(id)
+
+    return json_response(await service.update_user_by_id(id, user_input, current_user, db, users))
+
+@router.put("/{id}/password")
+async def update_password(
+    id: UUID,
+    password_input: models.UpdatePasswordRequest,
+    db: AsyncSessionDep,
+    users: AsyncUserLoaderDep,
+    permission_checker = Depends(allow_update_own_account_async)
+):
+    """Update a user's password"""
+    # This will raise an exception if the current user doesn't have permission
+    await permission_checker(id)
+
+    return await service.update_password_by_id(id, password_input, db, users)
+
+@router.delete("/{id}")
+async def delete_user(
+    id: UUID,
+    db: AsyncSessionDep,
+    current_user: CurrentUser = Depends(allow_superadmin_admin_async)
+):
+    """Delete a user (admin only)"""
+    return await service.delete_user_by_id(id, db)
@@ -0,0 +1,137 @@
+from uuid import UUID
+from datetime import datetime
+from typing import AsyncIterator
+from sqlalchemy import Row
+from src.entities.user import User, UserRole, DeletedUser
+from src.database.core import AsyncSessionDep
+from src.database.replicas import is_replica_session
+from sqlmodel import select, update
+from src.domain.users.models import UpdateUserRequest, UserSummary, UserFilters
+from src.domain.users.cache import CachedUser, user_cache
+from src.database import search
+from src.domain.users.repository import (
+    update_user_statement, update_password_statement, users_page_query, search_users_query, lookup_users_query, user_roles_query,
+    bulk_update_statement, taken_identities_query, insert_users_statement, export_users_query
+)
+
+async def load_user_by_id(id: UUID, db: AsyncSessionDep) -> User:
+    """Load a user by ID from the database, attached to the session"""
+    return (await db.exec(select(User).filter(User.id == id))).one_or_none()
+
+async def load_user_by_email(email: str, db: AsyncSessionDep) -> User:
+    """Load a user by email from the database, attached to the session"""
+    return (await db.exec(select(User).filter(User.email == email))).one_or_none()
+
+async def get_user_by_id(id: UUID, db: AsyncSessionDep) -> CachedUser:
+    """Get a read-only copy of a user by ID, from the user cache when possible"""
+    return await user_cache.get_or_load_async("id", id, lambda: load_user_by_id(id, db), store=not is_replica_session(db))
+
+async def get_user_by_email(email: str, db: AsyncSessionDep) -> CachedUser:
+    """Get a read-only copy of a user by email, from the user cache when possible"""
+    return await user_cache.get_or_load_async(
+        "email", email, lambda: load_user_by_email(email, db), store=not is_replica_session(db)
+    )
+
+async def create_user(new_user: User, db: AsyncSessionDep) -> User:
+    """Create a new user"""
+    db.add(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+    # Forget cached misses for the new user
+    await user_cache.invalidate_async(new_user.id, new_user.email)
+
+    return new_user
+
+async def get_taken_identities(emails: list[str], usernames: list[str], db: AsyncSessionDep) -> tuple[set[str], set[str]]:
+    """Get the emails and usernames already in use, in a single query"""
+    rows = (await db.exec(taken_identities_query(emails, usernames))).all()
+    return {row.email for row in rows}, {row.username for row in rows}
+
+async def insert_users(new_users: list[User], db: AsyncSessionDep) -> set[UUID]:
+    """Insert users in one statement, returning the ids that were inserted"""
+    if not new_users:
+        return set()
+    inserted = set((await db.exec(insert_users_statement(new_users))).scalars())
+    await db.commit()
+    await user_cache.invalidate_async(None, *(user.email for user in new_users if user.id in inserted))
+
+    return inserted
+
+async def lookup_users(ids: list[UUID], emails: list[str], db: AsyncSessionDep) -> list[UserSummary]:
+    """Get the users with any of ids or emails, in one query"""
+    return [UserSummary(**row._mapping) for row in await db.exec(lookup_users_query(ids, emails))]
+
+async def get_user_roles(ids: list[UUID], db: AsyncSessionDep) -> dict[UUID, UserRole]:
+    """Get the role of each existing user in ids, in one query"""
+    return {row.id: row.role for row in await db.exec(user_roles_query(ids))}
+
+async def bulk_update_users(
+    ids: list[UUID], role: UserRole | None, is_active: bool | None, own_id: UUID, roles: set[UserRole], db: AsyncSessionDep
+) -> list[Row]:
+    """Update many users in one statement, returning the updated rows"""
+    rows = (await db.exec(bulk_update_statement(ids, role, is_active, own_id, roles))).all()
+    await db.commit()
+    await user_cache.invalidate_many_async([row.id for row in rows], [row.email for row in rows])
+
+    return rows
+
+async def get_users_page(limit: int, after: tuple[datetime, UUID] | None, filters: UserFilters | None, sort: str, db: AsyncSessionDep) -> list[UserSummary]:
+    """Get one page of users, with up to limit + 1 rows"""
+    return [UserSummary(**row._mapping) for row in await db.exec(users_page_query(limit, after, filters, sort))]
+
+async def search_users(q: str, limit: int, db: AsyncSessionDep) -> list[UserSummary]:
+    """Get up to limit users matching q, best matches first"""
+    if search.trigram_installed is None:
+        search.trigram_installed = (await db.exec(search.TRIGRAM_CHECK)).scalar()
+    return [UserSummary(**row._mapping) for row in await db.exec(search_users_query(q, limit, search.trigram_installed))]
+
+async def stream_users(batch_size: int, db: AsyncSessionDep) -> AsyncIterator[list[Row]]:
+    """Yield batches of user summary rows without loading the whole table"""
+    result = await db.stream(export_users_query(batch_size))
+    async for rows in result.partitions():
+        yield rows
+
+async def update_user(
+    id: UUID, user_update: UpdateUserRequest, own_id: UUID, roles: set[UserRole], db: AsyncSessionDep
+) -> Row | None:
+    """Update a user in one statement, returning the updated row, None if no such user may be updated"""
+    row = (await db.exec(update_user_statement(id, user_update, own_id, roles))).one_or_none()
+    await db.commit()
+    if row is not None:
+        await user_cache.invalidate_async(id, row.previous_email, row.email)
+
+    return row
+
+async def update_password(id: UUID, password_hash: str, db: AsyncSessionDep) -> Row | None:
+    """Update a user's password with an already hashed value, returning the new token version and email"""
+    row = (await db.exec(update_password_statement(id, password_hash))).one_or_none()
+    await db.commit()
+    if row is not None:
+        await user_cache.invalidate_async(id, row.email)
+
+    return row
+
+async def bump_token_version(id: UUID, db: AsyncSessionDep) -> int | None:
+    """Revoke every token issued to a user, returning the new version"""
+    row = (await db.exec(
+        update(User)
+        .where(User.id == id)
+        .values(token_version=User.token_version + 1)
+        .returning(User.token_version, User.email)
+    )).one_or_none()
+    await db.commit()
+    if row is None:
+        return None
+    await user_cache.invalidate_async(id, row.email)
+
+    return row.token_version
+
+async def delete_user(id: UUID, db: AsyncSessionDep) -> None:
+    """Delete a user, recording the deletion for the other workers"""
+    user = await load_user_by_id(id, db)
+    email = user.email
+
+    await db.delete(user)
+    db.add(DeletedUser(user_id=id))
+    await db.commit()
+    await user_cache.invalidate_async(id, email)
@@ -0,0 +1,176 @@
+from uuid import UUID
+from typing import AsyncIterable, AsyncIterator, Callable
+from sqlmodel.ext.asyncio.session import AsyncSession
+from . import models
+from . import async_repository as repository
+from .loader import AsyncUserLoader
+from .service import (
+    validate_user_format, ensure_email_available, validate_user_update, build_new_user,
+    build_create_response, build_get_response, build_update_response, revoke_cached_tokens,
+    user_version_headers, ensure_modified, build_lookup_response, build_bulk_update_response, bulk_targets,
+    build_users_page, USERS_PAGE_DEFAULT_LIMIT, USERS_PAGE_MAX_LIMIT, USER_IMPORT_CHUNK_SIZE,
+    USER_SEARCH_DEFAULT_LIMIT, USER_SEARCH_MAX_LIMIT, USER_SEARCH_MIN_LENGTH,
+    import_format, validate_import_chunk, reject_taken, build_import_results, build_import_response,
+    USER_EXPORT_BATCH_SIZE, EXPORT_MEDIA_TYPES, format_export_header, format_export_rows
+)
+from src.database.core import AsyncSessionDep
+from src.auth.dependencies import CurrentUser, updatable_roles
+from src.entities.user import UserRole
+from src.exceptions import UserAlreadyExistsError, UserNotFoundError, InvalidPasswordError, ForbiddenError
+from src.lib.hashing import password_hasher
+from src.auth.token_versions import DELETED_USER_VERSION
+from src.lib.pagination import decode_cursor
+from src.lib.streaming import aiter_lines, aiter_records, achunked
+
+async def create_user(user_input: models.CreateUserRequest, db: AsyncSessionDep) -> models.CreateUserResponse:
+    validate_user_format(user_input)
+    ensure_email_available(await repository.get_user_by_email(user_input.email, db))
+
+    new_user = build_new_user(user_input, await password_hasher.hash_async(user_input.password))
+    return build_create_response(await repository.create_user(new_user, db))
+
+async def import_users(chunks: AsyncIterable[bytes], content_type: str | None, db: AsyncSessionDep) -> models.BulkImportResponse:
+    """Create users from a streamed NDJSON or CSV body, see service.import_users"""
+    format = import_format(content_type)
+    results: list[models.BulkUserResult] = []
+    seen_emails: set[str] = set()
+    seen_usernames: set[str] = set()
+
+    async for chunk in achunked(aiter_records(aiter_lines(chunks), format), USER_IMPORT_CHUNK_SIZE):
+        accepted, failed = validate_import_chunk(chunk, seen_emails, seen_usernames)
+        results += failed
+        if not accepted:
+            continue
+
+        taken = await repository.get_taken_identities(
+            [user_input.email for _, user_input in accepted],
+            [user_input.username for _, user_input in accepted],
+            db
+        )
+        accepted, failed = reject_taken(accepted, *taken)
+        results += failed
+
+        password_hashes = await password_hasher.hash_many_async([user_input.password for _, user_input in accepted])
+        new_users = [build_new_user(user_input, password_hash) for (_, user_input), password_hash in zip(accepted, password_hashes)]
+        inserted = await repository.insert_users(new_users, db)
+        results += build_import_results(accepted, new_users, inserted)
+
+    return build_import_response(results)
+
+async def export_users(format: str, session_factory: Callable[[], AsyncSession]) -> AsyncIterator[str]:
+    """Stream every user as CSV or NDJSON, see service.export_users"""
+    yield format_export_header(format)
+    async with session_factory() as db:
+        async for rows in repository.stream_users(USER_EXPORT_BATCH_SIZE, db):
+            yield format_export_rows(rows, format)
+
+async def get_users(
+    db: AsyncSessionDep,
+    limit: int = USERS_PAGE_DEFAULT_LIMIT,
+    cursor: str | None = None,
+    filters: models.UserFilters | None = None,
+    sort: models.UserSort = "created_at"
+) -> tuple[list[models.UserSummary], str | None]:
+    """Get a page of filtered users and the cursor of the next page, if any"""
+    after = decode_cursor(cursor, sort) if cursor else None
+    return build_users_page(await repository.get_users_page(limit, after, filters, sort, db), limit, sort)
+
+async def search_users(q: str, db: AsyncSessionDep, limit: int = USER_SEARCH_DEFAULT_LIMIT) -> list[models.UserSummary]:
+    """Search users by partial username or email"""
+    return await repository.search_users(q, limit, db)
+
+async def lookup_users(lookup: models.UserLookupRequest, db: AsyncSessionDep) -> models.UserLookupResponse:
+    """Get the users with the requested ids and emails"""
+    users = await repository.lookup_users(list(set(lookup.ids)), list(set(lookup.emails)), db)
+    return build_lookup_response(lookup, users)
+
+async def get_user_by_id(id: UUID, db: AsyncSessionDep, if_none_match: str | None = None) -> tuple[models.GetUserResponse, dict[str, str]]:
+    """Get a user by ID and its version headers, see service.get_user_by_id"""
+    user = await repository.get_user_by_id(id, db)
+    if not user:
+        raise UserNotFoundError(user_id=id)
+
+    headers = user_version_headers(user)
+    ensure_modified(headers, if_none_match)
+    return build_get_response(user), headers
+
+async def get_user_by_email(email: str, db: AsyncSessionDep):
+    """Get a user by email"""
+    user = await repository.get_user_by_email(email, db)
+    if not user:
+        raise UserNotFoundError(user_id=email)
+    return user
+
+async def update_user_by_id(
+    id: UUID, user_input: models.UpdateUserRequest, current_user: CurrentUser, db: AsyncSessionDep,
+    users: AsyncUserLoader | None = None
+) -> models.UpdateUserResponse:
+    """Update a user by ID, see service.update_user_by_id"""
+    user = await (users or AsyncUserLoader(db)).get(id)
+    if not user:
+        raise UserNotFoundError(user_id=id)
+
+    validate_user_update(user_input)
+
+    # Check if email already exists for another user
+    if user_input.email is not None and user_input.email != user.email:
+        existing_user = await repository.get_user_by_email(user_input.email, db)
+        if existing_user and existing_user.id != id:
+            raise UserAlreadyExistsError(user_id=existing_user.id)
+
+    # Nothing to write
+    if not user_input.model_dump(exclude_none=True):
+        return build_update_response(user)
+
+    updated_user = await repository.update_user(id, user_input, current_user.id, updatable_roles(current_user), db)
+    if updated_user is None:
+        if await repository.load_user_by_id(id, db) is not None:
+            raise ForbiddenError()
+        raise UserNotFoundError(user_id=id)
+    revoke_cached_tokens(id, updated_user.token_version)
+
+    return build_update_response(updated_user)
+
+async def bulk_update_users(user_input: models.BulkUpdateUserRequest, current_user: CurrentUser, db: AsyncSessionDep) -> models.BulkUpdateUserResponse:
+    """Apply a role and / or active state change to many users, see service.bulk_update_users"""
+    ids = list(dict.fromkeys(user_input.ids))
+    roles = updatable_roles(current_user)
+    target_roles = await repository.get_user_roles(ids, db) if roles != set(UserRole) else None
+    allowed, refused = bulk_targets(ids, current_user, target_roles)
+
+    rows = await repository.bulk_update_users(allowed, user_input.role, user_input.is_active, current_user.id, roles, db) if allowed else []
+    for row in rows:
+        revoke_cached_tokens(row.id, row.token_version)
+
+    return build_bulk_update_response(ids, refused, rows)
+
+async def update_password_by_id(
+    id: UUID, password_input: models.UpdatePasswordRequest, db: AsyncSessionDep, users: AsyncUserLoader | None = None
+):
+    """Update a user's password"""
+    # The old password is checked against the database, never a cached copy
+    user = await (users or AsyncUserLoader(db)).load(id)
+    if not user:
+        raise UserNotFoundError(user_id=id)
+
+    if not await password_hasher.verify_async(password_input.old_password, user.password_hash):
+        raise InvalidPasswordError()
+
+    password_hash = await password_hasher.hash_async(password_input.new_password)
+    updated_user = await repository.update_password(id, password_hash, db)
+    if updated_user is None:
+        raise UserNotFoundError(user_id=id)
+    revoke_cached_tokens(id, updated_user.token_version)
+
+    return {"message": "Password updated successfully"}
+
+async def delete_user_by_id(id: UUID, db: AsyncSessionDep):
+    """Delete a user by ID"""
+    user = await repository.get_user_by_id(id, db)
+    if not user:
+        raise UserNotFoundError(user_id=id)
+
+    await repository.delete_user(id, db)
+    revoke_cached_tokens(id, DELETED_USER_VERSION)
+
+    return {"message": f"User with id {id} deleted successfully"}
@@ -0,0 +1,159 @@
+import threading
+from typing import Awaitable, Callable, Iterable, Optional
+from uuid import UUID
+from pydantic import BaseModel, ConfigDict, EmailStr, create_model
+from src.entities.user import User
+from src.database.tenants import current_tenant, models_schema, tenant_schema
+from fastapi.concurrency import run_in_threadpool
+from src.lib.cache import CacheBackend, MemoryCache, cache_from_url
+from src.settings import get_settings
+
+# memory:// caches per worker, redis:// shares the cache between workers
+USER_CACHE_URL: str = get_settings().user_cache_url
+USER_CACHE_TTL_SECONDS: float = get_settings().user_cache_ttl_seconds
+USER_CACHE_NEGATIVE_TTL_SECONDS: float = get_settings().user_cache_negative_ttl_seconds
+USER_CACHE_MAX_SIZE: int = get_settings().user_cache_max_size
+
+# Stored for lookups that found no user
+MISSING = b"null"
+
+# Fields never cached, signins and password changes load the user from the database
+UNCACHED_FIELDS = {"password_hash"}
+
+# Frozen copy of a user row, with the fields of User but UNCACHED_FIELDS. Table models
+# skip validation, so this model parses cached entries back to UUIDs, enums and datetimes.
+CachedUser = create_model(
+    "CachedUser",
+    __config__=ConfigDict(frozen=True),
+    **{
+        name: (str if field.annotation is EmailStr else field.annotation, ...)
+        for name, field in User.model_fields.items()
+        if name not in UNCACHED_FIELDS
+    }
+)
+
+class UserCache:
+    """
+    Read-through cache of user rows by id and by email
+
+    Hits return a CachedUser, a read-only copy of the row that is not
+    attached to a session, so writes must load the user with the uncached
+    repository functions. Misses are cached too, for a shorter TTL. Keys
+    include the schema, so tenants never share entries. Rows read from a
+    replica are returned but not stored, they may predate a write.
+
+    Writers invalidate after committing. Loads that started before an
+    invalidation are not stored, so they can't put back the old row. With
+    the in-process backend invalidation only reaches the current worker and
+    the TTL bounds staleness elsewhere. The async methods make the calls to
+    shared backends in the threadpool, they are network round trips.
+    """
+    def __init__(self, backend: CacheBackend, ttl_seconds: float, negative_ttl_seconds: float):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._lock = threading.Lock()
+        # Bumped by every invalidation so loads that started before it are not stored
+        self._generation = 0
+        # Shared backends are network calls, kept off the event loop
+        self._blocking = not isinstance(backend, MemoryCache)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    @staticmethod
+    def key(field: str, value) -> str:
+        tenant = current_tenant()
+        schema = tenant_schema(tenant) if tenant is not None else models_schema()
+        return f"user:{schema}:{field}:{value}"
+
+    def get_or_load(self, field: str, value, loader: Callable[[], Optional[User]], store: bool = True) -> Optional[BaseModel]:
+        """
+        Return the cached user whose field equals value, loading it on a miss
+
+        Args:
+            field (str): id or email
+            value: Value looked up
+            loader (Callable): Loads the user from the database, or None
+            store (bool): Whether the loaded user may be cached, False for replica reads
+        """
+        if not self.enabled:
+            return loader()
+        key = self.key(field, value)
+        cached = self.backend.get(key)
+        if cached is not None:
+            return self._decode(cached)
+        generation = self._generation
+        return self._store(key, loader(), generation, store)
+
+    async def get_or_load_async(
+        self, field: str, value, loader: Callable[[], Awaitable[Optional[User]]], store: bool = True
+    ) -> Optional[BaseModel]:
+        """Async version of get_or_load"""
+        if not self.enabled:
+            return await loader()
+        key = self.key(field, value)
+        cached = await self._run(self.backend.get, key)
+        if cached is not None:
+            return self._decode(cached)
+        generation = self._generation
+        return await self._run(self._store, key, await loader(), generation, store)
+
+    def invalidate(self, id: UUID | None, *emails: str | None):
+        """Drop the entries of a user id and emails, after the write was committed"""
+        self.invalidate_many([id] if id is not None else [], emails)
+
+    def invalidate_many(self, ids: Iterable[UUID], emails: Iterable[str | None]):
+        """Drop the entries of many users at once, see invalidate"""
+        self._drop(self._keys(ids, emails))
+
+    async def invalidate_async(self, id: UUID | None, *emails: str | None):
+        """Async version of invalidate"""
+        await self.invalidate_many_async([id] if id is not None else [], emails)
+
+    async def invalidate_many_async(self, ids: Iterable[UUID], emails: Iterable[str | None]):
+        """Async version of invalidate_many"""
+        await self._run(self._drop, self._keys(ids, emails))
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+        self.backend.clear()
+
+    async def _run(self, function: Callable, *args):
+        if self._blocking:
+            return await run_in_threadpool(function, *args)
+        return function(*args)
+
+    def _keys(self, ids: Iterable[UUID], emails: Iterable[str | None]) -> list[str]:
+        keys = [self.key("email", email) for email in emails if email is not None]
+        return keys + [self.key("id", id) for id in ids]
+
+    def _drop(self, keys: list[str]):
+        with self._lock:
+            self._generation += 1
+        self.backend.delete(*keys)
+
+    @staticmethod
+    def _decode(cached: bytes) -> Optional[BaseModel]:
+        return None if cached == MISSING else CachedUser.model_validate_json(cached)
+
+    def _store(self, key: str, user: Optional[User], generation: int, store: bool) -> Optional[BaseModel]:
+        snapshot = None if user is None else CachedUser.model_validate(user, from_attributes=True)
+        with self._lock:
+            # Stored under the lock so an invalidation can't slip in between
+            if not store or generation != self._generation:
+                return snapshot
+            if snapshot is not None:
+                self.backend.set(key, snapshot.model_dump_json().encode(), self.ttl_seconds)
+            elif self.negative_ttl_seconds > 0:
+                self.backend.set(key, MISSING, self.negative_ttl_seconds)
+        return snapshot
+
+# Shared cache used by the users repositories
+user_cache = UserCache(
+    cache_from_url(USER_CACHE_URL, USER_CACHE_MAX_SIZE, "realstate:"),
+    USER_CACHE_TTL_SECONDS,
+    USER_CACHE_NEGATIVE_TTL_SECONDS,
+)
@@ -0,0 +1,55 @@
+from uuid import UUID
+from typing import Annotated
+from fastapi import Depends
+from src.entities.user import User
+from src.database.core import SessionDep, AsyncSessionDep
+from src.domain.users.cache import CachedUser
+from src.domain.users import repository, async_repository
+
+class UserLoader:
+    """
+    Users of one request, each read at most once
+
+    The permission check and the service of a request share one loader,
+    so the target user fetched for authorization is the one updated.
+    get reads through the user cache, load always reads the database
+    (e.g. for the password hash or the role a permission check depends
+    on) and later gets reuse its row.
+    """
+    def __init__(self, db: SessionDep):
+        self.db = db
+        self._users: dict[UUID, User | CachedUser | None] = {}
+        self._loaded: set[UUID] = set()
+
+    def get(self, id: UUID) -> User | CachedUser | None:
+        if id not in self._users:
+            self._users[id] = repository.get_user_by_id(id, self.db)
+        return self._users[id]
+
+    def load(self, id: UUID) -> User | None:
+        if id not in self._loaded:
+            self._users[id] = repository.load_user_by_id(id, self.db)
+            self._loaded.add(id)
+        return self._users[id]
+
+class AsyncUserLoader:
+    """Async counterpart of UserLoader"""
+    def __init__(self, db: AsyncSessionDep):
+        self.db = db
+        self._users: dict[UUID, User | CachedUser | None] = {}
+        self._loaded: set[UUID] = set()
+
+    async def get(self, id: UUID) -> User | CachedUser | None:
+        if id not in self._users:
+            self._users[id] = await async_repository.get_user_by_id(id, self.db)
+        return self._users[id]
+
+    async def load(self, id: UUID) -> User | None:
+        if id not in self._loaded:
+            self._users[id] = await async_repository.load_user_by_id(id, self.db)
+            self._loaded.add(id)
+        return self._users[id]
+
+# Dependencies are cached per request, every Depends on these gets the same loader
+UserLoaderDep = Annotated[UserLoader, Depends(UserLoader)]
+AsyncUserLoaderDep = Annotated[AsyncUserLoader, Depends(AsyncUserLoader)]
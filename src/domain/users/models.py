@@ -1,6 +1,7 @@
 from uuid import UUID
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field, model_validator
+from typing import Optional, Literal
 from src.entities.user import UserRole
 
 class CreateUserRequest(BaseModel):
@@ -24,12 +25,94 @@ class GetUserResponse(BaseModel):
     is_active: bool
     message: str
 
+class UserSummary(BaseModel):
+    id: UUID
+    username: Optional[str]
+    email: str
+    role: UserRole
+    is_active: bool
+    created_at: datetime
+    updated_at: datetime
+
+# Sort of the user listing, a leading - sorts in descending order
+UserSort = Literal["created_at", "-created_at", "updated_at", "-updated_at"]
+
+class UserFilters(BaseModel):
+    """Filters of the user listing, unset fields don't filter
+
+    The after bounds are inclusive and the before bounds exclusive.
+    """
+    role: Optional[UserRole] = None
+    is_active: Optional[bool] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    updated_after: Optional[datetime] = None
+    updated_before: Optional[datetime] = None
+
+# Most ids and emails resolved by one lookup
+USER_LOOKUP_MAX_KEYS = 100
+
+class UserLookupRequest(BaseModel):
+    ids: list[UUID] = Field(default_factory=list, max_length=USER_LOOKUP_MAX_KEYS)
+    emails: list[str] = Field(default_factory=list, max_length=USER_LOOKUP_MAX_KEYS)
+
+    @model_validator(mode="after")
+    def check_key_count(self):
+        if not 0 < len(self.ids) + len(self.emails) <= USER_LOOKUP_MAX_KEYS:
+            raise ValueError(f"Provide between 1 and {USER_LOOKUP_MAX_KEYS} ids and emails")
+        return self
+
+class UserLookupResponse(BaseModel):
+    # Requested id or email -> user, null when no user matches
+    users: dict[str, Optional[UserSummary]]
+    not_found: list[str]
+
+class BulkUserResult(BaseModel):
+    row: int
+    status: Literal["created", "failed"]
+    id: Optional[UUID] = None
+    email: Optional[str] = None
+    error: Optional[str] = None
+
+class BulkImportResponse(BaseModel):
+    created: int
+    failed: int
+    results: list[BulkUserResult]
+    message: str
+
 class UpdateUserRequest(BaseModel):
     username: Optional[str] = None
     email: Optional[EmailStr] = None
     role: Optional[UserRole] = None
     is_active: Optional[bool] = None
 
+# Most users changed by one bulk update
+USER_BULK_UPDATE_MAX_IDS = 500
+
+class BulkUpdateUserRequest(BaseModel):
+    """Change applied to every user in ids, usernames and emails are unique so only role and is_active"""
+    ids: list[UUID] = Field(min_length=1, max_length=USER_BULK_UPDATE_MAX_IDS)
+    role: Optional[UserRole] = None
+    is_active: Optional[bool] = None
+
+    @model_validator(mode="after")
+    def check_change(self):
+        if self.role is None and self.is_active is None:
+            raise ValueError("Provide role or is_active")
+        return self
+
+class BulkUpdateUserResult(BaseModel):
+    id: UUID
+    status: Literal["updated", "failed"]
+    user: Optional[UserSummary] = None
+    error: Optional[str] = None
+
+class BulkUpdateUserResponse(BaseModel):
+    updated: int
+    failed: int
+    results: list[BulkUpdateUserResult]
+    message: str
+
 class UpdatePasswordRequest(BaseModel):
     old_password: str
     new_password: str
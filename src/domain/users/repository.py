@@ -1,67 +1,293 @@
 from uuid import UUID
-from src.entities.user import User
+from datetime import datetime
+from typing import Iterator
+from src.entities.user import User, UserRole, DeletedUser
 from src.database.core import SessionDep
-from sqlmodel import select
-from src.domain.users.models import UpdateUserRequest, UpdatePasswordRequest
-from src.lib.utils import hash_password
+from src.database.replicas import is_replica_session
+from sqlmodel import select, update
+from sqlalchemy import tuple_, or_, any_, bindparam, case, func, literal, true, false, String, Row
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert
+from src.domain.users.models import UpdateUserRequest, UserSummary, UserFilters
+from src.domain.users.cache import CachedUser, user_cache
+from src.database import search
 
-def get_user_by_id(id: UUID, db: SessionDep) -> User:
-    """Get a user by ID"""
+# Columns needed by UserSummary, never the password hash
+USER_SUMMARY_COLUMNS = (User.id, User.username, User.email, User.role, User.is_active, User.created_at, User.updated_at)
+
+def load_user_by_id(id: UUID, db: SessionDep) -> User:
+    """Load a user by ID from the database, attached to the session"""
     return db.exec(select(User).filter(User.id == id)).one_or_none()
 
-def get_user_by_email(email: str, db: SessionDep) -> User:
-    """Get a user by email"""
+def load_user_by_email(email: str, db: SessionDep) -> User:
+    """Load a user by email from the database, attached to the session"""
     return db.exec(select(User).filter(User.email == email)).one_or_none()
 
+def get_user_by_id(id: UUID, db: SessionDep) -> CachedUser:
+    """Get a read-only copy of a user by ID, from the user cache when possible"""
+    return user_cache.get_or_load("id", id, lambda: load_user_by_id(id, db), store=not is_replica_session(db))
+
+def get_user_by_email(email: str, db: SessionDep) -> CachedUser:
+    """Get a read-only copy of a user by email, from the user cache when possible"""
+    return user_cache.get_or_load("email", email, lambda: load_user_by_email(email, db), store=not is_replica_session(db))
+
 def create_user(new_user: User, db: SessionDep) -> User:
     """Create a new user"""
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
+    # Forget cached misses for the new user
+    user_cache.invalidate(new_user.id, new_user.email)
     
     return new_user
 
+def taken_identities_query(emails: list[str], usernames: list[str]):
+    """Query for existing users sharing any of the given emails or usernames"""
+    return select(User.email, User.username).where(or_(User.email.in_(emails), User.username.in_(usernames)))
+
+def get_taken_identities(emails: list[str], usernames: list[str], db: SessionDep) -> tuple[set[str], set[str]]:
+    """Get the emails and usernames already in use, in a single query"""
+    rows = db.exec(taken_identities_query(emails, usernames)).all()
+    return {row.email for row in rows}, {row.username for row in rows}
+
+def insert_users_statement(new_users: list[User]):
+    """Multi-row INSERT skipping rows that hit a unique constraint
+
+    Built on the table so the schema set at startup is used.
+    """
+    table = User.__table__
+    rows = [{column.name: getattr(user, column.name) for column in table.columns} for user in new_users]
+    return insert(table).values(rows).on_conflict_do_nothing().returning(table.c.id)
+
+def insert_users(new_users: list[User], db: SessionDep) -> set[UUID]:
+    """Insert users in one statement, returning the ids that were inserted"""
+    if not new_users:
+        return set()
+    inserted = set(db.exec(insert_users_statement(new_users)).scalars())
+    db.commit()
+    user_cache.invalidate(None, *(user.email for user in new_users if user.id in inserted))
+    
+    return inserted
+
+def id_array(ids: list[UUID]):
+    """ids bound as a single array parameter, for = ANY"""
+    return bindparam("ids", ids, type_=ARRAY(User.__table__.c.id.type))
+
+def lookup_users_query(ids: list[UUID], emails: list[str]):
+    """Query for the users with any of ids or emails
+
+    Each list is bound as a single array for = ANY, so the statement text
+    is the same whatever the number of keys.
+    """
+    return select(*USER_SUMMARY_COLUMNS).where(or_(
+        User.id == any_(id_array(ids)),
+        User.email == any_(bindparam("emails", emails, type_=ARRAY(User.__table__.c.email.type))),
+    ))
+
+def lookup_users(ids: list[UUID], emails: list[str], db: SessionDep) -> list[UserSummary]:
+    """Get the users with any of ids or emails, in one query"""
+    return [UserSummary(**row._mapping) for row in db.exec(lookup_users_query(ids, emails))]
+
+def user_roles_query(ids: list[UUID]):
+    """Query for the id and role of the users with any of ids"""
+    return select(User.id, User.role).where(User.id == any_(id_array(ids)))
+
+def get_user_roles(ids: list[UUID], db: SessionDep) -> dict[UUID, UserRole]:
+    """Get the role of each existing user in ids, in one query"""
+    return {row.id: row.role for row in db.exec(user_roles_query(ids))}
+
+def bulk_update_statement(ids: list[UUID], role: UserRole | None, is_active: bool | None, own_id: UUID, roles: set[UserRole]):
+    """UPDATE of role and / or is_active for ids, returning the updated rows
+
+    Only rows that are own_id or have one of roles are written, so a target
+    whose role changed since it was authorized is skipped. token_version is
+    bumped on the rows whose role or active state actually changes.
+    """
+    values, changes = {}, []
+    if role is not None:
+        values["role"] = role
+        changes.append(User.role.is_distinct_from(role))
+    if is_active is not None:
+        values["is_active"] = is_active
+        changes.append(User.is_active.is_distinct_from(is_active))
+    values["token_version"] = User.token_version + case((or_(*changes), 1), else_=0)
+    return (
+        update(User)
+        .where(User.id == any_(id_array(ids)), or_(User.id == own_id, User.role.in_(roles)))
+        .values(**values)
+        .returning(*USER_SUMMARY_COLUMNS, User.token_version)
+    )
+
+def bulk_update_users(
+    ids: list[UUID], role: UserRole | None, is_active: bool | None, own_id: UUID, roles: set[UserRole], db: SessionDep
+) -> list[Row]:
+    """Update many users in one statement, returning the updated rows"""
+    rows = db.exec(bulk_update_statement(ids, role, is_active, own_id, roles)).all()
+    db.commit()
+    user_cache.invalidate_many([row.id for row in rows], [row.email for row in rows])
+    
+    return rows
+
 def get_all_users(db: SessionDep) -> list[User]:
     """Get all users"""
     return db.exec(select(User)).all()
 
-def update_user(id: UUID, user_update: UpdateUserRequest, db: SessionDep) -> User:
-    """Update a user"""
-    user = get_user_by_id(id, db)
-    
-    # Update user attributes if provided in the request
-    if user_update.username is not None:
-        user.username = user_update.username
-    if user_update.email is not None:
-        user.email = user_update.email
-    if user_update.role is not None:
-        user.role = user_update.role
-    if user_update.is_active is not None:
-        user.is_active = user_update.is_active
-    
-    db.add(user)
+# Columns the user listing can be sorted by, each ends an index together with id
+USER_SORT_COLUMNS = {"created_at": User.created_at, "updated_at": User.updated_at}
+
+def user_filter_conditions(filters: UserFilters | None) -> list:
+    """WHERE conditions of the set fields of filters"""
+    if filters is None:
+        return []
+    conditions = []
+    if filters.role is not None:
+        conditions.append(User.role == filters.role)
+    if filters.is_active is not None:
+        # Rendered as a literal so the partial indexes on active users match
+        conditions.append(User.is_active == (true() if filters.is_active else false()))
+    if filters.created_after is not None:
+        conditions.append(User.created_at >= filters.created_after)
+    if filters.created_before is not None:
+        conditions.append(User.created_at < filters.created_before)
+    if filters.updated_after is not None:
+        conditions.append(User.updated_at >= filters.updated_after)
+    if filters.updated_before is not None:
+        conditions.append(User.updated_at < filters.updated_before)
+    return conditions
+
+def users_page_query(limit: int, after: tuple[datetime, UUID] | None = None, filters: UserFilters | None = None, sort: str = "created_at"):
+    """Keyset query for one page of filtered users ordered by (sort column, id)
+
+    One extra row is fetched so the caller can tell whether a next page exists.
+    """
+    descending = sort.startswith("-")
+    column = USER_SORT_COLUMNS[sort.lstrip("-")]
+    query = select(*USER_SUMMARY_COLUMNS).where(*user_filter_conditions(filters))
+    if descending:
+        query = query.order_by(column.desc(), User.id.desc())
+    else:
+        query = query.order_by(column, User.id)
+    if after is not None:
+        position = tuple_(column, User.id)
+        query = query.where(position < tuple_(*after) if descending else position > tuple_(*after))
+    return query.limit(limit + 1)
+
+def get_users_page(limit: int, after: tuple[datetime, UUID] | None, filters: UserFilters | None, sort: str, db: SessionDep) -> list[UserSummary]:
+    """Get one page of users, with up to limit + 1 rows"""
+    return [UserSummary(**row._mapping) for row in db.exec(users_page_query(limit, after, filters, sort))]
+
+def escape_like(value: str) -> str:
+    """Escape the LIKE wildcards in value, for patterns using the default \\ escape"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def search_users_query(q: str, limit: int, trigram: bool):
+    """Query for the users best matching q by username or email
+
+    Prefix matches rank first. With pg_trgm the other matches are found by
+    trigram word similarity on the GIN indexes and ranked by it, without it
+    by a substring match ranked by username length.
+    """
+    prefix = escape_like(q) + "%"
+    is_prefix = or_(User.username.ilike(prefix), User.email.ilike(prefix))
+    if trigram:
+        term = literal(q, String)
+        matches = or_(is_prefix, term.op("<%", is_comparison=True)(User.username), term.op("<%", is_comparison=True)(User.email))
+        rank = func.greatest(func.word_similarity(term, User.username), func.word_similarity(term, User.email)).desc()
+    else:
+        pattern = "%" + escape_like(q) + "%"
+        matches = or_(User.username.ilike(pattern), User.email.ilike(pattern))
+        rank = func.length(User.username)
+    return (
+        select(*USER_SUMMARY_COLUMNS)
+        .where(matches)
+        .order_by(case((is_prefix, 0), else_=1), rank, User.username)
+        .limit(limit)
+    )
+
+def search_users(q: str, limit: int, db: SessionDep) -> list[UserSummary]:
+    """Get up to limit users matching q, best matches first"""
+    if search.trigram_installed is None:
+        search.trigram_installed = db.exec(search.TRIGRAM_CHECK).scalar()
+    return [UserSummary(**row._mapping) for row in db.exec(search_users_query(q, limit, search.trigram_installed))]
+
+def export_users_query(batch_size: int):
+    """Query for every user summary, fetched batch_size rows at a time from a server-side cursor"""
+    return select(*USER_SUMMARY_COLUMNS).order_by(User.created_at, User.id).execution_options(yield_per=batch_size)
+
+def stream_users(batch_size: int, db: SessionDep) -> Iterator[list[Row]]:
+    """Yield batches of user summary rows without loading the whole table"""
+    yield from db.exec(export_users_query(batch_size)).partitions()
+
+def update_user_statement(id: UUID, user_update: UpdateUserRequest, own_id: UUID, roles: set[UserRole]):
+    """UPDATE of the provided fields of user_update, returning the updated row
+
+    The row is joined to itself as it was before the UPDATE, which returns
+    the previous email along with it. token_version is bumped when the role
+    or active state actually changes, as both are embedded in stateless tokens.
+    Like bulk_update_statement, the row is only written if it is own_id or
+    has one of roles, so a target whose role changed since it was authorized
+    is left alone.
+    """
+    previous = User.__table__.alias("previous")
+    values = user_update.model_dump(include={"username", "email", "role", "is_active"}, exclude_none=True)
+    changes = [getattr(User, field).is_distinct_from(values[field]) for field in ("role", "is_active") if field in values]
+    if changes:
+        values["token_version"] = User.token_version + case((or_(*changes), 1), else_=0)
+    return (
+        update(User)
+        .where(User.id == id, previous.c.id == User.id, or_(User.id == own_id, User.role.in_(roles)))
+        .values(**values)
+        .returning(*USER_SUMMARY_COLUMNS, User.token_version, previous.c.email.label("previous_email"))
+    )
+
+def update_user(id: UUID, user_update: UpdateUserRequest, own_id: UUID, roles: set[UserRole], db: SessionDep) -> Row | None:
+    """Update a user in one statement, returning the updated row, None if no such user may be updated"""
+    row = db.exec(update_user_statement(id, user_update, own_id, roles)).one_or_none()
     db.commit()
-    db.refresh(user)
+    if row is not None:
+        user_cache.invalidate(id, row.previous_email, row.email)
     
-    return user
+    return row
+
+def update_password_statement(id: UUID, password_hash: str):
+    """UPDATE of a user's password hash, revoking their tokens"""
+    return (
+        update(User)
+        .where(User.id == id)
+        .values(password_hash=password_hash, token_version=User.token_version + 1)
+        .returning(User.token_version, User.email)
+    )
 
-def update_password(id: UUID, password_update: UpdatePasswordRequest, db: SessionDep) -> User:
-    """Update a user's password"""
-    user = get_user_by_id(id, db)
+def update_password(id: UUID, password_hash: str, db: SessionDep) -> Row | None:
+    """Update a user's password with an already hashed value, returning the new token version and email"""
+    row = db.exec(update_password_statement(id, password_hash)).one_or_none()
+    db.commit()
+    if row is not None:
+        user_cache.invalidate(id, row.email)
     
-    # Update user attributes if provided in the request
-    if password_update.new_password is not None:
-        user.password_hash = hash_password(password_update.new_password)
+    return row
     
-    db.add(user)
+def bump_token_version(id: UUID, db: SessionDep) -> int | None:
+    """Revoke every token issued to a user, returning the new version"""
+    row = db.exec(
+        update(User)
+        .where(User.id == id)
+        .values(token_version=User.token_version + 1)
+        .returning(User.token_version, User.email)
+    ).one_or_none()
     db.commit()
-    db.refresh(user)
+    if row is None:
+        return None
+    user_cache.invalidate(id, row.email)
     
-    return user
+    return row.token_version
     
 def delete_user(id: UUID, db: SessionDep) -> None:
-    """Delete a user"""
-    user = get_user_by_id(id, db)
+    """Delete a user, recording the deletion for the other workers"""
+    user = load_user_by_id(id, db)
+    email = user.email
     
     db.delete(user)
-    db.commit()
\ No newline at end of file
+    db.add(DeletedUser(user_id=id))
+    db.commit()
+    user_cache.invalidate(id, email)
\ No newline at end of file
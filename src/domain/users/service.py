@@ -1,13 +1,49 @@
 from uuid import UUID, uuid4
 import logging
+from typing import AsyncIterable, Callable, Iterator
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
 from . import models
 from . import repository
+from .loader import UserLoader
+from sqlmodel import Session
 from src.database.core import SessionDep
-from src.exceptions import UserAlreadyExistsError, InvalidPasswordError, InvalidEmailError, InvalidRoleError, UserCreationError
-from src.entities.user import User
-from src.lib.utils import validate_email, validate_password, validate_role, hash_password, verify_password
+from src.exceptions import (
+    UserAlreadyExistsError, InvalidPasswordError, InvalidEmailError, InvalidRoleError, UserCreationError,
+    UnsupportedMediaTypeError, NotModifiedError
+)
+from src.entities.user import User, UserRole
+from src.lib.utils import validate_email, validate_password, validate_role
+from src.lib.hashing import password_hasher
+from src.auth.cache import token_cache
+from src.auth.dependencies import CurrentUser, updatable_roles, authorize_updates
+from src.auth.token_versions import token_versions, DELETED_USER_VERSION
+from src.lib.pagination import encode_cursor, decode_cursor
+from src.lib.responses import entity_tag, etag_matches
+from src.settings import get_settings
+from src.lib.streaming import record_format, aiter_lines, aiter_records, achunked, format_csv, format_ndjson
 
-def create_user(user_input: models.CreateUserRequest, db: SessionDep) -> models.CreateUserResponse:
+USERS_PAGE_DEFAULT_LIMIT = 50
+USERS_PAGE_MAX_LIMIT = 500
+USER_SEARCH_DEFAULT_LIMIT = 20
+USER_SEARCH_MAX_LIMIT = 100
+# Shorter terms have no complete trigram, the indexes can't serve them and the table would be scanned
+USER_SEARCH_MIN_LENGTH = 3
+
+# Postgres takes at most 65535 bind parameters per statement
+POSTGRES_MAX_PARAMETERS = 65535
+
+# Rows validated, checked for conflicts and inserted per round trip by the bulk import,
+# capped so the multi-row INSERT of a chunk stays under the bind parameter limit
+USER_IMPORT_CHUNK_SIZE = min(get_settings().user_import_chunk_size, POSTGRES_MAX_PARAMETERS // len(User.__table__.columns))
+
+# Rows fetched from the server-side cursor per chunk of the export
+USER_EXPORT_BATCH_SIZE = get_settings().user_export_batch_size
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def validate_user_format(user_input: models.CreateUserRequest) -> None:
+    """Validate the format of a new user request"""
     # Validate email
     if not validate_email(user_input.email):
         logging.error("Invalid email format")
@@ -20,23 +56,27 @@ def create_user(user_input: models.CreateUserRequest, db: SessionDep) -> models.
     if not validate_role(user_input.role):
         logging.error("Invalid role format")
         raise InvalidRoleError()
-    
-    existing_user = repository.get_user_by_email(user_input.email, db)
 
+def ensure_email_available(existing_user: User | None) -> None:
     if existing_user:
         logging.error("User already exists")
         raise UserAlreadyExistsError(user_id=existing_user.id)
-    
-    # Create the new user
-    new_user = User(
+
+def validate_new_user(user_input: models.CreateUserRequest, db: SessionDep) -> None:
+    """Validate a new user request, raising if it can't be created"""
+    validate_user_format(user_input)
+    ensure_email_available(repository.get_user_by_email(user_input.email, db))
+
+def build_new_user(user_input: models.CreateUserRequest, password_hash: str) -> User:
+    return User(
         id=uuid4(),
         username=user_input.username,
         email=user_input.email,
-        password_hash=hash_password(user_input.password),
+        password_hash=password_hash,
         role=user_input.role
     )
 
-    db_user = repository.create_user(new_user, db)
+def build_create_response(db_user: User | None) -> models.CreateUserResponse:
     if not db_user:
         logging.error("User creation failed")
         raise UserCreationError()
@@ -51,18 +91,16 @@ def create_user(user_input: models.CreateUserRequest, db: SessionDep) -> models.
         status_code=201
     )
 
-def get_users(db: SessionDep):
-    """Get all users"""
-    return repository.get_all_users(db)
+def user_version_headers(user: User) -> dict[str, str]:
+    """ETag of the stored version of a user, clients revalidate it before reusing a copy"""
+    return {"ETag": entity_tag(user.id, user.updated_at.isoformat()), "Cache-Control": "private, no-cache"}
 
-def get_user_by_id(id: UUID, db: SessionDep) -> models.GetUserResponse:
-    """Get a user by ID"""
-    from src.exceptions import UserNotFoundError
-    
-    user = repository.get_user_by_id(id, db)
-    if not user:
-        raise UserNotFoundError(user_id=id)
-    
+def ensure_modified(headers: dict[str, str], if_none_match: str | None) -> None:
+    """Raise NotModifiedError when the client already has this version"""
+    if etag_matches(if_none_match, headers["ETag"]):
+        raise NotModifiedError(headers)
+
+def build_get_response(user: User) -> models.GetUserResponse:
     return models.GetUserResponse(
         id=user.id,
         username=user.username,
@@ -72,6 +110,259 @@ def get_user_by_id(id: UUID, db: SessionDep) -> models.GetUserResponse:
         message="User retrieved successfully"
     )
 
+def build_update_response(user: User) -> models.UpdateUserResponse:
+    return models.UpdateUserResponse(
+        id=user.id,
+        username=user.username,
+        email=user.email,
+        role=user.role,
+        is_active=user.is_active,
+        message="User updated successfully"
+    )
+
+def validate_user_update(user_input: models.UpdateUserRequest) -> None:
+    """Validate the format of the provided update fields"""
+    from src.exceptions import InvalidEmailError, InvalidRoleError
+    
+    if user_input.email is not None and not validate_email(user_input.email):
+        raise InvalidEmailError()
+    if user_input.role is not None and not validate_role(user_input.role):
+        raise InvalidRoleError()
+
+def revoke_cached_tokens(id: UUID, token_version: int) -> None:
+    """Propagate a token_version change to the in-process auth caches"""
+    token_versions.current().bump(id, token_version)
+    token_cache.invalidate_user(id)
+
+def create_user(user_input: models.CreateUserRequest, db: SessionDep) -> models.CreateUserResponse:
+    validate_new_user(user_input, db)
+    new_user = build_new_user(user_input, password_hasher.hash(user_input.password))
+    return build_create_response(repository.create_user(new_user, db))
+
+async def create_user_async(user_input: models.CreateUserRequest, db: SessionDep) -> models.CreateUserResponse:
+    """Same as create_user, but awaits the password hash instead of blocking a thread
+    
+    Database calls run in the threadpool, the event loop only waits on them.
+    """
+    await run_in_threadpool(validate_new_user, user_input, db)
+    new_user = build_new_user(user_input, await password_hasher.hash_async(user_input.password))
+    return build_create_response(await run_in_threadpool(repository.create_user, new_user, db))
+
+def import_format(content_type: str | None) -> str:
+    """Get the record format of a bulk import body from its Content-Type"""
+    format = record_format(content_type)
+    if format is None:
+        raise UnsupportedMediaTypeError("application/x-ndjson or text/csv")
+    return format
+
+def import_failure(row: int, error: str, email=None) -> models.BulkUserResult:
+    return models.BulkUserResult(row=row, status="failed", email=email if isinstance(email, str) else None, error=error)
+
+def describe_validation_error(error: ValidationError) -> str:
+    first = error.errors()[0]
+    field = ".".join(str(part) for part in first["loc"])
+    return f"{field}: {first['msg']}" if field else first["msg"]
+
+def validate_import_row(record: dict) -> models.CreateUserRequest:
+    """Validate one bulk import record the same way a single create is validated"""
+    user_input = models.CreateUserRequest.model_validate(record)
+    validate_user_format(user_input)
+    # A single row violating a column constraint would fail its whole chunk
+    username_length = User.__table__.c.username.type.length
+    if not user_input.username or not 3 <= len(user_input.username) <= username_length:
+        raise HTTPException(status_code=400, detail=f"Username must be 3 to {username_length} characters")
+    if len(user_input.email) > User.__table__.c.email.type.length:
+        raise InvalidEmailError()
+    return user_input
+
+def validate_import_chunk(
+    chunk: list[tuple[int, dict | None]],
+    seen_emails: set[str],
+    seen_usernames: set[str]
+) -> tuple[list[tuple[int, models.CreateUserRequest]], list[models.BulkUserResult]]:
+    """
+    Validate a chunk of parsed records
+
+    Args:
+        chunk: record numbers and records, None for unparsable lines
+        seen_emails: emails accepted from earlier rows of the import, updated in place
+        seen_usernames: usernames accepted from earlier rows of the import, updated in place
+
+    Returns:
+        tuple: accepted rows and failed row results
+    """
+    accepted, failed = [], []
+    for row, record in chunk:
+        if record is None:
+            failed.append(import_failure(row, "Malformed row"))
+            continue
+        try:
+            user_input = validate_import_row(record)
+        except ValidationError as e:
+            failed.append(import_failure(row, describe_validation_error(e), record.get("email")))
+            continue
+        except HTTPException as e:
+            failed.append(import_failure(row, e.detail, record.get("email")))
+            continue
+        if user_input.email in seen_emails or user_input.username in seen_usernames:
+            failed.append(import_failure(row, "Duplicate email or username in import", user_input.email))
+            continue
+        seen_emails.add(user_input.email)
+        seen_usernames.add(user_input.username)
+        accepted.append((row, user_input))
+    return accepted, failed
+
+def reject_taken(
+    accepted: list[tuple[int, models.CreateUserRequest]],
+    taken_emails: set[str],
+    taken_usernames: set[str]
+) -> tuple[list[tuple[int, models.CreateUserRequest]], list[models.BulkUserResult]]:
+    """Split accepted rows on whether their email or username is already in use"""
+    available, failed = [], []
+    for row, user_input in accepted:
+        if user_input.email in taken_emails or user_input.username in taken_usernames:
+            failed.append(import_failure(row, "User already exists", user_input.email))
+        else:
+            available.append((row, user_input))
+    return available, failed
+
+def build_import_results(
+    accepted: list[tuple[int, models.CreateUserRequest]],
+    new_users: list[User],
+    inserted: set[UUID]
+) -> list[models.BulkUserResult]:
+    """Report rows as created, or failed when the insert skipped them on a conflict"""
+    results = []
+    for (row, _), user in zip(accepted, new_users):
+        if user.id in inserted:
+            results.append(models.BulkUserResult(row=row, status="created", id=user.id, email=user.email))
+        else:
+            results.append(import_failure(row, "User already exists", user.email))
+    return results
+
+def build_import_response(results: list[models.BulkUserResult]) -> models.BulkImportResponse:
+    results.sort(key=lambda result: result.row)
+    created = sum(1 for result in results if result.status == "created")
+    logging.info(f"Bulk import created {created} of {len(results)} users")
+    return models.BulkImportResponse(
+        created=created,
+        failed=len(results) - created,
+        results=results,
+        message="Bulk import completed"
+    )
+
+async def import_users(chunks: AsyncIterable[bytes], content_type: str | None, db: SessionDep) -> models.BulkImportResponse:
+    """
+    Create users from a streamed NDJSON or CSV body
+
+    The body is processed in chunks: each chunk is validated, checked for
+    taken emails and usernames with one query, hashed in parallel and
+    inserted with one multi-row INSERT. Database calls run in the threadpool.
+    """
+    format = import_format(content_type)
+    results: list[models.BulkUserResult] = []
+    seen_emails: set[str] = set()
+    seen_usernames: set[str] = set()
+    
+    async for chunk in achunked(aiter_records(aiter_lines(chunks), format), USER_IMPORT_CHUNK_SIZE):
+        accepted, failed = validate_import_chunk(chunk, seen_emails, seen_usernames)
+        results += failed
+        if not accepted:
+            continue
+        
+        taken = await run_in_threadpool(
+            repository.get_taken_identities,
+            [user_input.email for _, user_input in accepted],
+            [user_input.username for _, user_input in accepted],
+            db
+        )
+        accepted, failed = reject_taken(accepted, *taken)
+        results += failed
+        
+        password_hashes = await password_hasher.hash_many_async([user_input.password for _, user_input in accepted])
+        new_users = [build_new_user(user_input, password_hash) for (_, user_input), password_hash in zip(accepted, password_hashes)]
+        inserted = await run_in_threadpool(repository.insert_users, new_users, db)
+        results += build_import_results(accepted, new_users, inserted)
+    
+    return build_import_response(results)
+
+def format_export_header(format: str) -> str:
+    """First chunk of an export, the CSV header row"""
+    return format_csv([models.UserSummary.model_fields.keys()]) if format == "csv" else ""
+
+def format_export_rows(rows: list, format: str) -> str:
+    """Format a batch of user summary rows for an export"""
+    if format == "csv":
+        return format_csv(rows)
+    return format_ndjson(row._mapping for row in rows)
+
+def export_users(format: str, session_factory: Callable[[], Session]) -> Iterator[str]:
+    """
+    Stream every user as CSV or NDJSON
+
+    Rows come from a server-side cursor in batches of USER_EXPORT_BATCH_SIZE,
+    each batch is sent as soon as it is read, so memory stays flat.
+    
+    Args:
+        format: "csv" or "ndjson"
+        session_factory: opens the session used for the whole stream
+    """
+    yield format_export_header(format)
+    with session_factory() as db:
+        for rows in repository.stream_users(USER_EXPORT_BATCH_SIZE, db):
+            yield format_export_rows(rows, format)
+
+def build_users_page(rows: list[models.UserSummary], limit: int, sort: str = "created_at") -> tuple[list[models.UserSummary], str | None]:
+    """Trim the extra keyset row and turn it into the next page cursor"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(getattr(rows[-1], sort.lstrip("-")), rows[-1].id, sort)
+
+def get_users(
+    db: SessionDep,
+    limit: int = USERS_PAGE_DEFAULT_LIMIT,
+    cursor: str | None = None,
+    filters: models.UserFilters | None = None,
+    sort: models.UserSort = "created_at"
+) -> tuple[list[models.UserSummary], str | None]:
+    """Get a page of filtered users and the cursor of the next page, if any"""
+    after = decode_cursor(cursor, sort) if cursor else None
+    return build_users_page(repository.get_users_page(limit, after, filters, sort, db), limit, sort)
+
+def search_users(q: str, db: SessionDep, limit: int = USER_SEARCH_DEFAULT_LIMIT) -> list[models.UserSummary]:
+    """Search users by partial username or email"""
+    return repository.search_users(q, limit, db)
+
+def build_lookup_response(lookup: models.UserLookupRequest, users: list[models.UserSummary]) -> models.UserLookupResponse:
+    """Key the found users by the requested ids and emails, with None for the missing ones"""
+    by_id = {user.id: user for user in users}
+    by_email = {user.email: user for user in users}
+    results = {str(id): by_id.get(id) for id in lookup.ids}
+    results.update((email, by_email.get(email)) for email in lookup.emails)
+    return models.UserLookupResponse(users=results, not_found=[key for key, user in results.items() if user is None])
+
+def lookup_users(lookup: models.UserLookupRequest, db: SessionDep) -> models.UserLookupResponse:
+    """Get the users with the requested ids and emails"""
+    users = repository.lookup_users(list(set(lookup.ids)), list(set(lookup.emails)), db)
+    return build_lookup_response(lookup, users)
+
+def get_user_by_id(id: UUID, db: SessionDep, if_none_match: str | None = None) -> tuple[models.GetUserResponse, dict[str, str]]:
+    """Get a user by ID and its version headers
+    
+    Raises NotModifiedError before building the response when if_none_match
+    names the current version.
+    """
+    from src.exceptions import UserNotFoundError
+    
+    user = repository.get_user_by_id(id, db)
+    if not user:
+        raise UserNotFoundError(user_id=id)
+    
+    headers = user_version_headers(user)
+    ensure_modified(headers, if_none_match)
+    return build_get_response(user), headers
+
 def get_user_by_email(email: str, db: SessionDep):
     """Get a user by email"""
     from src.exceptions import UserNotFoundError
@@ -81,53 +372,103 @@ def get_user_by_email(email: str, db: SessionDep):
         raise UserNotFoundError(user_id=email)
     return user
 
-def update_user_by_id(id: UUID, user_input: models.UpdateUserRequest, db: SessionDep) -> models.UpdateUserResponse:
-    """Update a user by ID"""
-    from src.exceptions import UserNotFoundError, InvalidEmailError, InvalidRoleError
+def update_user_by_id(
+    id: UUID, user_input: models.UpdateUserRequest, current_user: CurrentUser, db: SessionDep, users: UserLoader | None = None
+) -> models.UpdateUserResponse:
+    """Update a user by ID
+    
+    users is the loader of the request, which already holds the target
+    user when the permission check read it. The UPDATE itself only writes
+    targets current_user may update, in case the role changed since.
+    """
+    from src.exceptions import UserNotFoundError, ForbiddenError
     
     # Get the existing user
-    user = repository.get_user_by_id(id, db)
+    user = (users or UserLoader(db)).get(id)
     if not user:
         raise UserNotFoundError(user_id=id)
     
-    # Validate email if provided
-    if user_input.email is not None:
-        if not validate_email(user_input.email):
-            raise InvalidEmailError()
-        # Check if email already exists for another user
+    validate_user_update(user_input)
+    
+    # Check if email already exists for another user
+    if user_input.email is not None and user_input.email != user.email:
         existing_user = repository.get_user_by_email(user_input.email, db)
         if existing_user and existing_user.id != id:
             raise UserAlreadyExistsError(user_id=existing_user.id)
     
-    # Validate role if provided
-    if user_input.role is not None:
-        if not validate_role(user_input.role):
-            raise InvalidRoleError()
+    # Nothing to write
+    if not user_input.model_dump(exclude_none=True):
+        return build_update_response(user)
     
-    # Update the user
-    updated_user = repository.update_user(id, user_input, db)
+    # Update the user, it may have been deleted or had its role changed since it was read
+    updated_user = repository.update_user(id, user_input, current_user.id, updatable_roles(current_user), db)
+    if updated_user is None:
+        if repository.load_user_by_id(id, db) is not None:
+            raise ForbiddenError()
+        raise UserNotFoundError(user_id=id)
+    revoke_cached_tokens(id, updated_user.token_version)
     
-    return models.UpdateUserResponse(
-        id=updated_user.id,
-        username=updated_user.username,
-        email=updated_user.email,
-        role=updated_user.role,
-        is_active=updated_user.is_active,
-        message="User updated successfully"
+    return build_update_response(updated_user)
+
+def build_bulk_update_response(ids: list[UUID], refused: dict[UUID, str], rows: list) -> models.BulkUpdateUserResponse:
+    """Report the outcome for every requested id, in request order"""
+    updated = {row.id: row for row in rows}
+    results = [
+        models.BulkUpdateUserResult(id=id, status="updated", user=models.UserSummary(**updated[id]._mapping))
+        if id in updated else
+        models.BulkUpdateUserResult(id=id, status="failed", error=refused.get(id, "User not found"))
+        for id in ids
+    ]
+    logging.info(f"Bulk update changed {len(updated)} of {len(ids)} users")
+    return models.BulkUpdateUserResponse(
+        updated=len(updated),
+        failed=len(ids) - len(updated),
+        results=results,
+        message="Bulk update completed"
     )
 
-def update_password_by_id(id: UUID, password_input: models.UpdatePasswordRequest, db: SessionDep):
+def bulk_targets(ids: list[UUID], current_user: CurrentUser, target_roles: dict[UUID, UserRole] | None) -> tuple[list[UUID], dict[UUID, str]]:
+    """Split the requested ids into the ones to update and the refused ones, with the reason"""
+    if target_roles is None:
+        return ids, {}
+    refused = authorize_updates(current_user, target_roles)
+    return [id for id in ids if id in target_roles and id not in refused], refused
+
+def bulk_update_users(user_input: models.BulkUpdateUserRequest, current_user: CurrentUser, db: SessionDep) -> models.BulkUpdateUserResponse:
+    """Apply a role and / or active state change to many users
+    
+    Permissions follow the single user update. They are checked for every
+    target from one query of their roles, skipped when the current user may
+    update any role, and the allowed targets are written with one UPDATE.
+    """
+    ids = list(dict.fromkeys(user_input.ids))
+    roles = updatable_roles(current_user)
+    target_roles = repository.get_user_roles(ids, db) if roles != set(UserRole) else None
+    allowed, refused = bulk_targets(ids, current_user, target_roles)
+    
+    rows = repository.bulk_update_users(allowed, user_input.role, user_input.is_active, current_user.id, roles, db) if allowed else []
+    for row in rows:
+        revoke_cached_tokens(row.id, row.token_version)
+    
+    return build_bulk_update_response(ids, refused, rows)
+
+async def update_password_by_id(id: UUID, password_input: models.UpdatePasswordRequest, db: SessionDep, users: UserLoader | None = None):
     """Update a user's password"""
     from src.exceptions import UserNotFoundError, InvalidPasswordError
     
-    user = repository.get_user_by_id(id, db)
+    # The old password is checked against the database, never a cached copy
+    user = await run_in_threadpool((users or UserLoader(db)).load, id)
     if not user:
         raise UserNotFoundError(user_id=id)
     
-    if not verify_password(password_input.old_password, user.password_hash):
+    if not await password_hasher.verify_async(password_input.old_password, user.password_hash):
         raise InvalidPasswordError()
     
-    repository.update_password(id, password_input, db)
+    password_hash = await password_hasher.hash_async(password_input.new_password)
+    updated_user = await run_in_threadpool(repository.update_password, id, password_hash, db)
+    if updated_user is None:
+        raise UserNotFoundError(user_id=id)
+    revoke_cached_tokens(id, updated_user.token_version)
     
     return {"message": "Password updated successfully"}
 
@@ -140,6 +481,7 @@ def delete_user_by_id(id: UUID, db: SessionDep):
         raise UserNotFoundError(user_id=id)
     
     repository.delete_user(id, db)
+    revoke_cached_tokens(id, DELETED_USER_VERSION)
     
     return {"message": f"User with id {id} deleted successfully"}
     
\ No newline at end of file
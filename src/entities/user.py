@@ -2,7 +2,8 @@ from uuid import UUID, uuid4
 from datetime import datetime
 from typing import Optional, Dict, Any, Annotated
 from sqlmodel import SQLModel, Field, Relationship
-from pydantic import EmailStr, ConfigDict, field_serializer
+from sqlalchemy import Index, text
+from pydantic import EmailStr, ConfigDict
 from enum import Enum
 
 class UserRole(str, Enum):
@@ -13,6 +14,16 @@ class UserRole(str, Enum):
 
 class User(SQLModel, table=True):
     __tablename__ = "user"
+    __table_args__ = (
+        # Keyset pagination of the user listing, by each sort column and by role
+        Index("ix_user_created_at_id", "created_at", "id"),
+        Index("ix_user_updated_at_id", "updated_at", "id"),
+        Index("ix_user_role_created_at_id", "role", "created_at", "id"),
+        Index("ix_user_role_updated_at_id", "role", "updated_at", "id"),
+        # Listings of active users only, the common filter
+        Index("ix_user_active_created_at_id", "created_at", "id", postgresql_where=text("is_active")),
+        Index("ix_user_active_role_created_at_id", "role", "created_at", "id", postgresql_where=text("is_active")),
+    )
     
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     username: str = Field(unique=True, min_length=3, max_length=50)
@@ -20,8 +31,11 @@ class User(SQLModel, table=True):
     password_hash: str = Field(nullable=False)
     role: UserRole = Field(default=UserRole.CLIENT)
     is_active: bool = Field(default=True)
+    # Bumped to revoke every token issued before (stateless authorization mode)
+    token_version: int = Field(default=0, nullable=False)
     created_at: datetime = Field(default_factory=datetime.now)
-    updated_at: datetime = Field(default_factory=datetime.now)
+    # Set on every UPDATE, ORM flushes and Core statements alike
+    updated_at: datetime = Field(default_factory=datetime.now, sa_column_kwargs={"onupdate": datetime.now})
 
     # One-to-one relationship with Token
     token: Optional["Token"] = Relationship(back_populates="user", sa_relationship_kwargs={"uselist": False})
@@ -29,19 +43,19 @@ class User(SQLModel, table=True):
     model_config = ConfigDict(
         arbitrary_types_allowed=True,
     )
-    
-    @field_serializer('created_at', 'updated_at')
-    def serialize_datetime(self, dt: datetime) -> str:
-        return dt.isoformat()
 
 class Token(SQLModel, table=True):
     __tablename__ = "token"
     
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    access_token: str
-    refresh_token: str
+    # SHA-256 of the current refresh token, the tokens themselves are never stored
+    refresh_token_hash: str = Field(unique=True, min_length=64, max_length=64)
+    # jti of the access token issued with it, revoked if the refresh token is reused
+    access_token_jti: str = Field(max_length=64)
     token_type: str = "Bearer"
+    # Access token expiry
     expires_at: datetime
+    refresh_expires_at: datetime
     created_at: datetime = Field(default_factory=datetime.now)
     
     # One-to-one relationship with User
@@ -51,10 +65,24 @@ class Token(SQLModel, table=True):
     model_config = ConfigDict(
         arbitrary_types_allowed=True,
     )
+
+class RevokedToken(SQLModel, table=True):
+    __tablename__ = "revoked_token"
     
-    @field_serializer('expires_at', 'created_at')
-    def serialize_datetime(self, dt: datetime) -> str:
-        return dt.isoformat()
+    # JWT id of the revoked token
+    jti: str = Field(primary_key=True, max_length=64)
+    user_id: UUID = Field(index=True)
+    # Token exp claim (epoch seconds), the row is useless after it
+    exp: int = Field(index=True)
+    created_at: datetime = Field(default_factory=datetime.now)
+
+class DeletedUser(SQLModel, table=True):
+    __tablename__ = "deleted_user"
+    
+    # Read by every worker to revoke the deleted user's stateless tokens,
+    # purged once those tokens expired
+    user_id: UUID = Field(primary_key=True)
+    deleted_at: datetime = Field(default_factory=datetime.now, index=True)
 
 # Simple DTO for token responses
 class TokenResponse(SQLModel):
@@ -63,8 +91,4 @@ class TokenResponse(SQLModel):
     token_type: str = "Bearer"
     expires_at: datetime
     
-    model_config = ConfigDict()
-    
-    @field_serializer('expires_at')
-    def serialize_datetime(self, dt: datetime) -> str:
-        return dt.isoformat()
\ No newline at end of file
+    model_config = ConfigDict()
\ No newline at end of file
@@ -34,11 +34,31 @@ class UserCreationError(UserError):
     def __init__(self):
         super().__init__(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="User creation failed")
 
-class CredentialsError(AuthError):
+class InvalidCursorError(HTTPException):
     def __init__(self):
-        super().__init__(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials", headers={"WWW-Authenticate": "Bearer"})
+        super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+
+class NotModifiedError(HTTPException):
+    """Conditional request for a version the client already has, sent without a body"""
+    def __init__(self, headers: dict[str, str]):
+        super().__init__(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+class UnsupportedMediaTypeError(HTTPException):
+    def __init__(self, supported: str):
+        super().__init__(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=f"Unsupported media type, expected {supported}")
+
+class CredentialsError(AuthError):
+    def __init__(self, message: str="Invalid credentials"):
+        super().__init__(status_code=status.HTTP_401_UNAUTHORIZED, detail=message, headers={"WWW-Authenticate": "Bearer"})
     
 class ForbiddenError(AuthError):
     def __init__(self, message: str="Not enough permissions"):
         super().__init__(status_code=status.HTTP_403_FORBIDDEN, detail=message)
-    
\ No newline at end of file
+    
+class TooManyRequestsError(AuthError):
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed attempts, try again later",
+            headers={"Retry-After": str(retry_after)}
+        )
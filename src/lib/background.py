@@ -0,0 +1,54 @@
+import logging
+import threading
+from typing import Callable, Iterable
+
+class PeriodicTask:
+    """
+    Calls function every interval seconds on a daemon thread
+
+    Keeps database work such as cache reloads off the request path.
+    Failures are logged and the call is retried at the next interval.
+    """
+    def __init__(self, name: str, interval: float, function: Callable[[], None]):
+        self.name = name
+        self.interval = interval
+        self.function = function
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def run_once(self):
+        try:
+            self.function()
+        except Exception:
+            logging.exception(f"{self.name} failed")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def start(self):
+        """Start calling function, a no-op when already started"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout=5)
+
+def start_tasks(tasks: Iterable[PeriodicTask]):
+    """Run every task once, in order, then keep running them in the background"""
+    for task in tasks:
+        task.run_once()
+        task.start()
+
+def stop_tasks(tasks: Iterable[PeriodicTask]):
+    for task in tasks:
+        task.stop()
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Protocol
+from urllib.parse import urlparse
+
+class CacheBackend(Protocol):
+    """Key-value store with per key expiry, holding serialized values"""
+    def get(self, key: str) -> bytes | None: ...
+    def set(self, key: str, value: bytes, ttl_seconds: float) -> None: ...
+    def delete(self, *keys: str) -> None: ...
+    def clear(self) -> None: ...
+
+class MemoryCache:
+    """In-process LRU cache, entries expire after their TTL"""
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: bytes, ttl_seconds: float):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class KeyValueCache:
+    """
+    Cache in an external key-value store shared by every worker
+
+    client is anything with redis-py's get / set(px=) / delete, so a
+    local stand-in can replace the real store. Keys are namespaced with
+    prefix, and clear() only drops keys under it.
+    """
+    def __init__(self, client, prefix: str = "cache:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> bytes | None:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl_seconds: float):
+        self.client.set(self.prefix + key, value, px=max(int(ttl_seconds * 1000), 1))
+
+    def delete(self, *keys: str):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+def cache_from_url(url: str, max_size: int, prefix: str) -> CacheBackend:
+    """
+    Build a cache backend from a URL
+
+    memory:// is an in-process LRU of max_size entries. redis:// and
+    rediss:// use a shared Redis, which needs the redis package.
+    """
+    scheme = urlparse(url).scheme
+    if scheme == "memory":
+        return MemoryCache(max_size)
+    if scheme in ("redis", "rediss"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(f"The redis package is required for the {url} cache") from e
+        return KeyValueCache(redis.Redis.from_url(url), prefix)
+    raise ValueError(f"Unsupported cache URL {url!r}")
@@ -0,0 +1,164 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict
+from passlib.context import CryptContext
+from src.settings import get_settings
+
+# Number of worker processes used for bcrypt (0 hashes inline in the calling thread)
+PASSWORD_HASH_WORKERS: int = get_settings().password_hash_workers
+
+crypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Jobs executed inside the worker processes. They return the time the job
+# started so the parent can measure how long it waited in the pool queue.
+def _hash_job(plain_password: str) -> tuple[str, float]:
+    started_at = time.time()
+    return crypt_context.hash(plain_password), started_at
+
+def _verify_job(plain_password: str, hashed_password: str) -> tuple[bool, float]:
+    started_at = time.time()
+    return crypt_context.verify(plain_password, hashed_password), started_at
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification in a bounded process pool
+
+    Hashing is CPU bound, so running it in worker processes keeps it off the
+    GIL and out of Starlette's threadpool. Sync callers block on the result,
+    async callers await it without holding a thread.
+    """
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._wait_seconds_total = 0.0
+        self._wait_seconds_max = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _record(self, wait_seconds: float):
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+            self._wait_seconds_total += wait_seconds
+            self._wait_seconds_max = max(self._wait_seconds_max, wait_seconds)
+
+    def _submit(self, job: Callable[..., tuple[Any, float]], *args) -> Future:
+        """Submit a job and return a future resolving to the job result only"""
+        submitted_at = time.time()
+        result: Future = Future()
+        with self._lock:
+            self._in_flight += 1
+
+        if self.max_workers <= 0:
+            try:
+                value, _ = job(*args)
+                result.set_result(value)
+            except Exception as e:
+                result.set_exception(e)
+            finally:
+                self._record(0.0)
+            return result
+
+        def on_done(job_future: Future):
+            try:
+                value, started_at = job_future.result()
+            except Exception as e:
+                self._record(time.time() - submitted_at)
+                result.set_exception(e)
+                return
+            self._record(max(started_at - submitted_at, 0.0))
+            result.set_result(value)
+
+        try:
+            job_future = self._get_executor().submit(job, *args)
+        except BrokenProcessPool:
+            # A worker died, start over with a fresh pool
+            self.shutdown(wait=False)
+            try:
+                job_future = self._get_executor().submit(job, *args)
+            except Exception:
+                with self._lock:
+                    self._in_flight -= 1
+                raise
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+
+        job_future.add_done_callback(on_done)
+        return result
+
+    def hash(self, plain_password: str) -> str:
+        """Hash password, blocking the calling thread until done"""
+        return self._submit(_hash_job, plain_password).result()
+
+    def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify password, blocking the calling thread until done"""
+        return self._submit(_verify_job, plain_password, hashed_password).result()
+
+    async def hash_async(self, plain_password: str) -> str:
+        """Hash password without blocking the event loop"""
+        return await asyncio.wrap_future(self._submit(_hash_job, plain_password))
+
+    async def verify_async(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify password without blocking the event loop"""
+        return await asyncio.wrap_future(self._submit(_verify_job, plain_password, hashed_password))
+
+    async def hash_many_async(self, plain_passwords: list[str]) -> list[str]:
+        """
+        Hash several passwords in parallel across the workers, keeping their order
+
+        At most one job per worker is queued at a time, so a large batch doesn't
+        hold back the sign ins and single hashes sharing the pool.
+        """
+        slots = asyncio.Semaphore(max(self.max_workers, 1))
+
+        async def hash_one(password: str) -> str:
+            async with slots:
+                return await asyncio.wrap_future(self._submit(_hash_job, password))
+
+        return list(await asyncio.gather(*(hash_one(password) for password in plain_passwords)))
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Snapshot of the pool metrics
+
+        Returns:
+            Dict[str, float]: workers, in-flight jobs, queue depth (jobs waiting
+            for a free worker), completed jobs and queue wait times in seconds
+        """
+        with self._lock:
+            workers = max(self.max_workers, 0)
+            return {
+                "workers": workers,
+                "in_flight": self._in_flight,
+                "queue_depth": max(self._in_flight - workers, 0) if workers else 0,
+                "completed": self._completed,
+                "wait_seconds_total": self._wait_seconds_total,
+                "wait_seconds_max": self._wait_seconds_max,
+                "wait_seconds_avg": self._wait_seconds_total / self._completed if self._completed else 0.0,
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker processes, they are started again on next use"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+# Shared hasher used by the services
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS)
@@ -0,0 +1,24 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any
+from uuid import UUID
+from src.exceptions import InvalidCursorError
+
+def encode_cursor(sort_value: datetime, id: UUID, sort: str = "created_at") -> str:
+    """Encode the keyset position after the last returned row as an opaque token"""
+    payload = json.dumps({"v": sort_value.isoformat(), "i": str(id), "s": sort}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str = "created_at") -> tuple[datetime, UUID]:
+    """Decode a cursor created by encode_cursor for the same sort, raising InvalidCursorError otherwise"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload: dict[str, Any] = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        position = datetime.fromisoformat(payload["v"]), UUID(payload["i"])
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursorError()
+    # A cursor only marks a position in the order it was created for
+    if payload.get("s", "created_at") != sort:
+        raise InvalidCursorError()
+    return position
@@ -0,0 +1,54 @@
+import hashlib
+from functools import lru_cache
+from typing import Any, Mapping
+from fastapi import Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+from src.settings import get_settings
+
+# Serialize responses with orjson and the compiled serializers of the response models
+FAST_JSON_RESPONSES: bool = get_settings().fast_json_responses
+
+def default_response_class() -> type[JSONResponse]:
+    """Response class for content the endpoints leave to FastAPI, e.g. plain dicts"""
+    return ORJSONResponse if FAST_JSON_RESPONSES else JSONResponse
+
+@lru_cache(maxsize=None)
+def json_serializer(response_type: Any) -> TypeAdapter:
+    """TypeAdapter of a response type, built once per type"""
+    return TypeAdapter(response_type)
+
+def json_response(
+    content: Any, response_type: Any = None, status_code: int = 200, headers: Mapping[str, str] | None = None
+) -> Any:
+    """
+    Serialize content the service already built straight to a JSON response
+
+    FastAPI validates returned models against the response_model and runs
+    them through jsonable_encoder before encoding. A returned Response
+    skips both, the model is dumped to JSON bytes in one call instead.
+    When FAST_JSON_RESPONSES is off content is returned as is.
+
+    Args:
+        content: Model, or list of models, to send
+        response_type: Type to serialize content as, type(content) by default
+        status_code: Status of the response
+        headers: Extra response headers
+    """
+    if not FAST_JSON_RESPONSES:
+        return content
+    body = json_serializer(response_type or type(content)).dump_json(content)
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
+
+def entity_tag(*parts: Any) -> str:
+    """Strong ETag derived from the values that identify a version of a resource"""
+    digest = hashlib.blake2b(":".join(str(part) for part in parts).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an If-None-Match header matches etag, with the weak comparison it calls for"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
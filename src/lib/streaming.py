@@ -0,0 +1,141 @@
+import csv
+import io
+import json
+from datetime import date
+from enum import Enum
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Sequence, TypeVar
+
+T = TypeVar("T")
+
+NDJSON_MEDIA_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+CSV_MEDIA_TYPES = {"text/csv", "application/csv"}
+
+def record_format(content_type: str | None) -> str | None:
+    """Map a Content-Type header to "ndjson" or "csv", None if unsupported"""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in NDJSON_MEDIA_TYPES:
+        return "ndjson"
+    if media_type in CSV_MEDIA_TYPES:
+        return "csv"
+    return None
+
+def decode_line(line: bytes) -> str | None:
+    """Decode one line of UTF-8, None when it isn't valid UTF-8"""
+    try:
+        return line.rstrip(b"\r").decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return None
+
+async def aiter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str | None]:
+    """
+    Split a stream of byte chunks into decoded lines without buffering the whole body
+
+    Lines that aren't valid UTF-8 are yielded as None.
+    """
+    buffer = bytearray()
+    async for chunk in chunks:
+        # Only the new bytes can end the partial line carried over
+        start = len(buffer)
+        buffer += chunk
+        end = buffer.rfind(b"\n", start)
+        if end < 0:
+            continue
+        for line in bytes(buffer[:end]).split(b"\n"):
+            yield decode_line(line)
+        del buffer[:end + 1]
+    if buffer:
+        yield decode_line(bytes(buffer))
+
+async def aiter_records(lines: AsyncIterable[str | None], format: str) -> AsyncIterator[tuple[int, Dict[str, Any] | None]]:
+    """
+    Parse NDJSON or CSV lines into records
+
+    CSV input must start with a header row, quoted CSV fields may span
+    lines. Blank lines are skipped and empty CSV cells are left out of the
+    record.
+
+    Returns:
+        AsyncIterator[tuple[int, Dict[str, Any] | None]]: 1-based record
+        number and the parsed record, None when it can't be parsed
+    """
+    header: list[str] | None = None
+    number = 0
+    # Lines of a CSV record whose quoted field isn't closed yet
+    pending: list[str] = []
+    async for line in lines:
+        if line is None:
+            pending = []
+            number += 1
+            yield number, None
+            continue
+        if not pending and not line.strip():
+            continue
+        if format == "csv":
+            pending.append(line)
+            # Quotes are escaped by doubling, an odd count means a field is still open
+            if sum(part.count('"') for part in pending) % 2:
+                continue
+            values = next(csv.reader(part + "\n" for part in pending))
+            pending = []
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            number += 1
+            if len(values) != len(header):
+                yield number, None
+                continue
+            yield number, {name: value for name, value in zip(header, values) if value != ""}
+        else:
+            number += 1
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield number, record if isinstance(record, dict) else None
+    if pending:
+        yield number + 1, None
+
+async def achunked(items: AsyncIterable[T], size: int) -> AsyncIterator[list[T]]:
+    """Group an async iterable into lists of at most size items"""
+    chunk: list[T] = []
+    async for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def export_value(value: Any) -> Any:
+    """Convert a column value to something csv and json can write as is"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, date):
+        return value.isoformat()
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+# Leading characters that make spreadsheets read a cell as a formula
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+def csv_value(value: Any) -> Any:
+    """export_value, with text that would be read as a formula prefixed by a quote"""
+    value = export_value(value)
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def format_csv(rows: Iterable[Sequence[Any]]) -> str:
+    """Format rows as CSV lines, safe to open in a spreadsheet"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows([csv_value(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+def format_ndjson(records: Iterable[Dict[str, Any]]) -> str:
+    """Format records as NDJSON lines"""
+    return "".join(
+        json.dumps({key: export_value(value) for key, value in record.items()}) + "\n"
+        for record in records
+    )
@@ -1,20 +1,19 @@
 import re
-from uuid import UUID
+import hashlib
+from uuid import UUID, uuid4
 import jwt
-from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 from typing import Dict, Any
 from src.entities.user import UserRole
-import os
-from dotenv import load_dotenv
+from src.lib.hashing import crypt_context
+from src.database.tenants import current_tenant
+from src.settings import get_settings
 
-load_dotenv()
-
-SECRET_KEY: str = os.getenv("JWT_SECRET_KEY", "secret")
-ALGORITHM: str = os.getenv("JWT_ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
-
-crypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+SECRET_KEY: str = get_settings().jwt_secret_key
+ALGORITHM: str = get_settings().jwt_algorithm
+ACCESS_TOKEN_EXPIRE_MINUTES: int = get_settings().access_token_expire_minutes
+# Embed role/is_active/token_version in access tokens and authorize from the claims alone
+AUTH_STATELESS: bool = get_settings().auth_stateless
 
 def hash_password(plain_password: str):
     """Hash password"""
@@ -65,7 +64,12 @@ def validate_role(role: str) -> bool:
         return False
     return True
 
-def generate_auth_token(user_id: UUID, token_type: str, expires_delta: timedelta | None = None) -> str:
+def generate_auth_token(
+    user_id: UUID,
+    token_type: str,
+    expires_delta: timedelta | None = None,
+    claims: Dict[str, Any] | None = None
+) -> str:
     """
     Create JWT token
 
@@ -73,6 +77,7 @@ def generate_auth_token(user_id: UUID, token_type: str, expires_delta: timedelta
         user_id (UUID): User ID
         token_type (str): Token type
         expires_delta (timedelta | None, optional): Expiration time delta. Defaults to None.
+        claims (Dict[str, Any] | None, optional): Extra claims to embed. Defaults to None.
     Returns:
         str: JWT token
     """
@@ -85,11 +90,23 @@ def generate_auth_token(user_id: UUID, token_type: str, expires_delta: timedelta
     to_encode = {
         "sub": str(user_id),     # Using sub claim as per JWT standards
         "exp": int(expire.timestamp()),
-        "type": token_type
+        "type": token_type,
+        "jti": uuid4().hex       # Unique token id, used to revoke this token alone
     }
+    # Tokens only authenticate against the tenant they were issued for
+    tenant = current_tenant()
+    if tenant is not None:
+        to_encode["tenant"] = tenant
+    if claims:
+        to_encode.update(claims)
     return jwt.encode(to_encode, SECRET_KEY, ALGORITHM)
 
 
+def token_fingerprint(token: str) -> str:
+    """Fixed size SHA-256 fingerprint of a token, stored instead of the token"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
 def verify_auth_token(token: str) -> Dict[str, Any]:
     """
     Verify and decode JWT token
@@ -109,3 +126,13 @@ def verify_auth_token(token: str) -> Dict[str, Any]:
     except jwt.PyJWTError:
         # Let the caller handle the exception
         raise
+
+def build_token_claims(role: UserRole, is_active: bool, token_version: int) -> Dict[str, Any] | None:
+    """Claims embedded in access tokens when stateless authorization is enabled"""
+    if not AUTH_STATELESS:
+        return None
+    return {
+        "role": UserRole(role).value,
+        "is_active": is_active,
+        "token_version": token_version
+    }
@@ -2,26 +2,51 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
-from src.database.core import init_db
+from src.database.core import init_db, dispose_async_engine
+from src.lib.hashing import password_hasher
+from src.lib.background import start_tasks, stop_tasks
+from src.auth.token_versions import token_version_refresh, deleted_user_purge
+from src.auth.revocation import revocation_refresh, revoked_token_purge
 from .api import register_routes
 from src.logging import configure_logging, LogLevels
+from src.metrics import MetricsMiddleware, METRICS_ENABLED
+from src.database.tenants import TenantMiddleware, tenant_registry_refresh
+from src.database.replicas import ReplicaRoutingMiddleware
+from src.lib.responses import default_response_class
 
 # Configure logging
 configure_logging(LogLevels.info)
 
+# Reloads of the state shared between workers, kept off the request path.
+# The tenant list comes first, the other tasks run for every tenant.
+BACKGROUND_TASKS = [
+    tenant_registry_refresh, token_version_refresh, deleted_user_purge, revocation_refresh, revoked_token_purge
+]
+
 # Initialize database on startup
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
+    start_tasks(BACKGROUND_TASKS)
     yield
+    stop_tasks(BACKGROUND_TASKS)
+    password_hasher.shutdown()
+    await dispose_async_engine()
 
 app = FastAPI(
     title="Real Estate API",
     description="Multitenant Real Estate Application API",
     version="0.1.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=default_response_class()
 )
 
+# Pin clients that just wrote to the primary while replicas catch up
+app.add_middleware(ReplicaRoutingMiddleware)
+
+# Route each request to its tenant's schema
+app.add_middleware(TenantMiddleware)
+
 # CORS configuration
 origins = [
     "http://localhost:3000",
@@ -35,4 +60,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency and database work, served from /metrics
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 register_routes(app)
\ No newline at end of file
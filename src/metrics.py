@@ -0,0 +1,178 @@
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Iterable
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from src.exceptions import CredentialsError
+from src.settings import get_settings
+
+# Serve /metrics and time every request
+METRICS_ENABLED: bool = get_settings().metrics_enabled
+# Bearer token scrapes of /metrics must send, /metrics is not served without one
+METRICS_TOKEN: str = get_settings().metrics_token
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+def escape_label(value: str) -> str:
+    """Escape a label value for the Prometheus text format"""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class Histogram:
+    """Prometheus style histogram with one series per label set"""
+    def __init__(self, name: str, help: str, label_names: tuple[str, ...], buckets: Iterable[float]):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels -> [per bucket counts..., +Inf count, sum]
+        self._series: Dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            label_text = ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f'{self.name}_bucket{{{label_text},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {values[-1]}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Request latency by route", ("method", "route", "status"), LATENCY_BUCKETS
+)
+request_queries = Histogram(
+    "http_request_db_queries", "Database queries executed per request", ("method", "route"), QUERY_COUNT_BUCKETS
+)
+request_db_time = Histogram(
+    "http_request_db_seconds", "Time spent in database queries per request", ("method", "route"), LATENCY_BUCKETS
+)
+
+class RequestStats:
+    """Database work done while serving the current request"""
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+# Set by the middleware, shared with the threadpool and the async driver greenlets
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+def current_request_stats() -> RequestStats | None:
+    return _request_stats.get()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started_at = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_stats.get()
+    started_at = getattr(context, "_metrics_started_at", None)
+    if stats is not None and started_at is not None:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started_at
+
+def track_queries(engine: Engine):
+    """Count queries and their time against the request being served"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency and database work per route
+
+    Routes are labelled with their path template so ids don't create new
+    series. Streamed responses are timed until their last chunk is sent.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+        started_at = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            _request_stats.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            request_duration.observe(elapsed, method, route_path, str(status_code))
+            request_queries.observe(stats.queries, method, route_path)
+            request_db_time.observe(stats.db_seconds, method, route_path)
+
+def render_gauges(prefix: str, values: Dict[str, float], labels: str = "") -> list[str]:
+    """Render a stats snapshot as gauges named <prefix>_<key>"""
+    return [f"{prefix}_{key}{{{labels}}} {value}" if labels else f"{prefix}_{key} {value}" for key, value in values.items()]
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text format"""
+    from src.database import core
+    from src.database.pool import get_pool_stats
+    from src.lib.hashing import password_hasher
+
+    lines: list[str] = []
+    for histogram in (request_duration, request_queries, request_db_time):
+        lines += histogram.render()
+    lines += render_gauges("password_hasher", password_hasher.stats())
+    if core._engine is not None:
+        lines += render_gauges("db_pool", get_pool_stats(core._engine), 'engine="sync"')
+    if core._async_engine is not None:
+        lines += render_gauges("db_pool", get_pool_stats(core._async_engine), 'engine="async"')
+    if core._replica_engine is not None:
+        lines += render_gauges("db_pool", get_pool_stats(core._replica_engine), 'engine="replica"')
+    if core._async_replica_engine is not None:
+        lines += render_gauges("db_pool", get_pool_stats(core._async_replica_engine), 'engine="async_replica"')
+    return "\n".join(lines) + "\n"
+
+def require_metrics_token(authorization: str | None = Header(None)):
+    """Allow scrapes bearing METRICS_TOKEN, /metrics is hidden while it is unset"""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404)
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), METRICS_TOKEN.encode()):
+        raise CredentialsError()
+
+router = APIRouter(tags=["Metrics"])
+
+@router.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_token)])
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,101 @@
+import os
+import logging
+from functools import lru_cache
+from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field
+from dotenv import load_dotenv
+
+class Settings(BaseModel):
+    """
+    Application settings, read from the environment
+
+    Every field is set by the upper case environment variable of the same
+    name, e.g. DB_POOL_SIZE for db_pool_size.
+    """
+    model_config = ConfigDict(frozen=True, alias_generator=str.upper, populate_by_name=True)
+
+    app_env: str = "dev"
+
+    # Database
+    database_url: Optional[str] = None
+    # Defaults to DATABASE_URL with the psycopg (v3) async driver
+    async_database_url: Optional[str] = None
+    # Read replica, reads go to the primary when unset
+    database_replica_url: Optional[str] = None
+    # Defaults to DATABASE_REPLICA_URL with the psycopg (v3) async driver
+    async_database_replica_url: Optional[str] = None
+    # Seconds a client reads from the primary after writing
+    replica_sticky_seconds: float = 5
+    # Users pinned to the primary after writing, memory:// per worker, redis:// shared
+    replica_pin_cache_url: str = "memory://"
+    # Routers served by the async stack, comma separated
+    async_routers: str = ""
+
+    # Connection pool, shared by the sync and async engines
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_statement_timeout_ms: int = 0
+    db_application_name: str = "realstate-backend"
+
+    # Tokens
+    jwt_secret_key: str = "secret"
+    jwt_algorithm: str = "HS256"
+    access_token_expire_minutes: int = 15
+    refresh_token_expire_days: int = 7
+    # Embed role/is_active/token_version in access tokens and authorize from the claims alone
+    auth_stateless: bool = False
+    auth_cache_ttl_seconds: float = 30
+    auth_cache_max_size: int = 10000
+    token_version_refresh_seconds: float = 30
+    revocation_refresh_seconds: float = 30
+    # Revoked tokens and deletion records are deleted this often once the tokens they revoke expired
+    auth_purge_seconds: float = 600
+    revocation_filter_capacity: int = 100000
+    revocation_filter_error_rate: float = 0.001
+    # Signin attempts allowed per window and client IP / email, empty disables the limit.
+    # A successful signin clears the email's attempts, the IP's count until the window moves on.
+    signin_rate_limit_per_ip: str = "20/minute"
+    signin_rate_limit_per_email: str = "5/minute"
+    rate_limit_storage_uri: str = "memory://"
+
+    # Number of bcrypt worker processes, 0 hashes inline
+    password_hash_workers: int = Field(default_factory=lambda: os.cpu_count() or 1)
+
+    # Tenants
+    tenant_header: str = "X-Tenant-ID"
+    tenant_base_domain: str = ""
+    tenant_schema_prefix: str = "tenant_"
+    tenant_refresh_seconds: float = 60
+
+    metrics_enabled: bool = True
+    # Bearer token required to scrape /metrics, which is not served without one
+    metrics_token: str = ""
+    # Serialize responses with orjson and the compiled pydantic serializers
+    fast_json_responses: bool = False
+
+    # Users
+    # Capped by the users service to fit one multi-row INSERT
+    user_import_chunk_size: int = Field(default=1000, ge=1)
+    user_export_batch_size: int = 1000
+    # Read-through cache of user lookups, a TTL of 0 disables it
+    user_cache_url: str = "memory://"
+    user_cache_ttl_seconds: float = 30
+    user_cache_negative_ttl_seconds: float = 5
+    user_cache_max_size: int = 10000
+
+def load_env_file(app_env: str):
+    """Load env/.env.<APP_ENV>, then .env, without overriding the process environment"""
+    env_file = f"env/.env.{app_env}"
+    logging.getLogger(__name__).debug(f"Loading environment variables from {env_file}")
+    load_dotenv(env_file)
+    load_dotenv()
+
+@lru_cache
+def get_settings() -> Settings:
+    """Get the settings, the env files are read once on first use"""
+    load_env_file(os.getenv("APP_ENV", "dev"))
+    fields = {name.upper() for name in Settings.model_fields}
+    return Settings.model_validate({name: value for name, value in os.environ.items() if name in fields})
@@ -0,0 +1,66 @@
+"""
+Compare two benchmark result files
+
+    python -m tests.benchmarks.compare baseline.json candidate.json [--threshold 0.1]
+
+Exits with status 1 when a scenario run in both files regressed: req/s
+dropped or p95 latency grew by more than the threshold, or more queries
+were made per request.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict
+
+def load_results(path: str) -> Dict[tuple[str, int], Dict[str, Any]]:
+    with open(path) as file:
+        return {(result["name"], result["concurrency"]): result for result in json.load(file)["results"]}
+
+def change(before: float | None, after: float | None) -> float | None:
+    """Relative change from before to after, None when it can't be computed"""
+    if before is None or after is None or before == 0:
+        return None
+    return (after - before) / before
+
+def regressions(baseline: Dict[str, Any], candidate: Dict[str, Any], threshold: float) -> list[str]:
+    """What got worse between two results of the same scenario"""
+    found = []
+    throughput = change(baseline["req_per_s"], candidate["req_per_s"])
+    if throughput is not None and throughput < -threshold:
+        found.append(f"req/s {throughput:+.1%}")
+    latency = change(baseline["p95_ms"], candidate["p95_ms"])
+    if latency is not None and latency > threshold:
+        found.append(f"p95 {latency:+.1%}")
+    if (baseline["queries_per_request"] or 0) < (candidate["queries_per_request"] or 0):
+        found.append(f"queries/request {baseline['queries_per_request']} -> {candidate['queries_per_request']}")
+    return found
+
+def format_change(before: float | None, after: float | None) -> str:
+    relative = change(before, after)
+    return f"{before} -> {after}" + (f" ({relative:+.1%})" if relative is not None else "")
+
+def compare(baseline_path: str, candidate_path: str, threshold: float = 0.1) -> int:
+    """Print a comparison of two result files, returning the number of regressed scenarios"""
+    baseline, candidate = load_results(baseline_path), load_results(candidate_path)
+    regressed = 0
+    for key in sorted(baseline.keys() & candidate.keys()):
+        before, after = baseline[key], candidate[key]
+        found = regressions(before, after, threshold)
+        regressed += bool(found)
+        print(f"{key[0]} @ {key[1]}{'  REGRESSED: ' + ', '.join(found) if found else ''}")
+        for field in ("req_per_s", "p50_ms", "p95_ms", "p99_ms", "queries_per_request"):
+            print(f"    {field}: {format_change(before[field], after[field])}")
+    for key in sorted(baseline.keys() ^ candidate.keys()):
+        print(f"{key[0]} @ {key[1]}: only in {baseline_path if key in baseline else candidate_path}")
+    return regressed
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Tolerated relative change, 0.1 is 10%%")
+    args = parser.parse_args(argv)
+    return 1 if compare(args.baseline, args.candidate, args.threshold) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+import os
+import pytest
+from sqlmodel import Session, create_engine
+from src.main import app
+from src.database.core import get_session, engine_options
+from src.database.pool import InstrumentedQueuePool
+from src.domain.auth import repository as auth_repository
+from src.domain.auth.service import issue_tokens
+from src.domain.users import repository as users_repository
+from src.entities.user import User, UserRole
+from src.lib.hashing import crypt_context
+from src.metrics import track_queries
+from .harness import BENCHMARK_CONCURRENCY, BENCHMARK_OUTPUT, BENCHMARK_USERS, write_report
+
+BENCHMARK_PASSWORD = "Benchmark123!"
+
+@pytest.fixture(scope="session")
+def benchmark_report(pytestconfig, tmp_path_factory):
+    """Results of every benchmark in the session, written to BENCHMARK_OUTPUT at the end"""
+    results = []
+    yield results
+    if results:
+        # The pytest cache directory by default, the session's temporary one when the cache is disabled
+        cache = getattr(pytestconfig, "cache", None)
+        directory = cache.mkdir("benchmarks") if cache is not None else tmp_path_factory.mktemp("benchmarks")
+        write_report(results, BENCHMARK_OUTPUT or str(directory / "results.json"))
+
+@pytest.fixture
+def bench_app(db_session):
+    """The app with a pooled session per request, like in production"""
+    options = engine_options()
+    options["pool_size"] = max(options["pool_size"], *BENCHMARK_CONCURRENCY)
+    bench_engine = create_engine(os.getenv("DATABASE_URL"), poolclass=InstrumentedQueuePool, **options)
+    track_queries(bench_engine)
+
+    def get_bench_session():
+        with Session(bench_engine) as session:
+            yield session
+
+    app.dependency_overrides = {get_session: get_bench_session}
+    yield app
+    app.dependency_overrides = {}
+    bench_engine.dispose()
+
+@pytest.fixture
+def bench_users(db_session) -> list[User]:
+    """BENCHMARK_USERS clients sharing the password BENCHMARK_PASSWORD"""
+    password_hash = crypt_context.hash(BENCHMARK_PASSWORD)
+    users = [
+        User(username=f"bench_{number}", email=f"bench_{number}@example.com", password_hash=password_hash, role=UserRole.CLIENT)
+        for number in range(BENCHMARK_USERS)
+    ]
+    users_repository.insert_users(users, db_session)
+    return users
+
+@pytest.fixture
+def bench_refresh_tokens(db_session, bench_users) -> dict:
+    """Current refresh token of the first users, one per concurrent request"""
+    tokens = {}
+    for user in bench_users[:max(BENCHMARK_CONCURRENCY)]:
+        access_token, refresh_token, access_token_jti = issue_tokens(user.id)
+        auth_repository.create_tokens(user.id, access_token, refresh_token, access_token_jti, db_session)
+        tokens[user.id] = refresh_token
+    return tokens
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import math
+import os
+import platform
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Sequence
+import httpx
+from src.metrics import request_queries
+
+# Requests sent per scenario and concurrency level
+BENCHMARK_REQUESTS: int = int(os.getenv("BENCHMARK_REQUESTS", "200"))
+# Requests sent by the scenarios that verify a password, each costs a bcrypt round
+BENCHMARK_PASSWORD_REQUESTS: int = int(os.getenv("BENCHMARK_PASSWORD_REQUESTS", "20"))
+# Concurrency levels every HTTP scenario is run at, comma separated
+BENCHMARK_CONCURRENCY: list[int] = [int(level) for level in os.getenv("BENCHMARK_CONCURRENCY", "1,10").split(",")]
+# Users seeded before each scenario
+BENCHMARK_USERS: int = int(os.getenv("BENCHMARK_USERS", "1000"))
+# Results file written at the end of the session, in the pytest cache directory by default
+BENCHMARK_OUTPUT: str | None = os.getenv("BENCHMARK_OUTPUT")
+
+Send = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+def percentile(sorted_values: Sequence[float], percent: float) -> float:
+    """Nearest-rank percentile of already sorted values"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(percent / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+def summarize(
+    name: str, timings: Sequence[float], seconds: float, concurrency: int = 1,
+    errors: int = 0, queries_per_request: float | None = None
+) -> Dict[str, Any]:
+    """Result of one scenario, latencies in milliseconds"""
+    ordered = sorted(timings)
+    return {
+        "name": name,
+        "concurrency": concurrency,
+        "requests": len(ordered),
+        "errors": errors,
+        "seconds": round(seconds, 4),
+        "req_per_s": round(len(ordered) / seconds, 2) if seconds > 0 else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "queries_per_request": queries_per_request,
+    }
+
+def queries_per_request() -> float | None:
+    """Mean database queries per request recorded by the metrics middleware since the last clear"""
+    series = list(request_queries._series.values())
+    count = sum(sum(values[:-1]) for values in series)
+    return round(sum(values[-1] for values in series) / count, 3) if count else None
+
+async def drive(app, send: Send, requests: int, concurrency: int) -> tuple[list[float], float, int]:
+    """
+    Send requests through the ASGI app, at most concurrency at a time
+
+    Returns:
+        tuple[list[float], float, int]: Latency of every request in seconds,
+        wall time of the run and the number of non 2xx responses
+    """
+    timings: list[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+        async def one(number: int):
+            nonlocal errors
+            async with semaphore:
+                started_at = time.perf_counter()
+                response = await send(client, number)
+                timings.append(time.perf_counter() - started_at)
+                if not response.is_success:
+                    errors += 1
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(one(number) for number in range(requests)))
+        return timings, time.perf_counter() - started_at, errors
+
+def run_scenario(app, name: str, send: Send, concurrency: int, requests: int = BENCHMARK_REQUESTS) -> Dict[str, Any]:
+    """Run one HTTP scenario and summarize it"""
+    request_queries.clear()
+    timings, seconds, errors = asyncio.run(drive(app, send, requests, concurrency))
+    return summarize(name, timings, seconds, concurrency, errors, queries_per_request())
+
+def write_report(results: list[Dict[str, Any]], path: str):
+    """Write results with the settings they were produced with"""
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "settings": {
+            "requests": BENCHMARK_REQUESTS, "password_requests": BENCHMARK_PASSWORD_REQUESTS,
+            "concurrency": BENCHMARK_CONCURRENCY, "users": BENCHMARK_USERS
+        },
+        "results": results,
+    }
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
@@ -0,0 +1,35 @@
+import json
+from .harness import percentile, summarize
+from .compare import main, regressions
+
+"""
+Validate the benchmark reporting:
+    - Percentiles use the nearest rank
+    - Results are summarized in milliseconds
+    - Two runs are compared and regressions fail the comparison
+"""
+
+def test_summarize():
+    timings = [number / 1000 for number in range(1, 101)]
+    assert percentile(sorted(timings), 50) == 0.05
+    assert percentile(sorted(timings), 99) == 0.099
+    assert percentile([], 50) == 0.0
+
+    result = summarize("GET /user/", timings, seconds=2.0, concurrency=10, errors=1, queries_per_request=1.0)
+    assert result["requests"] == 100
+    assert result["req_per_s"] == 50.0
+    assert result["p95_ms"] == 95.0
+    assert result["errors"] == 1
+
+def test_compare_runs(tmp_path):
+    baseline = summarize("GET /user/", [0.01] * 10, seconds=0.1, queries_per_request=2.0)
+    slower = summarize("GET /user/", [0.02] * 10, seconds=0.2, queries_per_request=3.0)
+    assert regressions(baseline, baseline, 0.1) == []
+    assert len(regressions(baseline, slower, 0.1)) == 3
+
+    baseline_path, slower_path = tmp_path / "baseline.json", tmp_path / "slower.json"
+    baseline_path.write_text(json.dumps({"results": [baseline]}))
+    slower_path.write_text(json.dumps({"results": [slower]}))
+    assert main([str(baseline_path), str(baseline_path)]) == 0
+    assert main([str(baseline_path), str(slower_path)]) == 1
+    assert main([str(slower_path), str(baseline_path)]) == 0
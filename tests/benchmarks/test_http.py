@@ -0,0 +1,71 @@
+import asyncio
+import os
+import pytest
+from .conftest import BENCHMARK_PASSWORD
+from .harness import BENCHMARK_CONCURRENCY, BENCHMARK_PASSWORD_REQUESTS, run_scenario
+
+"""
+Benchmark the HTTP endpoints, run with RUN_BENCHMARKS=1:
+    - POST /auth/signin and /auth/token
+    - POST /auth/refresh
+    - GET /user/ and /user/{id}
+    - PUT /user/{id}
+Each one runs at every BENCHMARK_CONCURRENCY level, results go to BENCHMARK_OUTPUT
+(.pytest_cache/d/benchmarks/results.json by default).
+"""
+
+pytestmark = pytest.mark.skipif(not os.getenv("RUN_BENCHMARKS"), reason="Set RUN_BENCHMARKS=1 to run benchmarks")
+
+@pytest.mark.parametrize("concurrency", BENCHMARK_CONCURRENCY)
+def test_signin(bench_app, bench_users, benchmark_report, concurrency):
+    def send(client, number):
+        user = bench_users[number % len(bench_users)]
+        return client.post("/auth/signin", json={"email": user.email, "password": BENCHMARK_PASSWORD})
+
+    benchmark_report.append(run_scenario(bench_app, "POST /auth/signin", send, concurrency, BENCHMARK_PASSWORD_REQUESTS))
+
+@pytest.mark.parametrize("concurrency", BENCHMARK_CONCURRENCY)
+def test_token(bench_app, bench_users, benchmark_report, concurrency):
+    def send(client, number):
+        user = bench_users[number % len(bench_users)]
+        return client.post("/auth/token", data={"username": user.email, "password": BENCHMARK_PASSWORD})
+
+    benchmark_report.append(run_scenario(bench_app, "POST /auth/token", send, concurrency, BENCHMARK_PASSWORD_REQUESTS))
+
+@pytest.mark.parametrize("concurrency", BENCHMARK_CONCURRENCY)
+def test_refresh(bench_app, bench_refresh_tokens, benchmark_report, concurrency):
+    user_ids = list(bench_refresh_tokens)
+    locks = {}
+
+    async def send(client, number):
+        # Refresh tokens are single use, each user's refreshes are chained
+        user_id = user_ids[number % len(user_ids)]
+        async with locks.setdefault(user_id, asyncio.Lock()):
+            response = await client.post("/auth/refresh", json={"refresh_token": bench_refresh_tokens[user_id]})
+            if response.is_success:
+                bench_refresh_tokens[user_id] = response.json()["token"]["refresh_token"]
+            return response
+
+    benchmark_report.append(run_scenario(bench_app, "POST /auth/refresh", send, concurrency))
+
+@pytest.mark.parametrize("concurrency", BENCHMARK_CONCURRENCY)
+def test_get_users(bench_app, bench_users, auth_headers, benchmark_report, concurrency):
+    def send(client, number):
+        return client.get("/user/", params={"limit": 50}, headers=auth_headers)
+
+    benchmark_report.append(run_scenario(bench_app, "GET /user/", send, concurrency))
+
+@pytest.mark.parametrize("concurrency", BENCHMARK_CONCURRENCY)
+def test_get_user(bench_app, bench_users, auth_headers, benchmark_report, concurrency):
+    def send(client, number):
+        return client.get(f"/user/{bench_users[number % len(bench_users)].id}", headers=auth_headers)
+
+    benchmark_report.append(run_scenario(bench_app, "GET /user/{id}", send, concurrency))
+
+@pytest.mark.parametrize("concurrency", BENCHMARK_CONCURRENCY)
+def test_update_user(bench_app, bench_users, auth_headers, benchmark_report, concurrency):
+    def send(client, number):
+        user = bench_users[number % len(bench_users)]
+        return client.put(f"/user/{user.id}", json={"username": f"bench_{number}_updated"}, headers=auth_headers)
+
+    benchmark_report.append(run_scenario(bench_app, "PUT /user/{id}", send, concurrency))
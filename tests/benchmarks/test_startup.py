@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+import pytest
+from src.database import core
+from .harness import summarize
+
+"""
+Benchmark the startup path, run with RUN_BENCHMARKS=1:
+    - Time to import the app in a fresh interpreter
+    - Time for init_db against a current schema
+"""
+
+pytestmark = pytest.mark.skipif(not os.getenv("RUN_BENCHMARKS"), reason="Set RUN_BENCHMARKS=1 to run benchmarks")
+
+ROOT = Path(__file__).resolve().parents[2]
+RUNS = int(os.getenv("BENCHMARK_STARTUP_RUNS", "5"))
+
+IMPORT_SCRIPT = """
+import time
+started_at = time.perf_counter()
+import src.main
+print(time.perf_counter() - started_at)
+"""
+
+def test_import_time(benchmark_report):
+    timings = []
+    for _ in range(RUNS):
+        result = subprocess.run(
+            [sys.executable, "-c", IMPORT_SCRIPT], cwd=ROOT, capture_output=True, text=True, check=True, timeout=60
+        )
+        timings.append(float(result.stdout))
+    benchmark_report.append(summarize("import src.main", timings, sum(timings)))
+
+def test_init_db_time(benchmark_report):
+    core.init_db()
+    timings = []
+    for _ in range(RUNS):
+        started_at = time.perf_counter()
+        assert core.init_db() is False
+        timings.append(time.perf_counter() - started_at)
+    benchmark_report.append(summarize("init_db (current schema)", timings, sum(timings)))
@@ -1,6 +1,8 @@
 import os
 import uuid
 import pytest
+from contextlib import contextmanager
+from sqlalchemy import event
 from fastapi.testclient import TestClient
 from src.main import app
 from src.database.core import create_schema
@@ -19,6 +21,34 @@ TEST_SCHEMA = "test_schema"
 def _compile_drop_schema(element, compiler, **kw):
     return compiler.visit_drop_schema(element) + " CASCADE"
 
+@pytest.fixture(autouse=True)
+def reset_signin_throttle():
+    """Every test starts with no signin attempts counted"""
+    import asyncio
+    from src.auth.throttling import signin_throttle
+    asyncio.run(signin_throttle.reset())
+
+@pytest.fixture(params=[False, True], ids=["default_json", "fast_json"])
+def fast_json(request, monkeypatch):
+    """Run a test with the default and with the fast JSON responses"""
+    monkeypatch.setattr("src.lib.responses.FAST_JSON_RESPONSES", request.param)
+    return request.param
+
+@pytest.fixture
+def count_statements():
+    """Record the statements an engine runs inside a with block, as a list of SQL strings"""
+    @contextmanager
+    def count(engine):
+        statements = []
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+        event.listen(engine, "after_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "after_cursor_execute", record)
+    return count
+
 @pytest.fixture
 def db_session():
     # Use a unique schema for each test run to ensure isolation
@@ -33,11 +63,13 @@ def db_session():
     create_schema(test_schema_name)
 
     # Import models here to avoid circular imports
-    from src.entities.user import User, Token
+    from src.entities.user import User, Token, RevokedToken, DeletedUser
 
-    # Set schema for User and Token models
+    # Set schema for User, Token, RevokedToken and DeletedUser models
     User.__table__.schema = test_schema_name
     Token.__table__.schema = test_schema_name
+    RevokedToken.__table__.schema = test_schema_name
+    DeletedUser.__table__.schema = test_schema_name
     
     SQLModel.metadata.create_all(testing_engine)
 
@@ -105,4 +137,59 @@ def client(db_session):
     test_client = TestClient(app)
     yield test_client
     # Clean up
-    app.dependency_overrides = {}
\ No newline at end of file
+    app.dependency_overrides = {}
+
+@pytest.fixture
+def tenant_client(db_session):
+    """Client whose sessions are routed to the tenant of each request"""
+    from src.database.core import get_session
+    from src.database.tenants import tenant_bind
+
+    testing_engine = db_session.get_bind()
+
+    def get_tenant_test_session():
+        with Session(tenant_bind(testing_engine)) as session:
+            yield session
+
+    app.dependency_overrides = {get_session: get_tenant_test_session}
+    yield TestClient(app)
+    app.dependency_overrides = {}
+
+@pytest.fixture
+def tenant(db_session):
+    """A provisioned tenant, dropped after the test"""
+    from src.database.tenants import provision_tenant, tenant_schema
+
+    name = f"t{uuid.uuid4().hex[:8]}"
+    provision_tenant(name)
+    yield name
+    with db_session.get_bind().begin() as conn:
+        conn.execute(DropSchema(tenant_schema(name)))
+
+@pytest.fixture
+def async_client(db_session):
+    """Client for an app serving every router through the async stack"""
+    from fastapi import FastAPI
+    from sqlalchemy.pool import NullPool
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    from src.api import register_routes
+    from src.database.core import get_session, get_async_session, get_async_session_factory, async_database_url
+
+    # TestClient runs each request on its own event loop, so connections can't be pooled
+    testing_async_engine = create_async_engine(async_database_url(), poolclass=NullPool)
+
+    async def get_test_async_session():
+        async with AsyncSession(testing_async_engine, expire_on_commit=False) as session:
+            yield session
+
+    def get_test_session():
+        yield db_session
+
+    async_app = FastAPI()
+    register_routes(async_app, async_routers={"users", "auth"})
+    async_app.dependency_overrides[get_async_session] = get_test_async_session
+    async_app.dependency_overrides[get_session] = get_test_session
+    async_app.dependency_overrides[get_async_session_factory] = lambda: lambda: AsyncSession(testing_async_engine, expire_on_commit=False)
+
+    yield TestClient(async_app)
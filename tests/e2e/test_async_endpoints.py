@@ -0,0 +1,119 @@
+from fastapi import status
+from uuid import UUID
+
+"""
+Validate the async stack serves the same API:
+    - Signup, signin, refresh and signout
+    - Create, list, get, update and delete users
+    - Filter, search and batch look up users
+    - Bulk update users
+    - Change a password
+    - Bulk import and export users
+"""
+
+def test_async_auth_flow(async_client, test_user_request):
+    signup_data = {
+        "username": test_user_request.username,
+        "email": test_user_request.email,
+        "password": test_user_request.password
+    }
+    response = async_client.post("/auth/signup", json=signup_data)
+    assert response.status_code == status.HTTP_200_OK
+    assert UUID(response.json()["user_id"])
+
+    response = async_client.post("/auth/signin", json={
+        "email": test_user_request.email,
+        "password": test_user_request.password
+    })
+    assert response.status_code == status.HTTP_200_OK
+    response = async_client.post("/auth/refresh", json={"refresh_token": response.json()["token"]["refresh_token"]})
+    assert response.status_code == status.HTTP_200_OK
+    headers = {"Authorization": f"Bearer {response.json()['token']['access_token']}"}
+
+    response = async_client.post("/auth/signout", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    response = async_client.post("/auth/signin", json={
+        "email": test_user_request.email,
+        "password": "WrongPassword123!"
+    })
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+def test_async_user_crud(async_client, test_user_request, auth_headers):
+    response = async_client.post("/user", json=test_user_request.model_dump(), headers=auth_headers)
+    assert response.status_code == status.HTTP_201_CREATED
+    user_id = response.json()["id"]
+
+    response = async_client.get("/user", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) >= 2
+
+    response = async_client.put(f"/user/{user_id}", json={"username": "updated_username"}, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["username"] == "updated_username"
+
+    response = async_client.delete(f"/user/{user_id}", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    response = async_client.get(f"/user/{user_id}", headers=auth_headers)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+def test_async_user_reads(async_client, admin_user, auth_headers):
+    response = async_client.get("/user", params={"role": "admin", "sort": "-updated_at"}, headers=auth_headers)
+    assert [user["id"] for user in response.json()] == [str(admin_user.id)]
+
+    response = async_client.get("/user/search", params={"q": "admin"}, headers=auth_headers)
+    assert [user["id"] for user in response.json()] == [str(admin_user.id)]
+
+    missing = "00000000-0000-0000-0000-000000000000"
+    response = async_client.post("/user/lookup", json={"ids": [str(admin_user.id), missing], "emails": [admin_user.email]}, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["users"][str(admin_user.id)]["email"] == admin_user.email
+    assert data["users"][admin_user.email]["id"] == str(admin_user.id)
+    assert data["not_found"] == [missing]
+
+def test_async_bulk_update_users(async_client, test_user_request, auth_headers):
+    user_id = async_client.post("/user", json=test_user_request.model_dump(), headers=auth_headers).json()["id"]
+    missing = "00000000-0000-0000-0000-000000000000"
+
+    response = async_client.patch("/user/bulk", json={"ids": [user_id, missing], "role": "employee"}, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    results = response.json()["results"]
+    assert results[0]["user"]["role"] == "employee"
+    assert results[1] == {"id": missing, "status": "failed", "user": None, "error": "User not found"}
+
+def test_async_update_password(async_client, test_user_request, auth_headers):
+    user_id = async_client.post("/user", json=test_user_request.model_dump(), headers=auth_headers).json()["id"]
+
+    response = async_client.put(f"/user/{user_id}/password", json={
+        "old_password": "WrongPassword123!", "new_password": "NewPassword123!"
+    }, headers=auth_headers)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    response = async_client.put(f"/user/{user_id}/password", json={
+        "old_password": test_user_request.password, "new_password": "NewPassword123!"
+    }, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    missing = "00000000-0000-0000-0000-000000000000"
+    response = async_client.put(f"/user/{missing}", json={"username": "nobody"}, headers=auth_headers)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+def test_async_import_users(async_client, auth_headers):
+    body = (
+        "username,email,password\n"
+        "async_bulk_1,async_bulk_1@example.com,Password123!\n"
+        "async_bulk_2,admin@example.com,Password123!\n"
+    )
+    response = async_client.post("/user/bulk", content=body, headers={**auth_headers, "Content-Type": "text/csv"})
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["created"] == 1
+    assert data["results"][1]["error"] == "User already exists"
+
+def test_async_export_users(async_client, auth_headers):
+    response = async_client.get("/user/export", params={"format": "ndjson"}, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.text.splitlines()[0].startswith('{"id"')
+    assert "admin@example.com" in response.text
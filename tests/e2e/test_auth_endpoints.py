@@ -213,6 +213,11 @@ def test_signout_success(client, test_user_request):
     # Assert
     assert response.status_code == status.HTTP_200_OK
     assert "signed out" in response.json()["message"].lower()
+    
+    # The signed out access token is revoked right away
+    response = client.post("/auth/signout", headers=headers)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert response.json()["detail"] == "Token has been revoked"
 
 
 def test_signout_unauthorized(client):
@@ -239,12 +244,12 @@ def test_refresh_token_success(client, test_user_request):
         "password": test_user_request.password
     })
     
-    # Get the token
+    # Get the tokens
     token = signin_response.json()["token"]["access_token"]
-    headers = {"Authorization": f"Bearer {token}"}
+    refresh_token = signin_response.json()["token"]["refresh_token"]
     
     # Act - refresh token
-    response = client.post("/auth/refresh", headers=headers)
+    response = client.post("/auth/refresh", json={"refresh_token": refresh_token})
     
     # Assert
     assert response.status_code == status.HTTP_200_OK
@@ -260,15 +265,31 @@ def test_refresh_token_success(client, test_user_request):
     assert "token_type" in new_token
     assert new_token["token_type"] == "Bearer"
     assert "expires_at" in new_token
+    
+    # The new access token works
+    headers = {"Authorization": f"Bearer {new_token['access_token']}"}
+    assert client.post("/auth/signout", headers=headers).status_code == status.HTTP_200_OK
 
 
-def test_refresh_token_unauthorized(client):
-    """Test refresh token without authentication"""
-    # Act - attempt to refresh without token
-    response = client.post("/auth/refresh")
+def test_refresh_token_unauthorized(client, test_user_request):
+    """Test refresh with an invalid token or an access token"""
+    # Act - attempt to refresh with an invalid token
+    response = client.post("/auth/refresh", json={"refresh_token": "not-a-token"})
     
     # Assert
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    
+    # Access tokens can't be used to refresh, and refresh tokens can't authenticate
+    signup_response = client.post("/auth/signup", json={
+        "username": test_user_request.username,
+        "email": test_user_request.email,
+        "password": test_user_request.password
+    })
+    token = signup_response.json()["token"]
+    response = client.post("/auth/refresh", json={"refresh_token": token["access_token"]})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    response = client.post("/auth/signout", headers={"Authorization": f"Bearer {token['refresh_token']}"})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
 
 def test_token_endpoint_with_form_data(client, test_user_request):
@@ -296,3 +317,121 @@ def test_token_endpoint_with_form_data(client, test_user_request):
     assert "access_token" in data
     assert "token_type" in data
     assert data["token_type"] == "Bearer"
+
+
+def test_signin_rotates_single_token(client, db_session, test_user_request):
+    """Test that repeated signins replace the stored token instead of adding rows"""
+    from sqlmodel import select
+    from src.entities.user import Token
+    from src.lib.utils import token_fingerprint
+
+    client.post("/auth/signup", json={
+        "username": test_user_request.username,
+        "email": test_user_request.email,
+        "password": test_user_request.password
+    })
+    signin_data = {"email": test_user_request.email, "password": test_user_request.password}
+    client.post("/auth/signin", json=signin_data)
+    second = client.post("/auth/signin", json=signin_data).json()
+
+    tokens = db_session.exec(select(Token).where(Token.user_id == UUID(second["user_id"]))).all()
+    assert len(tokens) == 1
+    db_session.refresh(tokens[0])
+    assert tokens[0].refresh_token_hash == token_fingerprint(second["token"]["refresh_token"])
+
+
+def test_refresh_token_after_signout(client, test_user_request):
+    """Test that refresh fails once the stored token was removed by signout"""
+    client.post("/auth/signup", json={
+        "username": test_user_request.username,
+        "email": test_user_request.email,
+        "password": test_user_request.password
+    })
+    signin_response = client.post("/auth/signin", json={
+        "email": test_user_request.email,
+        "password": test_user_request.password
+    })
+    token = signin_response.json()["token"]
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+
+    client.post("/auth/signout", headers=headers)
+    response = client.post("/auth/refresh", json={"refresh_token": token["refresh_token"]})
+
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_refresh_token_reuse_revokes_session(client, test_user_request):
+    """Test that reusing a rotated refresh token revokes the tokens issued after it"""
+    signup_response = client.post("/auth/signup", json={
+        "username": test_user_request.username,
+        "email": test_user_request.email,
+        "password": test_user_request.password
+    })
+    stolen_refresh_token = signup_response.json()["token"]["refresh_token"]
+
+    rotated = client.post("/auth/refresh", json={"refresh_token": stolen_refresh_token}).json()["token"]
+
+    # The first refresh token was already used
+    response = client.post("/auth/refresh", json={"refresh_token": stolen_refresh_token})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    # Everything issued by the legitimate refresh is revoked with it
+    response = client.post("/auth/refresh", json={"refresh_token": rotated["refresh_token"]})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    response = client.post("/auth/signout", headers={"Authorization": f"Bearer {rotated['access_token']}"})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_signin_throttled_before_password_check(client, test_user_request, monkeypatch):
+    """Test that repeated failed signins get 429 without verifying the password"""
+    from src.auth.throttling import SIGNIN_RATE_LIMIT_PER_EMAIL
+    from src.lib.hashing import password_hasher
+
+    client.post("/auth/signup", json={
+        "username": test_user_request.username,
+        "email": test_user_request.email,
+        "password": test_user_request.password
+    })
+    attempts = int(SIGNIN_RATE_LIMIT_PER_EMAIL.split("/")[0])
+    for _ in range(attempts):
+        response = client.post("/auth/signin", json={"email": test_user_request.email, "password": "WrongPassword123!"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    async def verify_async(password, password_hash):
+        raise AssertionError("Throttled signins must not reach bcrypt")
+    monkeypatch.setattr(password_hasher, "verify_async", verify_async)
+
+    # Even the right password is rejected until the window moves on
+    response = client.post("/auth/signin", json={"email": test_user_request.email, "password": test_user_request.password})
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(response.headers["Retry-After"]) >= 1
+
+    response = client.post("/auth/token", data={"username": test_user_request.email, "password": test_user_request.password})
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+def test_auth_queries_run_off_the_event_loop(client, db_session, test_user_request):
+    """Test the async signup, signin and password change never query on the event loop"""
+    import asyncio
+    from sqlalchemy import event
+
+    on_event_loop = []
+    def record_thread(conn, cursor, statement, *args):
+        try:
+            asyncio.get_running_loop()
+            on_event_loop.append(statement)
+        except RuntimeError:
+            pass
+    event.listen(db_session.get_bind(), "before_cursor_execute", record_thread)
+    try:
+        response = client.post("/auth/signup", json=test_user_request.model_dump())
+        user_id = response.json()["user_id"]
+        response = client.post("/auth/signin", json={"email": test_user_request.email, "password": test_user_request.password})
+        headers = {"Authorization": f"Bearer {response.json()['token']['access_token']}"}
+        response = client.put(f"/user/{user_id}/password", json={
+            "old_password": test_user_request.password, "new_password": "NewPassword123!"
+        }, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", record_thread)
+
+    assert on_event_loop == []
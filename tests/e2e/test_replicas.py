@@ -0,0 +1,89 @@
+import os
+import time
+import pytest
+from fastapi import status
+from sqlalchemy import event
+from sqlmodel import create_engine
+from src.database import core
+from src.lib import utils
+from src.database.replicas import STICKY_COOKIE, sticky_until, primary_pins
+from src.domain.users.cache import user_cache
+from src.auth.cache import token_cache
+
+"""
+Validate read replica routing:
+    - Read-only endpoints read from the replica
+    - A committed write pins the client to the primary through a cookie, and its token's user
+    - Clients read from the replica again once both pins are gone
+    - Users read from the replica are not stored in the user cache, nor their principals in the token cache
+    - The bearer token is verified once per request, for every middleware and dependency
+"""
+
+@pytest.fixture
+def replica_statements(db_session, monkeypatch):
+    """Statements run on a stand-in replica, a second engine on the test database"""
+    replica_engine = create_engine(os.getenv("DATABASE_URL"))
+    statements = []
+
+    @event.listens_for(replica_engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    monkeypatch.setattr(core, "_replica_engine", replica_engine)
+    primary_pins.backend.clear()
+    yield statements
+    primary_pins.backend.clear()
+    replica_engine.dispose()
+
+def test_sticky_until():
+    until = time.time() + 5
+    assert sticky_until([(b"cookie", f"other=1; {STICKY_COOKIE}={until}".encode())]) == pytest.approx(until)
+    assert sticky_until([(b"cookie", f"{STICKY_COOKIE}=bogus".encode())]) == 0.0
+    assert sticky_until([]) == 0.0
+
+def test_reads_use_replica_until_write(client, admin_user, auth_headers, replica_statements):
+    response = client.get(f"/user/{admin_user.id}", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert replica_statements
+    assert STICKY_COOKIE not in response.cookies
+
+    response = client.put(f"/user/{admin_user.id}", json={"username": "renamed_admin"}, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert STICKY_COOKIE in response.cookies
+
+    # Pinned to the primary, the write is visible whatever the replica lag
+    replica_statements.clear()
+    response = client.get(f"/user/{admin_user.id}", headers=auth_headers)
+    assert response.json()["username"] == "renamed_admin"
+    assert replica_statements == []
+
+    # Bearer token clients that drop the cookie are pinned by their user
+    client.cookies.clear()
+    client.get("/user/", headers=auth_headers)
+    assert replica_statements == []
+
+    primary_pins.backend.clear()
+    client.get("/user/", headers=auth_headers)
+    assert replica_statements
+
+def test_replica_reads_are_not_cached(client, admin_user, admin_token, auth_headers, replica_statements):
+    user_cache.clear()
+    token_cache.clear()
+    response = client.get(f"/user/{admin_user.id}", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert replica_statements
+    assert user_cache.backend.get(user_cache.key("id", admin_user.id)) is None
+    assert token_cache.get(admin_token) is None
+
+def test_token_is_verified_once(client, admin_user, auth_headers, replica_statements, monkeypatch):
+    verify_auth_token = utils.verify_auth_token
+    calls = []
+
+    def counting_verify(token):
+        calls.append(token)
+        return verify_auth_token(token)
+
+    monkeypatch.setattr(utils, "verify_auth_token", counting_verify)
+    response = client.get("/user/", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert len(calls) == 1
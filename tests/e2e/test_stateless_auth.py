@@ -0,0 +1,50 @@
+import pytest
+from fastapi import status
+from uuid import uuid4
+from datetime import timedelta
+from src.entities.user import UserRole
+from src.lib.utils import generate_auth_token, build_token_claims
+
+"""
+Validate the stateless authorization mode:
+    - Role gated endpoints authorize from the token claims alone
+    - Signout bumps token_version and revokes issued tokens
+"""
+
+@pytest.fixture
+def stateless(monkeypatch):
+    monkeypatch.setattr("src.lib.utils.AUTH_STATELESS", True)
+
+def test_role_check_uses_claims_only(client, stateless):
+    # The user behind this token doesn't exist, so any database lookup would fail
+    claims = build_token_claims(UserRole.ADMIN, True, 0)
+    token = generate_auth_token(uuid4(), "auth", timedelta(minutes=5), claims)
+
+    response = client.get("/user/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
+
+    # Claims still gate permissions
+    claims = build_token_claims(UserRole.CLIENT, True, 0)
+    token = generate_auth_token(uuid4(), "auth", timedelta(minutes=5), claims)
+    response = client.get("/user/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+def test_signout_revokes_stateless_token(client, test_user_request, stateless):
+    client.post("/auth/signup", json={
+        "username": test_user_request.username,
+        "email": test_user_request.email,
+        "password": test_user_request.password
+    })
+    signin_response = client.post("/auth/signin", json={
+        "email": test_user_request.email,
+        "password": test_user_request.password
+    })
+    token = signin_response.json()["token"]["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.post("/auth/signout", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    # The same token is rejected once its version is behind
+    response = client.post("/auth/signout", headers=headers)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
@@ -0,0 +1,72 @@
+from fastapi import status
+from src.auth.revocation import RevocationList, revoked_tokens
+from src.database.tenants import PerTenant, tenant_session_factory
+from src.lib.utils import verify_auth_token
+
+"""
+Validate per-request tenant routing:
+    - Requests naming a tenant read and write that tenant's schema only
+    - Tokens are bound to the tenant they were issued for
+    - Revocations are kept per tenant and reloaded from the tenant's schema
+    - Unknown tenants are rejected
+"""
+
+def signup(client, test_user_request, headers=None):
+    return client.post("/auth/signup", json={
+        "username": test_user_request.username,
+        "email": test_user_request.email,
+        "password": test_user_request.password
+    }, headers=headers or {})
+
+def test_tenant_schemas_are_isolated(tenant_client, tenant, test_user_request):
+    tenant_headers = {"X-Tenant-ID": tenant}
+
+    # The same user can sign up in the default schema and in the tenant
+    assert signup(tenant_client, test_user_request).status_code == status.HTTP_200_OK
+    response = signup(tenant_client, test_user_request, tenant_headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    # But not twice in the same tenant
+    response = signup(tenant_client, test_user_request, tenant_headers)
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+def test_tokens_are_bound_to_their_tenant(tenant_client, tenant, test_user_request):
+    token = signup(tenant_client, test_user_request, {"X-Tenant-ID": tenant}).json()["token"]
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+
+    # Refresh tokens only work when the request names their tenant
+    response = tenant_client.post("/auth/refresh", json={"refresh_token": token["refresh_token"]})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    response = tenant_client.post(
+        "/auth/refresh", json={"refresh_token": token["refresh_token"]}, headers={"X-Tenant-ID": tenant}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    headers = {"Authorization": f"Bearer {response.json()['token']['access_token']}"}
+
+    # Access tokens can't be pointed at another schema
+    response = tenant_client.post("/auth/signout", headers={**headers, "X-Tenant-ID": "other"})
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    # Their tenant claim routes the request without the header
+    response = tenant_client.post("/auth/signout", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+def test_unknown_tenant(tenant_client, test_user_request):
+    response = signup(tenant_client, test_user_request, {"X-Tenant-ID": "does_not_exist"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json()["detail"] == "Unknown tenant"
+
+def test_revocations_are_kept_per_tenant(tenant_client, tenant, test_user_request):
+    access_token = signup(tenant_client, test_user_request, {"X-Tenant-ID": tenant}).json()["token"]["access_token"]
+    jti = verify_auth_token(access_token)["jti"]
+    response = tenant_client.post("/auth/signout", headers={"Authorization": f"Bearer {access_token}"})
+    assert response.status_code == status.HTTP_200_OK
+
+    assert revoked_tokens.get(tenant).is_revoked(jti)
+    assert not revoked_tokens.get(None).is_revoked(jti)
+
+    # Other workers load it from the tenant's schema
+    other_worker = PerTenant("Revocation list", lambda tenant: RevocationList(100, 0.01, tenant_session_factory(tenant)))
+    other_worker.for_each("refresh")
+    assert other_worker.get(tenant).is_revoked(jti)
+    assert not other_worker.get(None).is_revoked(jti)
@@ -1,5 +1,7 @@
 from fastapi import status
 from uuid import UUID
+from datetime import timedelta
+from src.lib.utils import generate_auth_token
 
 """
 Validate the following scenarios:
@@ -7,10 +9,20 @@ Validate the following scenarios:
     - Get users
     - Get user by id
     - Update user by id
+    - Updates and password changes read the target once and write it with one UPDATE
     - Delete user by id
+    - Bulk update users, authorized per target with one role query and one UPDATE
+    - Repeated user lookups are cached and updates invalidate them
+    - Conditional gets of an unchanged user return 304, updates change the ETag and updated_at
+    - Get users filtered by role and active state, sorted descending
+    - Search users by partial username or email
+    - Look up many users by id and email in one query
+    - Bulk import users from NDJSON and CSV
+    - Export users as CSV and NDJSON
+    - Fast JSON responses match the default ones
 """
 
-def test_create_user(client, test_user_request, auth_headers):
+def test_create_user(client, test_user_request, auth_headers, fast_json):
     """Test creating a user as an admin"""
     response = client.post(
         "/user", 
@@ -36,7 +48,7 @@ def test_get_users(client, test_user_request, auth_headers):
     assert isinstance(users, list)
     assert len(users) >= 2  # At least the admin user and the created test user
 
-def test_get_user_by_id(client, test_user_request, auth_headers):
+def test_get_user_by_id(client, test_user_request, auth_headers, fast_json):
     """Test getting a user by ID as an admin"""
     # First create a user
     create_response = client.post("/user", json=test_user_request.model_dump(), headers=auth_headers)
@@ -49,7 +61,7 @@ def test_get_user_by_id(client, test_user_request, auth_headers):
     assert user["id"] == user_id
     assert user["email"] == test_user_request.email
 
-def test_update_user(client, test_user_request, auth_headers):
+def test_update_user(client, test_user_request, auth_headers, fast_json):
     """Test updating a user as an admin"""
     # First create a user
     create_response = client.post("/user", json=test_user_request.model_dump(), headers=auth_headers)
@@ -72,6 +84,37 @@ def test_update_user(client, test_user_request, auth_headers):
     assert "message" in updated_user
     assert updated_user["message"] == "User updated successfully"
 
+def test_update_statements(client, db_session, count_statements, test_user_request, auth_headers):
+    """Test updates share the target loaded for the permission check and skip the refresh"""
+    user_id = client.post("/user", json=test_user_request.model_dump(), headers=auth_headers).json()["id"]
+    user_headers = {"Authorization": f"Bearer {generate_auth_token(UUID(user_id), 'auth', timedelta(minutes=30))}"}
+    # Warm the current user lookups, a wrong old password changes nothing
+    client.get(f"/user/{user_id}", headers=auth_headers)
+    response = client.put(f"/user/{user_id}/password", json={
+        "old_password": "WrongPassword123!", "new_password": "NewPassword123!"
+    }, headers=user_headers)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    with count_statements(db_session.get_bind()) as statements:
+        response = client.put(f"/user/{user_id}/password", json={
+            "old_password": test_user_request.password, "new_password": "NewPassword123!"
+        }, headers=user_headers)
+        assert response.status_code == status.HTTP_200_OK
+        # The password hash is read from the database, then the UPDATE
+        assert len(statements) == 2
+
+        client.get(f"/user/{user_id}", headers=auth_headers)
+        statements.clear()
+        response = client.put(f"/user/{user_id}", json={"username": "updated_username", "role": "employee"}, headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        # The target's role is read from the primary for the permission check, then the UPDATE
+        assert len(statements) == 2
+
+    user = client.get(f"/user/{user_id}", headers=auth_headers).json()
+    assert (user["username"], user["role"]) == ("updated_username", "employee")
+    response = client.post("/auth/signin", json={"email": test_user_request.email, "password": "NewPassword123!"})
+    assert response.status_code == status.HTTP_200_OK
+
 def test_delete_user(client, test_user_request, auth_headers):
     """Test deleting a user as an admin"""
     # First create a user
@@ -84,4 +127,274 @@ def test_delete_user(client, test_user_request, auth_headers):
     
     # Verify the user is deleted
     get_response = client.get(f"/user/{user_id}", headers=auth_headers)
-    assert get_response.status_code == status.HTTP_404_NOT_FOUND
\ No newline at end of file
+    assert get_response.status_code == status.HTTP_404_NOT_FOUND
+
+def test_user_lookups_cached_until_updated(client, db_session, count_statements, test_user_request, auth_headers):
+    """Test repeated gets skip the database and see updates right away"""
+    create_response = client.post("/user", json=test_user_request.model_dump(), headers=auth_headers)
+    user_id = create_response.json()["id"]
+
+    with count_statements(db_session.get_bind()) as statements:
+        client.get(f"/user/{user_id}", headers=auth_headers)
+        cold = len(statements)
+        response = client.get(f"/user/{user_id}", headers=auth_headers)
+        assert response.json()["email"] == test_user_request.email
+        assert len(statements) == cold
+
+    client.put(f"/user/{user_id}", json={"email": "cached@example.com"}, headers=auth_headers)
+    response = client.get(f"/user/{user_id}", headers=auth_headers)
+    assert response.json()["email"] == "cached@example.com"
+
+    client.delete(f"/user/{user_id}", headers=auth_headers)
+    assert client.get(f"/user/{user_id}", headers=auth_headers).status_code == status.HTTP_404_NOT_FOUND
+
+def test_get_user_conditional(client, test_user_request, auth_headers, fast_json):
+    """Test ETags of user reads and If-None-Match revalidation"""
+    create_response = client.post("/user", json=test_user_request.model_dump(), headers=auth_headers)
+    user_id = create_response.json()["id"]
+
+    response = client.get(f"/user/{user_id}", headers=auth_headers)
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    response = client.get(f"/user/{user_id}", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    listed = {user["id"]: user for user in client.get("/user", headers=auth_headers).json()}
+    client.put(f"/user/{user_id}", json={"username": "renamed_user"}, headers=auth_headers)
+    relisted = {user["id"]: user for user in client.get("/user", headers=auth_headers).json()}
+    assert relisted[user_id]["updated_at"] > listed[user_id]["updated_at"]
+
+    response = client.get(f"/user/{user_id}", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["username"] == "renamed_user"
+    assert response.headers["ETag"] != etag
+
+def test_bulk_update_users(client, db_session, count_statements, auth_headers, fast_json):
+    """Test bulk deactivating users as an admin and as an employee"""
+    ids = {}
+    for username, role in (("bulk_client_1", "client"), ("bulk_client_2", "client"), ("bulk_super", "superadmin"), ("bulk_employee", "employee")):
+        ids[username] = client.post("/user", json={
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": "Password123!",
+            "role": role
+        }, headers=auth_headers).json()["id"]
+    missing = "00000000-0000-0000-0000-000000000000"
+
+    with count_statements(db_session.get_bind()) as statements:
+        response = client.patch("/user/bulk", json={
+            "ids": [ids["bulk_client_1"], ids["bulk_super"], missing, ids["bulk_client_2"]],
+            "is_active": False
+        }, headers=auth_headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert (data["updated"], data["failed"]) == (2, 2)
+    results = data["results"]
+    assert [result["status"] for result in results] == ["updated", "failed", "failed", "updated"]
+    assert results[0]["user"]["is_active"] is False
+    assert results[1]["error"] == "Not enough permissions to update superadmin accounts"
+    assert results[2]["error"] == "User not found"
+    # The targets' roles, then the UPDATE
+    assert len(statements) == 2
+    assert client.get(f"/user/{ids['bulk_client_1']}", headers=auth_headers).json()["is_active"] is False
+
+    employee_headers = {"Authorization": f"Bearer {generate_auth_token(UUID(ids['bulk_employee']), 'auth', timedelta(minutes=30))}"}
+    response = client.patch("/user/bulk", json={
+        "ids": [ids["bulk_client_1"], ids["bulk_employee"], ids["bulk_super"]],
+        "is_active": True
+    }, headers=employee_headers)
+    assert [result["status"] for result in response.json()["results"]] == ["updated", "updated", "failed"]
+
+    response = client.patch("/user/bulk", json={"ids": [missing]}, headers=auth_headers)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+def test_get_users_paginated(client, auth_headers, fast_json):
+    """Test paging through users with keyset cursors"""
+    for i in range(3):
+        client.post("/user", json={
+            "username": f"paged_user_{i}",
+            "email": f"paged_user_{i}@example.com",
+            "password": "Password123!",
+            "role": "client"
+        }, headers=auth_headers)
+
+    response = client.get("/user", params={"limit": 3}, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    first_page = response.json()
+    assert len(first_page) == 3
+    assert all("password_hash" not in user for user in first_page)
+    next_cursor = response.headers["X-Next-Cursor"]
+
+    response = client.get("/user", params={"limit": 3, "cursor": next_cursor}, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    second_page = response.json()
+    assert len(second_page) == 1  # The admin user and the 3 created users
+    assert "X-Next-Cursor" not in response.headers
+    assert {user["id"] for user in first_page}.isdisjoint(user["id"] for user in second_page)
+
+    response = client.get("/user", params={"cursor": "not-a-cursor"}, headers=auth_headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+def test_get_users_filtered_and_sorted(client, auth_headers):
+    """Test filtering and sorting the user listing, across pages"""
+    for i, role in enumerate(("employee", "employee", "employee", "client")):
+        client.post("/user", json={
+            "username": f"listed_user_{i}",
+            "email": f"listed_user_{i}@example.com",
+            "password": "Password123!",
+            "role": role
+        }, headers=auth_headers)
+
+    params = {"role": "employee", "is_active": "true", "sort": "-created_at", "limit": 2}
+    response = client.get("/user", params=params, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    first_page = response.json()
+    assert [user["username"] for user in first_page] == ["listed_user_2", "listed_user_1"]
+
+    response = client.get("/user", params={**params, "cursor": response.headers["X-Next-Cursor"]}, headers=auth_headers)
+    assert [user["username"] for user in response.json()] == ["listed_user_0"]
+    assert "X-Next-Cursor" not in response.headers
+
+    response = client.get("/user", params={"is_active": "false"}, headers=auth_headers)
+    assert response.json() == []
+
+    created_after = first_page[0]["created_at"]
+    response = client.get("/user", params={"created_after": created_after}, headers=auth_headers)
+    assert [user["username"] for user in response.json()] == ["listed_user_2", "listed_user_3"]
+
+    # Cursors are bound to the sort they were issued for
+    response = client.get("/user", params={"limit": 1}, headers=auth_headers)
+    response = client.get("/user", params={"sort": "-created_at", "cursor": response.headers["X-Next-Cursor"]}, headers=auth_headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+def test_search_users(client, auth_headers, monkeypatch):
+    """Test searching users, on the ILIKE fallback used without pg_trgm"""
+    monkeypatch.setattr("src.database.search.trigram_installed", False)
+    for username in ("maria_lopez", "mario_rossi", "ana_maria", "pedro_100%"):
+        client.post("/user", json={
+            "username": username,
+            "email": f"{username.rstrip('%')}@example.com",
+            "password": "Password123!",
+            "role": "client"
+        }, headers=auth_headers)
+
+    response = client.get("/user/search", params={"q": "MARI"}, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    # Prefix matches first, then substring matches
+    assert [user["username"] for user in response.json()] == ["maria_lopez", "mario_rossi", "ana_maria"]
+
+    response = client.get("/user/search", params={"q": "mari", "limit": 1}, headers=auth_headers)
+    assert len(response.json()) == 1
+
+    # LIKE wildcards in the query match literally
+    response = client.get("/user/search", params={"q": "00%"}, headers=auth_headers)
+    assert [user["username"] for user in response.json()] == ["pedro_100%"]
+
+    # Terms too short for the trigram indexes are refused
+    for q in ("", "ma"):
+        response = client.get("/user/search", params={"q": q}, headers=auth_headers)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+def test_lookup_users(client, db_session, count_statements, admin_user, auth_headers, fast_json):
+    """Test resolving ids and emails in one request, with explicit misses"""
+    created = client.post("/user", json={
+        "username": "looked_up",
+        "email": "looked_up@example.com",
+        "password": "Password123!",
+        "role": "client"
+    }, headers=auth_headers).json()
+    missing = "00000000-0000-0000-0000-000000000000"
+    admin_id, admin_email = str(admin_user.id), admin_user.email
+
+    with count_statements(db_session.get_bind()) as statements:
+        response = client.post("/user/lookup", json={
+            "ids": [created["id"], missing, created["id"]],
+            "emails": [admin_email, "nobody@example.com"]
+        }, headers=auth_headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["users"][created["id"]]["username"] == "looked_up"
+    assert data["users"][admin_email]["id"] == admin_id
+    assert data["users"][missing] is None
+    assert sorted(data["not_found"]) == sorted([missing, "nobody@example.com"])
+    # The token was already verified, every looked up user comes from one query
+    assert len(statements) == 1
+
+    response = client.post("/user/lookup", json={}, headers=auth_headers)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    response = client.post("/user/lookup", json={"ids": [missing] * 60, "emails": ["a@example.com"] * 60}, headers=auth_headers)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+def test_import_users_ndjson(client, auth_headers):
+    """Test bulk importing users from NDJSON with a per-row report"""
+    import json
+    rows = [
+        {"username": "bulk_user_1", "email": "bulk_user_1@example.com", "password": "Password123!"},
+        {"username": "bulk_user_2", "email": "bulk_user_2@example.com", "password": "weak"},
+        {"username": "bulk_user_3", "email": "bulk_user_1@example.com", "password": "Password123!"},
+        {"username": "bulk_admin", "email": "admin@example.com", "password": "Password123!"},
+    ]
+    body = "\n".join(json.dumps(row) for row in rows) + "\nnot json\n"
+    response = client.post(
+        "/user/bulk",
+        content=body,
+        headers={**auth_headers, "Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["created"] == 1
+    assert data["failed"] == 4
+    assert [result["status"] for result in data["results"]] == ["created", "failed", "failed", "failed", "failed"]
+    assert [result["row"] for result in data["results"]] == [1, 2, 3, 4, 5]
+
+    user_id = data["results"][0]["id"]
+    response = client.get(f"/user/{user_id}", headers=auth_headers)
+    assert response.json()["email"] == "bulk_user_1@example.com"
+
+def test_import_users_csv(client, auth_headers):
+    """Test bulk importing users from CSV, and rejecting other content types"""
+    body = (
+        "username,email,password,role\n"
+        "csv_user_1,csv_user_1@example.com,Password123!,employee\n"
+        "csv_user_2,csv_user_2@example.com,Password123!,\n"
+    )
+    response = client.post("/user/bulk", content=body, headers={**auth_headers, "Content-Type": "text/csv"})
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["created"] == 2
+    assert data["failed"] == 0
+
+    response = client.get(f"/user/{data['results'][1]['id']}", headers=auth_headers)
+    assert response.json()["role"] == "client"
+
+    response = client.post("/user/bulk", content=body, headers={**auth_headers, "Content-Type": "text/plain"})
+    assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+
+def test_export_users(client, test_user_request, auth_headers):
+    """Test streaming every user out as CSV and NDJSON"""
+    import csv
+    import io
+    import json
+    client.post("/user", json=test_user_request.model_dump(), headers=auth_headers)
+
+    response = client.get("/user/export", params={"format": "csv"}, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["email"] for row in rows] == ["admin@example.com", test_user_request.email]
+    assert rows[1]["role"] == "client"
+    assert "password_hash" not in rows[0]
+
+    response = client.get("/user/export", params={"format": "ndjson"}, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    users = [json.loads(line) for line in response.text.splitlines()]
+    assert {user["email"] for user in users} == {"admin@example.com", test_user_request.email}
+    assert UUID(users[0]["id"])
+
+    response = client.get("/user/export", params={"format": "xml"}, headers=auth_headers)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
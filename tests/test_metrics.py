@@ -0,0 +1,61 @@
+from sqlalchemy import text
+from src.metrics import Histogram, RequestStats, _request_stats, track_queries, request_duration, request_queries
+
+"""
+Validate the request metrics:
+    - Histograms render cumulative Prometheus buckets
+    - Queries and their time are counted against the current request
+    - Label values are escaped
+    - The middleware records routes by path template and /metrics serves them
+    - /metrics requires the metrics token, and is hidden without one
+"""
+
+def test_histogram_render():
+    histogram = Histogram("test_seconds", "Test histogram", ("route",), (0.1, 1.0))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.1, "/a")
+    histogram.observe(5.0, "/a")
+
+    lines = histogram.render()
+    assert 'test_seconds_bucket{route="/a",le="0.1"} 2' in lines
+    assert 'test_seconds_bucket{route="/a",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{route="/a"} 3' in lines
+    assert 'test_seconds_sum{route="/a"} 5.15' in lines
+
+    histogram.observe(1.0, 'a"b\\c\nd')
+    assert 'test_seconds_count{route="a\\"b\\\\c\\nd"} 1' in histogram.render()
+
+def test_track_queries(db_session):
+    track_queries(db_session.get_bind())
+    stats = RequestStats()
+    token = _request_stats.set(stats)
+    try:
+        db_session.exec(text("SELECT 1"))
+        db_session.exec(text("SELECT 2"))
+    finally:
+        _request_stats.reset(token)
+    db_session.exec(text("SELECT 3"))
+
+    assert stats.queries == 2
+    assert stats.db_seconds > 0
+
+def test_metrics_endpoint(client, db_session, auth_headers, admin_user, monkeypatch):
+    assert client.get("/metrics").status_code == 404
+    monkeypatch.setattr("src.metrics.METRICS_TOKEN", "scrape-token")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    track_queries(db_session.get_bind())
+    request_duration.clear()
+    request_queries.clear()
+    client.get(f"/user/{admin_user.id}", headers=auth_headers)
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-token"})
+    assert response.status_code == 200
+    body = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/user/{id}",status="200"} 1' in body
+    # Token lookup, the lookup of the same user is then served from the user cache
+    assert 'http_request_db_queries_sum{method="GET",route="/user/{id}"} 1' in body
+    assert "password_hasher_in_flight" in body
+    assert 'db_pool_checked_out{engine="sync"}' in body
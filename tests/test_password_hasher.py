@@ -0,0 +1,68 @@
+import asyncio
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from src.lib.hashing import PasswordHasher
+
+"""
+Validate the password hashing pool:
+    - Sync and async hashing round trip through worker processes
+    - Inline mode when no workers are configured
+    - Metrics are recorded for completed jobs
+    - A batch queues no more jobs than there are workers
+    - A failed retry after a broken pool leaves no job counted in flight
+"""
+
+def test_password_hasher_process_pool():
+    hasher = PasswordHasher(max_workers=1)
+    try:
+        password_hash = hasher.hash("Password123!")
+        assert hasher.verify("Password123!", password_hash) == True
+        assert asyncio.run(hasher.verify_async("WrongPassword123!", password_hash)) == False
+
+        stats = hasher.stats()
+        assert stats["workers"] == 1
+        assert stats["completed"] == 3
+        assert stats["in_flight"] == 0
+        assert stats["queue_depth"] == 0
+    finally:
+        hasher.shutdown()
+
+def test_password_hasher_inline():
+    hasher = PasswordHasher(max_workers=0)
+    password_hash = asyncio.run(hasher.hash_async("Password123!"))
+    assert hasher.verify("Password123!", password_hash) == True
+    assert hasher.stats()["completed"] == 2
+    assert hasher.stats()["wait_seconds_max"] == 0.0
+
+def test_password_hasher_broken_pool_retry_fails():
+    class BrokenExecutor:
+        def submit(self, *args):
+            raise BrokenProcessPool("worker died")
+
+        def shutdown(self, *args, **kwargs):
+            pass
+
+    hasher = PasswordHasher(max_workers=1)
+    hasher._get_executor = lambda: BrokenExecutor()
+    with pytest.raises(BrokenProcessPool):
+        hasher.hash("Password123!")
+    assert hasher.stats()["in_flight"] == 0
+
+def test_password_hasher_batch_is_capped():
+    hasher = PasswordHasher(max_workers=2)
+    submit = hasher._submit
+    peak = 0
+
+    def tracked_submit(job, *args):
+        nonlocal peak
+        future = submit(job, *args)
+        peak = max(peak, hasher.stats()["in_flight"])
+        return future
+
+    hasher._submit = tracked_submit
+    try:
+        password_hashes = asyncio.run(hasher.hash_many_async([f"Password{i}!" for i in range(6)]))
+        assert [hasher.verify(f"Password{i}!", password_hash) for i, password_hash in enumerate(password_hashes)] == [True] * 6
+        assert peak == 2
+    finally:
+        hasher.shutdown()
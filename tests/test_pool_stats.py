@@ -0,0 +1,36 @@
+import os
+from sqlmodel import create_engine
+from sqlalchemy import text
+from src.database.core import engine_options
+from src.database.pool import InstrumentedQueuePool, get_pool_stats
+
+"""
+Validate the instrumented connection pool:
+    - Checkouts, checkins and connects are counted from pool events
+    - Live checked out / idle connections are reported
+    - Per connection settings are applied
+"""
+
+def test_pool_stats_counts_checkouts():
+    options = engine_options()
+    options["connect_args"]["options"] = "-c statement_timeout=1234"
+    testing_engine = create_engine(os.getenv("DATABASE_URL"), poolclass=InstrumentedQueuePool, **options)
+    try:
+        with testing_engine.connect() as connection:
+            stats = get_pool_stats(testing_engine)
+            assert stats["checked_out"] == 1
+            assert connection.execute(text("SHOW statement_timeout")).scalar() == "1234ms"
+            assert connection.execute(text("SHOW application_name")).scalar() == options["connect_args"]["application_name"]
+
+        with testing_engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+        stats = get_pool_stats(testing_engine)
+        assert stats["checked_out"] == 0
+        assert stats["idle"] == 1
+        assert stats["connects"] == 1
+        assert stats["checkouts"] == 2
+        assert stats["checkins"] == 2
+        assert stats["wait_seconds_max"] >= 0
+    finally:
+        testing_engine.dispose()
@@ -0,0 +1,49 @@
+import json
+from datetime import datetime
+from uuid import uuid4
+from fastapi.encoders import jsonable_encoder
+from src.domain.users.models import UserSummary
+from src.entities.user import UserRole
+from src.lib import responses
+
+"""
+Validate the fast JSON responses and entity tags:
+    - Content is returned as is when they are off
+    - Bodies match what FastAPI would encode, with the given status and headers
+    - Entity tags change with the version and If-None-Match lists, wildcards and weak tags match
+"""
+
+def summary() -> UserSummary:
+    return UserSummary(
+        id=uuid4(), username="user", email="user@example.com", role=UserRole.CLIENT,
+        is_active=True, created_at=datetime.now(), updated_at=datetime(2024, 1, 1)
+    )
+
+def test_json_response_off(monkeypatch):
+    monkeypatch.setattr(responses, "FAST_JSON_RESPONSES", False)
+    content = summary()
+    assert responses.json_response(content) is content
+
+def test_json_response_matches_default(monkeypatch):
+    monkeypatch.setattr(responses, "FAST_JSON_RESPONSES", True)
+    users = [summary(), summary()]
+
+    response = responses.json_response(users, list[UserSummary], status_code=201, headers={"X-Next-Cursor": "abc"})
+    assert response.status_code == 201
+    assert response.headers["X-Next-Cursor"] == "abc"
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == jsonable_encoder(users)
+    assert responses.json_serializer(list[UserSummary]) is responses.json_serializer(list[UserSummary])
+
+def test_entity_tag_and_if_none_match():
+    id = uuid4()
+    etag = responses.entity_tag(id, datetime(2024, 1, 1).isoformat())
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag == responses.entity_tag(id, datetime(2024, 1, 1).isoformat())
+    assert etag != responses.entity_tag(id, datetime(2024, 1, 2).isoformat())
+
+    assert responses.etag_matches(etag, etag)
+    assert responses.etag_matches(f'"other", W/{etag}', etag)
+    assert responses.etag_matches("*", etag)
+    assert not responses.etag_matches('"other"', etag)
+    assert not responses.etag_matches(None, etag)
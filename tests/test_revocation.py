@@ -0,0 +1,47 @@
+import time
+from uuid import uuid4
+from sqlmodel import select
+from src.auth.revocation import BloomFilter, RevocationList
+from src.entities.user import RevokedToken
+
+"""
+Validate the token revocation list:
+    - The Bloom filter has no false negatives and a bounded false positive rate
+    - Revoked ids are reported until their exp
+    - Refresh loads revocations made elsewhere, purge deletes expired rows
+"""
+
+def test_bloom_filter():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    added = [uuid4().hex for _ in range(1000)]
+    for item in added:
+        bloom.add(item)
+
+    assert all(item in bloom for item in added)
+    false_positives = sum(uuid4().hex in bloom for _ in range(10000))
+    assert false_positives < 300
+
+def test_revoke_until_exp():
+    revocations = RevocationList(100, 0.01, session_factory=None)
+
+    revocations.revoke("revoked", int(time.time()) + 60)
+    revocations.revoke("expired", int(time.time()) - 1)
+
+    assert revocations.is_revoked("revoked")
+    assert not revocations.is_revoked("expired")
+    assert not revocations.is_revoked("never-revoked")
+
+def test_refresh_from_database(db_session):
+    now = int(time.time())
+    db_session.add(RevokedToken(jti="elsewhere", user_id=uuid4(), exp=now + 60))
+    db_session.add(RevokedToken(jti="expired", user_id=uuid4(), exp=now - 60))
+    db_session.commit()
+
+    revocations = RevocationList(100, 0.01, session_factory=lambda: db_session)
+    assert not revocations.is_revoked("elsewhere")
+    revocations.refresh()
+    assert revocations.is_revoked("elsewhere")
+    assert not revocations.is_revoked("expired")
+
+    revocations.purge()
+    assert db_session.exec(select(RevokedToken.jti)).all() == ["elsewhere"]
@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from src.auth.throttling import SigninThrottle
+from src.exceptions import TooManyRequestsError
+
+"""
+Validate the signin throttle:
+    - Attempts are limited per email, case insensitively
+    - Attempts are limited per client IP across emails
+    - Rejections carry the seconds until the next attempt is allowed
+    - Concurrent attempts can't exceed the limit
+    - A successful signin clears the email's attempts, not the IP's
+    - An empty limit is disabled
+"""
+
+async def attempts_allowed(throttle: SigninThrottle, attempts: list[tuple[str | None, str]]) -> int:
+    results = await asyncio.gather(*[throttle.acquire(ip, email) for ip, email in attempts], return_exceptions=True)
+    assert all(result is None or isinstance(result, TooManyRequestsError) for result in results)
+    return sum(result is None for result in results)
+
+def test_limit_per_email():
+    async def run():
+        throttle = SigninThrottle("", "2/minute", "memory://")
+        await throttle.acquire("10.0.0.1", "user@example.com")
+        await throttle.acquire("10.0.0.2", "USER@example.com")
+
+        with pytest.raises(TooManyRequestsError) as error:
+            await throttle.acquire("10.0.0.3", "user@example.com")
+        assert error.value.status_code == 429
+        assert 1 <= int(error.value.headers["Retry-After"]) <= 60
+        # Other emails and IPs are unaffected
+        await throttle.acquire("10.0.0.3", "other@example.com")
+    asyncio.run(run())
+
+def test_limit_per_ip():
+    async def run():
+        throttle = SigninThrottle("3/minute", "", "memory://")
+        for number in range(3):
+            await throttle.acquire("10.0.0.1", f"user{number}@example.com")
+
+        with pytest.raises(TooManyRequestsError):
+            await throttle.acquire("10.0.0.1", "new@example.com")
+        await throttle.acquire("10.0.0.2", "new@example.com")
+        await throttle.acquire(None, "new@example.com")
+    asyncio.run(run())
+
+def test_concurrent_attempts():
+    async def run():
+        throttle = SigninThrottle("", "5/minute", "memory://")
+        assert await attempts_allowed(throttle, [("10.0.0.1", "user@example.com")] * 20) == 5
+    asyncio.run(run())
+
+def test_success_clears_email():
+    async def run():
+        throttle = SigninThrottle("4/minute", "2/minute", "memory://")
+        await throttle.acquire("10.0.0.1", "user@example.com")
+        await throttle.acquire("10.0.0.1", "user@example.com")
+        await throttle.record_success("10.0.0.1", "user@example.com")
+
+        await throttle.acquire("10.0.0.1", "user@example.com")
+        await throttle.acquire("10.0.0.1", "user@example.com")
+        # The IP keeps every attempt it made
+        with pytest.raises(TooManyRequestsError):
+            await throttle.acquire("10.0.0.1", "other@example.com")
+    asyncio.run(run())
@@ -0,0 +1,44 @@
+import asyncio
+from src.lib.streaming import aiter_lines, aiter_records, format_csv
+
+"""
+Validate the streamed import parsing and export formatting:
+    - Lines split across chunks are joined, long lines included
+    - Lines that aren't UTF-8 are reported as unparsable records
+    - Quoted CSV fields may contain newlines
+    - Exported CSV cells that would be read as formulas are quoted
+"""
+
+async def alist(items):
+    return [item async for item in items]
+
+async def achunks(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+def parse(format: str, *chunks: bytes):
+    return asyncio.run(alist(aiter_records(aiter_lines(achunks(*chunks)), format)))
+
+def test_lines_split_across_chunks():
+    long_value = "x" * 100000
+    chunks = [b'{"a": "', *[long_value[i:i + 1000].encode() for i in range(0, len(long_value), 1000)], b'"}\r\n{"b"', b': 1}']
+    assert parse("ndjson", *chunks) == [(1, {"a": long_value}), (2, {"b": 1})]
+
+def test_invalid_utf8_is_unparsable():
+    records = parse("ndjson", b'{"a": 1}\n{"a": "\xff"}\n{"a": 3}\n')
+    assert records == [(1, {"a": 1}), (2, None), (3, {"a": 3})]
+
+    records = parse("csv", b"name,email\n\xe9,e@example.com\nok,ok@example.com\n")
+    assert records == [(1, None), (2, {"name": "ok", "email": "ok@example.com"})]
+
+def test_csv_quoted_newlines():
+    records = parse("csv", b'name,note\nfirst,"two\n', b'\nlines, ""quoted"""\nsecond,\n"open')
+    assert records == [
+        (1, {"name": "first", "note": 'two\n\nlines, "quoted"'}),
+        (2, {"name": "second"}),
+        (3, None),
+    ]
+
+def test_csv_export_quotes_formulas():
+    lines = format_csv([("=HYPERLINK(\"x\")", "+1", "-1", "@SUM(A1)", "plain", -1, None)]).splitlines()
+    assert lines == ["\"'=HYPERLINK(\"\"x\"\")\",'+1,'-1,'@SUM(A1),plain,-1,"]
@@ -0,0 +1,82 @@
+import threading
+import time
+from src.auth.cache import TokenCache
+from src.exceptions import CredentialsError
+
+"""
+Validate the verified access token cache:
+    - Hits skip the loader
+    - Entries expire at min(token exp, ttl)
+    - Invalidation by user drops every token of that user
+    - Concurrent misses for one token share a single load
+    - Failed loads are not cached
+    - Size bound evicts the least recently used token
+"""
+
+def test_token_cache_hit_and_invalidate():
+    cache = TokenCache(max_size=10, ttl_seconds=60)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return "principal", "user-1", time.time() + 60
+
+    assert cache.get_or_load("token-a", loader) == "principal"
+    assert cache.get_or_load("token-a", loader) == "principal"
+    assert len(calls) == 1
+
+    cache.invalidate_user("user-1")
+    assert cache.get("token-a") is None
+    cache.get_or_load("token-a", loader)
+    assert len(calls) == 2
+
+def test_token_cache_respects_token_exp():
+    cache = TokenCache(max_size=10, ttl_seconds=60)
+    cache.get_or_load("token-a", lambda: ("principal", "user-1", time.time() - 1))
+    assert cache.get("token-a") is None
+
+def test_token_cache_coalesces_concurrent_misses():
+    cache = TokenCache(max_size=10, ttl_seconds=60)
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(timeout=5)
+        return "principal", "user-1", time.time() + 60
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("token-a", loader))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ["principal"] * 8
+
+def test_token_cache_does_not_cache_errors():
+    cache = TokenCache(max_size=10, ttl_seconds=60)
+
+    def loader():
+        raise CredentialsError()
+
+    try:
+        cache.get_or_load("token-a", loader)
+        assert False, "Should have raised CredentialsError"
+    except CredentialsError as e:
+        assert e.status_code == 401
+    assert cache.get("token-a") is None
+
+def test_token_cache_evicts_least_recently_used():
+    cache = TokenCache(max_size=2, ttl_seconds=60)
+    for token in ["token-a", "token-b"]:
+        cache.get_or_load(token, lambda: (token, "user-1", time.time() + 60))
+    cache.get("token-a")
+    cache.get_or_load("token-c", lambda: ("token-c", "user-2", time.time() + 60))
+
+    assert cache.get("token-a") == "token-a"
+    assert cache.get("token-b") is None
+    assert cache.get("token-c") == "token-c"
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+from sqlmodel import select
+from src.auth.token_versions import TokenVersionMap, DELETED_USER_VERSION
+from src.domain.users import repository
+from src.entities.user import User, DeletedUser
+
+"""
+Validate the token version map of stateless authorization:
+    - Local bumps apply at once, the highest version wins
+    - Refresh only loads users changed since the previous refresh
+    - Deletions made elsewhere revoke the deleted user's tokens, old deletion records are purged
+"""
+
+def make_user(db_session, **fields) -> UUID:
+    user = User(username=f"u{uuid4().hex[:8]}", email=f"{uuid4().hex[:8]}@example.com", password_hash="x", **fields)
+    db_session.add(user)
+    db_session.commit()
+    return user.id
+
+def test_bump():
+    versions = TokenVersionMap(token_lifetime=900, overlap=0, session_factory=None)
+    user_id = uuid4()
+    versions.bump(user_id, 2)
+    versions.bump(user_id, 1)
+
+    assert versions.is_revoked(user_id, 1)
+    assert not versions.is_revoked(user_id, 2)
+    assert not versions.is_revoked(uuid4(), 0)
+
+def test_refresh_reads_changed_users(db_session, count_statements):
+    recent = make_user(db_session, token_version=3)
+    stale = make_user(db_session, token_version=5, updated_at=datetime.now() - timedelta(hours=1))
+    make_user(db_session)
+
+    versions = TokenVersionMap(token_lifetime=900, overlap=0, session_factory=lambda: db_session)
+    versions.refresh()
+    assert versions.current(recent) == 3
+    # Every token issued before its bump expired long ago
+    assert versions.current(stale) == 0
+    assert versions._versions.keys() == {recent}
+
+    changed = make_user(db_session, token_version=1)
+    with count_statements(db_session.get_bind()) as statements:
+        versions.refresh()
+    assert versions.current(changed) == 1
+    # The changed users and the deletions since the previous refresh
+    assert len(statements) == 2 and all("updated_at >=" in statement or "deleted_at >=" in statement for statement in statements)
+
+def test_deletions_revoke_and_purge(db_session):
+    user_id = make_user(db_session)
+    repository.delete_user(user_id, db_session)
+    db_session.add(DeletedUser(user_id=uuid4(), deleted_at=datetime.now() - timedelta(hours=1)))
+    db_session.commit()
+
+    versions = TokenVersionMap(token_lifetime=900, overlap=60, session_factory=lambda: db_session)
+    versions.refresh()
+    assert versions.current(user_id) == DELETED_USER_VERSION
+
+    versions.purge()
+    assert db_session.exec(select(DeletedUser.user_id)).all() == [user_id]
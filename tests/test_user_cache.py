@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+from uuid import uuid4
+from src.entities.user import User, UserRole
+from src.lib.cache import MemoryCache, KeyValueCache, cache_from_url
+from src.domain.users.cache import UserCache
+
+"""
+Validate the user cache and its backends:
+    - Hits skip the loader and return a typed copy of the user, without the password hash
+    - Users loaded from a replica are returned but not stored
+    - Misses are cached for the negative TTL
+    - Invalidation drops the entries and wins over loads in flight
+    - The async methods call shared backends off the event loop
+    - The memory backend evicts the least recently used entry and expired ones
+    - The key-value backend works with any redis-like client
+"""
+
+class FakeKeyValueClient:
+    """Stand-in for a redis client"""
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        value, expires_at = self.data.get(key, (None, 0))
+        return value if expires_at > time.monotonic() else None
+
+    def set(self, key, value, px):
+        self.data[key] = (value, time.monotonic() + px / 1000)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match):
+        return [key for key in self.data if key.startswith(match.rstrip("*"))]
+
+def make_user(**fields) -> User:
+    defaults = {"username": "cached", "email": "cached@example.com", "password_hash": "hash", "role": UserRole.ADMIN}
+    return User(**{**defaults, **fields})
+
+def test_user_cache_hit_returns_copy():
+    cache = UserCache(MemoryCache(10), ttl_seconds=60, negative_ttl_seconds=5)
+    user = make_user()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return user
+
+    cache.get_or_load("id", user.id, loader)
+    cached = cache.get_or_load("id", user.id, loader)
+    assert len(calls) == 1
+    assert cached.id == user.id
+    assert cached.role == UserRole.ADMIN
+    assert cached.created_at == user.created_at
+    assert not hasattr(cached, "password_hash")
+
+def test_user_cache_skips_replica_loads():
+    cache = UserCache(MemoryCache(10), ttl_seconds=60, negative_ttl_seconds=5)
+    user = make_user()
+
+    assert cache.get_or_load("id", user.id, lambda: user, store=False).id == user.id
+    assert cache.get_or_load("id", user.id, lambda: None) is None
+
+def test_user_cache_caches_misses():
+    cache = UserCache(MemoryCache(10), ttl_seconds=60, negative_ttl_seconds=0.05)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return None
+
+    assert cache.get_or_load("email", "missing@example.com", loader) is None
+    assert cache.get_or_load("email", "missing@example.com", loader) is None
+    assert len(calls) == 1
+    time.sleep(0.06)
+    cache.get_or_load("email", "missing@example.com", loader)
+    assert len(calls) == 2
+
+def test_user_cache_invalidate():
+    cache = UserCache(MemoryCache(10), ttl_seconds=60, negative_ttl_seconds=5)
+    user = make_user()
+    cache.get_or_load("id", user.id, lambda: user)
+    cache.get_or_load("email", user.email, lambda: user)
+
+    cache.invalidate(user.id, user.email)
+    renamed = make_user(id=user.id, username="renamed")
+    assert cache.get_or_load("id", user.id, lambda: renamed).username == "renamed"
+    assert cache.get_or_load("email", user.email, lambda: renamed).username == "renamed"
+
+def test_user_cache_skips_loads_racing_invalidation():
+    cache = UserCache(MemoryCache(10), ttl_seconds=60, negative_ttl_seconds=5)
+    user = make_user()
+
+    def stale_loader():
+        # A write commits and invalidates while this load is in flight
+        cache.invalidate(user.id)
+        return user
+
+    cache.get_or_load("id", user.id, stale_loader)
+    assert cache.get_or_load("id", user.id, lambda: None) is None
+
+def test_user_cache_async_calls_shared_backend_off_loop():
+    client = FakeKeyValueClient()
+    threads = []
+    for name in ("get", "set", "delete"):
+        def call(*args, _call=getattr(client, name), **kwargs):
+            threads.append(threading.get_ident())
+            return _call(*args, **kwargs)
+        setattr(client, name, call)
+    cache = UserCache(KeyValueCache(client), ttl_seconds=60, negative_ttl_seconds=5)
+    user = make_user()
+
+    async def loader():
+        return user
+
+    async def run():
+        loop_thread = threading.get_ident()
+        await cache.get_or_load_async("id", user.id, loader)
+        cached = await cache.get_or_load_async("id", user.id, loader)
+        await cache.invalidate_async(user.id, user.email)
+        return loop_thread, cached
+
+    loop_thread, cached = asyncio.run(run())
+    assert cached.id == user.id
+    assert len(threads) == 4
+    assert loop_thread not in threads
+    assert client.data == {}
+
+def test_user_cache_disabled():
+    cache = UserCache(MemoryCache(10), ttl_seconds=0, negative_ttl_seconds=0)
+    calls = []
+    for _ in range(2):
+        cache.get_or_load("id", uuid4(), lambda: calls.append(1))
+    assert len(calls) == 2
+
+def test_memory_cache_lru_and_ttl():
+    cache = MemoryCache(max_size=2)
+    cache.set("a", b"1", 60)
+    cache.set("b", b"2", 60)
+    cache.get("a")
+    cache.set("c", b"3", 60)
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+
+    cache.set("d", b"4", 0.01)
+    time.sleep(0.02)
+    assert cache.get("d") is None
+
+def test_key_value_cache_with_stand_in_client():
+    client = FakeKeyValueClient()
+    cache = UserCache(KeyValueCache(client, "test:"), ttl_seconds=60, negative_ttl_seconds=5)
+    user = make_user()
+    cache.get_or_load("id", user.id, lambda: user)
+    assert all(key.startswith("test:user:") for key in client.data)
+    assert cache.get_or_load("id", user.id, lambda: None).email == user.email
+
+    cache.invalidate(user.id)
+    assert client.data == {}
+
+def test_cache_from_url():
+    assert isinstance(cache_from_url("memory://", 10, "test:"), MemoryCache)
@@ -0,0 +1,45 @@
+from datetime import datetime
+from uuid import UUID
+import pytest
+from sqlalchemy.dialects import postgresql
+from src.entities.user import UserRole
+from src.domain.users.models import UserFilters
+from src.domain.users.repository import users_page_query
+from src.lib.pagination import encode_cursor, decode_cursor
+from src.exceptions import InvalidCursorError
+
+"""
+Validate the filtered and sorted user listing:
+    - Every filter and sort combination is served by its index, without a sort step
+    - Cursors are only accepted with the sort they were created for
+"""
+
+# Filters, sort and the index expected to serve them
+LISTINGS = [
+    (None, "created_at", "ix_user_created_at_id"),
+    (None, "-updated_at", "ix_user_updated_at_id"),
+    (UserFilters(role=UserRole.EMPLOYEE), "created_at", "ix_user_role_created_at_id"),
+    (UserFilters(role=UserRole.EMPLOYEE), "-updated_at", "ix_user_role_updated_at_id"),
+    (UserFilters(is_active=True), "-created_at", "ix_user_active_created_at_id"),
+    (UserFilters(role=UserRole.ADMIN, is_active=True), "created_at", "ix_user_active_role_created_at_id"),
+    (UserFilters(is_active=False, created_after=datetime(2024, 1, 1)), "created_at", "ix_user_created_at_id"),
+]
+
+@pytest.mark.parametrize("filters,sort,index", LISTINGS)
+def test_listing_uses_index_order(db_session, filters, sort, index):
+    after = (datetime(2024, 1, 1), UUID(int=0))
+    sql = str(users_page_query(50, after, filters, sort).compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    connection = db_session.connection()
+    # Only fall back to scanning and sorting when no index fits, whatever the table size
+    for setting in ("enable_seqscan", "enable_bitmapscan", "enable_sort"):
+        connection.exec_driver_sql(f"SET LOCAL {setting} = off")
+    plan = "\n".join(connection.exec_driver_sql(f"EXPLAIN {sql}").scalars())
+    db_session.rollback()
+    assert f"using {index} on" in plan
+    assert "Sort" not in plan
+
+def test_cursor_bound_to_sort():
+    cursor = encode_cursor(datetime(2024, 1, 1), UUID(int=1), "-updated_at")
+    assert decode_cursor(cursor, "-updated_at")[0] == datetime(2024, 1, 1)
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, "created_at")
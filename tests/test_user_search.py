@@ -0,0 +1,48 @@
+from sqlalchemy.dialects import postgresql
+from src.domain.users.repository import escape_like, search_users_query
+from src.database import search
+from src.database.search import create_search_indexes, search_index_statements
+from src.entities.user import User
+
+"""
+Validate the user search queries and indexes:
+    - LIKE wildcards in the search term are escaped
+    - With pg_trgm, matches use the indexable word similarity operator
+    - Without pg_trgm, matches fall back to ILIKE
+    - Trigram index DDL targets the given schema
+    - A database without pg_trgm is left without the indexes
+"""
+
+def compile_query(query) -> str:
+    return str(query.compile(dialect=postgresql.dialect()))
+
+def test_escape_like():
+    assert escape_like("100%_a\\b") == "100\\%\\_a\\\\b"
+
+def test_search_query_with_trigram():
+    sql = compile_query(search_users_query("maria", 20, trigram=True))
+    assert sql.count("<%") == 2
+    assert "word_similarity" in sql
+    assert "ILIKE" in sql
+
+def test_search_query_without_trigram():
+    sql = compile_query(search_users_query("maria", 20, trigram=False))
+    assert "<%" not in sql
+    assert "word_similarity" not in sql
+    assert "ILIKE" in sql
+
+def test_search_index_statements():
+    statements = search_index_statements("tenant_acme")
+    assert statements == [
+        'CREATE INDEX IF NOT EXISTS ix_user_username_trgm ON tenant_acme."user" USING gin (username gin_trgm_ops)',
+        'CREATE INDEX IF NOT EXISTS ix_user_email_trgm ON tenant_acme."user" USING gin (email gin_trgm_ops)',
+    ]
+
+def test_create_search_indexes_matches_extension(db_session, monkeypatch):
+    monkeypatch.setattr("src.database.search.trigram_installed", None)
+    with db_session.get_bind().begin() as connection:
+        available = connection.exec_driver_sql(
+            "SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm')"
+        ).scalar()
+        assert create_search_indexes(connection, User.__table__.schema) == available
+    assert search.trigram_installed == available
@@ -1,6 +1,13 @@
-from src.domain.users import service
+import pytest
+from uuid import uuid4
+from src.domain.users import service, repository
 from unittest.mock import patch
-from src.exceptions import InvalidEmailError, InvalidPasswordError, InvalidRoleError, UserAlreadyExistsError
+from src.domain.users.models import UpdateUserRequest
+from src.auth.dependencies import CurrentUser
+from src.entities.user import UserRole
+from src.exceptions import (
+    InvalidEmailError, InvalidPasswordError, InvalidRoleError, UserAlreadyExistsError, ForbiddenError
+)
 
 """Validate the following scenarios:
     - Invalid email format (more unit tests needed)
@@ -8,6 +15,9 @@ from src.exceptions import InvalidEmailError, InvalidPasswordError, InvalidRoleE
     - Invalid role format (more unit tests needed)
     - User already exists
     - User created successfully
+    - Every write moves updated_at forward
+    - Updates return the previous email and bump token_version only on a role or active state change
+    - Updates skip targets whose role the updater may not update, with a 403
 """
 
 def test_create_user_invalid_email(db_session, test_user_request):
@@ -68,3 +78,37 @@ def test_create_user_user_created_successfully(db_session, test_user_request):
     assert test_user_response.email == test_user_request.email
     assert test_user_response.role == test_user_request.role
     assert test_user_response.id is not None
+
+def test_writes_update_updated_at(db_session, test_user_request):
+    user_id = service.create_user(test_user_request, db_session).id
+    created = repository.load_user_by_id(user_id, db_session).updated_at
+
+    repository.bump_token_version(user_id, db_session)
+    bumped = repository.load_user_by_id(user_id, db_session).updated_at
+    assert bumped > created
+
+    repository.update_password(user_id, "new-hash", db_session)
+    assert repository.load_user_by_id(user_id, db_session).updated_at > bumped
+
+def test_update_user_returns_previous_email(db_session, test_user_request):
+    user_id = service.create_user(test_user_request, db_session).id
+    version = repository.load_user_by_id(user_id, db_session).token_version
+
+    row = repository.update_user(
+        user_id, UpdateUserRequest(email="moved@example.com", role=test_user_request.role), user_id, set(), db_session
+    )
+    assert (row.previous_email, row.email) == (test_user_request.email, "moved@example.com")
+    assert row.token_version == version
+
+    row = repository.update_user(user_id, UpdateUserRequest(is_active=False), user_id, set(), db_session)
+    assert row.previous_email == "moved@example.com"
+    assert row.token_version == version + 1
+
+def test_update_user_guards_target_role(db_session, admin_user):
+    # An employee authorized while the target was a client, which was since promoted to admin
+    employee = CurrentUser(id=uuid4(), role=UserRole.EMPLOYEE, is_active=True)
+    with pytest.raises(ForbiddenError):
+        service.update_user_by_id(admin_user.id, UpdateUserRequest(username="taken_over"), employee, db_session)
+    assert repository.load_user_by_id(admin_user.id, db_session).username == "admin_user"
+
+    assert repository.update_user(uuid4(), UpdateUserRequest(username="x"), employee.id, {UserRole.CLIENT}, db_session) is None